@@ -0,0 +1,27 @@
+"""Allow system-initiated order status changes
+
+Revision ID: 002_order_history_system_changes
+Revises: 001_initial_schema
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '002_order_history_system_changes'
+down_revision: Union[str, None] = '001_initial_schema'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Batch allocation runs from Celery without a user
+    op.alter_column('order_history', 'changed_by', existing_type=postgresql.UUID(as_uuid=True), nullable=True)
+
+
+def downgrade() -> None:
+    op.alter_column('order_history', 'changed_by', existing_type=postgresql.UUID(as_uuid=True), nullable=False)
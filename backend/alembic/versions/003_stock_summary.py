@@ -0,0 +1,47 @@
+"""Available-to-promise stock summary
+
+Revision ID: 003_stock_summary
+Revises: 002_order_history_system_changes
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '003_stock_summary'
+down_revision: Union[str, None] = '002_order_history_system_changes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stock_summary',
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('on_hand', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('reserved', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('available', sa.Integer(), sa.Computed('on_hand - reserved', persisted=True)),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tenant_id', 'product_id')
+    )
+    op.create_index('ix_stock_summary_product_id', 'stock_summary', ['product_id'])
+    
+    # Initial fill from current inventory
+    op.execute("""
+        INSERT INTO stock_summary (tenant_id, product_id, on_hand, reserved)
+        SELECT tenant_id, product_id, SUM(quantity), SUM(reserved_quantity)
+        FROM inventory
+        GROUP BY tenant_id, product_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_summary_product_id', table_name='stock_summary')
+    op.drop_table('stock_summary')
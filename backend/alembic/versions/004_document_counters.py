@@ -0,0 +1,44 @@
+"""Document number counters, receipt numbers unique per tenant
+
+Revision ID: 004_document_counters
+Revises: 003_stock_summary
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '004_document_counters'
+down_revision: Union[str, None] = '003_stock_summary'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'document_counters',
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('doc_type', sa.String(length=20), nullable=False),
+        sa.Column('last_value', sa.BigInteger(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tenant_id', 'doc_type')
+    )
+    
+    # Numbers are now issued per tenant (like orders), so RCP-000001 exists
+    # once per tenant.  receipts may predate migrations (created from models).
+    if sa.inspect(op.get_bind()).has_table('receipts'):
+        op.drop_index('ix_receipts_receipt_number', table_name='receipts')
+        op.create_index('ix_receipts_receipt_number', 'receipts', ['receipt_number'])
+        op.create_unique_constraint('uq_receipt_tenant_number', 'receipts', ['tenant_id', 'receipt_number'])
+
+
+def downgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('receipts'):
+        op.drop_constraint('uq_receipt_tenant_number', 'receipts', type_='unique')
+        op.drop_index('ix_receipts_receipt_number', table_name='receipts')
+        op.create_index('ix_receipts_receipt_number', 'receipts', ['receipt_number'], unique=True)
+    op.drop_table('document_counters')
@@ -0,0 +1,28 @@
+"""Index for keyset pagination of orders
+
+Revision ID: 005_orders_keyset_index
+Revises: 004_document_counters
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '005_orders_keyset_index'
+down_revision: Union[str, None] = '004_document_counters'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Unfiltered listing: ORDER BY created_at DESC, id DESC within a tenant.
+    # Status-filtered listing uses idx_orders_tenant_status_created.
+    op.create_index('idx_orders_tenant_created_id', 'orders', ['tenant_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_orders_tenant_created_id', table_name='orders')
@@ -0,0 +1,73 @@
+"""Daily PnL rollup per tenant and order source
+
+Revision ID: 006_pnl_daily_rollups
+Revises: 005_orders_keyset_index
+Create Date: 2026-10-16 15:00:00.000000
+
+The table is filled from the PnL columns stored on the orders, so it
+matches them from the start and later changes keep it in step.  Orders
+created before the recompute pipeline only store cost_of_goods; once the
+database is at head, recompute their PnL with
+POST /finance/reports/pnl/recompute (or the recompute_order_pnl task) for
+the history range.  The recompute moves the rollup along with the
+orders, no rebuild is needed afterwards.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '006_pnl_daily_rollups'
+down_revision: Union[str, None] = '005_orders_keyset_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+MONEY_COLUMNS = (
+    'revenue', 'cost_of_goods', 'processing_cost', 'packaging_cost',
+    'storage_cost', 'marketplace_fee', 'shipping_cost', 'other_costs',
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'pnl_daily_rollups',
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('source', sa.String(length=50), nullable=False),
+        sa.Column('orders_count', sa.Integer(), server_default='0', nullable=False),
+        *[
+            sa.Column(name, sa.Numeric(precision=14, scale=2), server_default='0', nullable=False)
+            for name in MONEY_COLUMNS
+        ],
+        sa.Column(
+            'margin',
+            sa.Numeric(precision=14, scale=2),
+            sa.Computed(
+                'revenue - cost_of_goods - processing_cost - packaging_cost - '
+                'storage_cost - marketplace_fee - shipping_cost - other_costs',
+                persisted=True
+            )
+        ),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tenant_id', 'day', 'source')
+    )
+    
+    # Same rows as PnLRollupService.rebuild: live orders per creation day
+    totals = ', '.join(f'COALESCE(SUM({name}), 0)' for name in MONEY_COLUMNS[1:])
+    op.execute(f"""
+        INSERT INTO pnl_daily_rollups (
+            tenant_id, day, source, orders_count, {', '.join(MONEY_COLUMNS)}, updated_at
+        )
+        SELECT tenant_id, CAST(date_trunc('day', created_at) AS date), source, COUNT(*),
+               COALESCE(SUM(total_amount), 0), {totals}, now()
+        FROM orders
+        WHERE status <> 'cancelled'
+        GROUP BY tenant_id, CAST(date_trunc('day', created_at) AS date), source
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('pnl_daily_rollups')
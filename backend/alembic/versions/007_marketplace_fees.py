@@ -0,0 +1,53 @@
+"""Marketplace fee components, optionally per product category
+
+Revision ID: 007_marketplace_fees
+Revises: 006_pnl_daily_rollups
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '007_marketplace_fees'
+down_revision: Union[str, None] = '006_pnl_daily_rollups'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # marketplace_fees may predate migrations (created from models)
+    if sa.inspect(op.get_bind()).has_table('marketplace_fees'):
+        op.add_column(
+            'marketplace_fees',
+            sa.Column('category_id', postgresql.UUID(as_uuid=True), nullable=True)
+        )
+        op.create_foreign_key(
+            'marketplace_fees_category_id_fkey', 'marketplace_fees', 'categories',
+            ['category_id'], ['id'], ondelete='CASCADE'
+        )
+        return
+    
+    op.create_table(
+        'marketplace_fees',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('integration_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('category_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('fee_type', sa.String(length=20), nullable=False),
+        sa.Column('fee_value', sa.Numeric(precision=10, scale=4), nullable=False),
+        sa.Column('is_active', sa.Boolean(), server_default='true', nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['integration_id'], ['integrations.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_marketplace_fees_integration_id', 'marketplace_fees', ['integration_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('marketplace_fees_category_id_fkey', 'marketplace_fees', type_='foreignkey')
+    op.drop_column('marketplace_fees', 'category_id')
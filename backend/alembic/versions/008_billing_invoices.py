@@ -0,0 +1,61 @@
+"""Monthly tenant invoices and invoice lines
+
+Revision ID: 008_billing_invoices
+Revises: 007_marketplace_fees
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '008_billing_invoices'
+down_revision: Union[str, None] = '007_marketplace_fees'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'invoices',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('invoice_number', sa.String(length=50), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('period_end', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='draft', nullable=False),
+        sa.Column('lines_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'period_start', name='uq_invoice_tenant_period')
+    )
+    op.create_index('ix_invoices_tenant_id', 'invoices', ['tenant_id'])
+    op.create_index('ix_invoices_period_start', 'invoices', ['period_start'])
+    
+    op.create_table(
+        'invoice_lines',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('invoice_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('line_type', sa.String(length=30), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=False),
+        sa.Column('order_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['invoice_id'], ['invoices.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_invoice_lines_invoice_id', 'invoice_lines', ['invoice_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('invoice_lines')
+    op.drop_table('invoices')
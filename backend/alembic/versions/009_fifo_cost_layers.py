@@ -0,0 +1,88 @@
+"""FIFO cost layers per receipt line and their consumption by shipments
+
+Revision ID: 009_fifo_cost_layers
+Revises: 008_billing_invoices
+Create Date: 2026-10-16 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '009_fifo_cost_layers'
+down_revision: Union[str, None] = '008_billing_invoices'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # receipt_items may predate migrations (created from models)
+    if sa.inspect(op.get_bind()).has_table('receipt_items'):
+        op.add_column('receipt_items', sa.Column('unit_cost', sa.Numeric(precision=12, scale=2), nullable=True))
+    
+    op.create_table(
+        'cost_layers',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('receipt_item_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('unit_cost', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('remaining_quantity', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['receipt_item_id'], ['receipt_items.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_cost_layers_tenant_id', 'cost_layers', ['tenant_id'])
+    op.create_index('ix_cost_layers_receipt_item_id', 'cost_layers', ['receipt_item_id'])
+    op.create_index(
+        'idx_cost_layers_open', 'cost_layers', ['product_id', 'received_at', 'id'],
+        postgresql_where=sa.text('remaining_quantity > 0')
+    )
+    
+    op.create_table(
+        'cost_layer_consumptions',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('layer_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('order_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('order_item_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_cost', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['layer_id'], ['cost_layers.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['order_item_id'], ['order_items.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_cost_layer_consumptions_layer_id', 'cost_layer_consumptions', ['layer_id'])
+    op.create_index('ix_cost_layer_consumptions_order_id', 'cost_layer_consumptions', ['order_id'])
+    
+    # Opening layer per product: stock on hand at the current cost price
+    op.execute("""
+        INSERT INTO cost_layers (
+            id, tenant_id, product_id, receipt_item_id, received_at,
+            unit_cost, quantity, remaining_quantity
+        )
+        SELECT gen_random_uuid(), s.tenant_id, s.product_id, NULL, now(),
+               p.cost_price, s.on_hand, s.on_hand
+        FROM stock_summary s
+        JOIN products p ON p.id = s.product_id
+        WHERE s.on_hand > 0
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cost_layer_consumptions_order_id', table_name='cost_layer_consumptions')
+    op.drop_index('ix_cost_layer_consumptions_layer_id', table_name='cost_layer_consumptions')
+    op.drop_table('cost_layer_consumptions')
+    op.drop_index('idx_cost_layers_open', table_name='cost_layers')
+    op.drop_index('ix_cost_layers_receipt_item_id', table_name='cost_layers')
+    op.drop_index('ix_cost_layers_tenant_id', table_name='cost_layers')
+    op.drop_table('cost_layers')
+    if sa.inspect(op.get_bind()).has_table('receipt_items'):
+        op.drop_column('receipt_items', 'unit_cost')
@@ -0,0 +1,91 @@
+"""Inventory movement ledger and balance checkpoints
+
+Revision ID: 010_inventory_movement_ledger
+Revises: 009_fifo_cost_layers
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '010_inventory_movement_ledger'
+down_revision: Union[str, None] = '009_fifo_cost_layers'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'inventory_movements',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('cell_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('inventory_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('lot_number', sa.String(length=100), nullable=True),
+        sa.Column('movement_type', sa.String(length=20), nullable=False),
+        sa.Column('quantity', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('reserved_quantity', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('document_type', sa.String(length=20), nullable=False),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('occurred_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['cell_id'], ['cells.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'idx_inventory_movements_tenant_product', 'inventory_movements',
+        ['tenant_id', 'product_id', 'occurred_at']
+    )
+    op.create_index('idx_inventory_movements_cell', 'inventory_movements', ['cell_id', 'occurred_at'])
+    op.create_index('idx_inventory_movements_occurred_at', 'inventory_movements', ['occurred_at'])
+    
+    op.create_table(
+        'inventory_checkpoints',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('as_of', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('as_of')
+    )
+    
+    op.create_table(
+        'inventory_checkpoint_balances',
+        sa.Column('checkpoint_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('cell_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('reserved_quantity', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['checkpoint_id'], ['inventory_checkpoints.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['cell_id'], ['cells.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('checkpoint_id', 'tenant_id', 'product_id', 'cell_id')
+    )
+    
+    # Opening movement per lot: the ledger starts from the current stock
+    op.execute("""
+        INSERT INTO inventory_movements (
+            tenant_id, product_id, cell_id, inventory_id, lot_number, movement_type,
+            quantity, reserved_quantity, document_type, document_id, occurred_at
+        )
+        SELECT tenant_id, product_id, cell_id, id, lot_number, 'adjust',
+               quantity, reserved_quantity, 'opening', NULL, now()
+        FROM inventory
+        WHERE quantity <> 0 OR reserved_quantity <> 0
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('inventory_checkpoint_balances')
+    op.drop_table('inventory_checkpoints')
+    op.drop_index('idx_inventory_movements_occurred_at', table_name='inventory_movements')
+    op.drop_index('idx_inventory_movements_cell', table_name='inventory_movements')
+    op.drop_index('idx_inventory_movements_tenant_product', table_name='inventory_movements')
+    op.drop_table('inventory_movements')
@@ -0,0 +1,48 @@
+"""Daily inventory snapshots, range-partitioned by month
+
+Revision ID: 011_inventory_snapshots
+Revises: 010_inventory_movement_ledger
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '011_inventory_snapshots'
+down_revision: Union[str, None] = '010_inventory_movement_ledger'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, None] = None
+
+
+def upgrade() -> None:
+    # Monthly partitions are created by InventorySnapshotService
+    op.create_table(
+        'inventory_snapshots',
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('cell_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('lot_number', sa.String(length=100), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('reserved_quantity', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('snapshot_date', 'tenant_id', 'product_id', 'cell_id'),
+        postgresql_partition_by='RANGE (snapshot_date)'
+    )
+    
+    op.create_table(
+        'inventory_snapshot_runs',
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('rows_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('snapshot_date')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('inventory_snapshot_runs')
+    # Drops the partitions as well
+    op.drop_table('inventory_snapshots')
@@ -23,6 +23,9 @@ class Settings(BaseSettings):
     SMTP_USER: str = "noreply@example.com"
     SMTP_PASSWORD: str = "smtp_password"
 
+    # Inventory snapshots: days kept (whole months are dropped)
+    INVENTORY_SNAPSHOT_RETENTION_DAYS: int = 400
+
     # Environment
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
@@ -0,0 +1,173 @@
+"""Streaming tabular exports: CSV and Arrow IPC, optionally gzipped.
+
+Rows arrive in batches (lists of tuples) from a server-side cursor and are
+encoded one batch at a time, so memory use does not depend on the size of
+the export.
+"""
+
+import csv
+import io
+import zlib
+from collections.abc import AsyncIterator, Sequence
+from enum import Enum
+from uuid import UUID
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+
+
+CSV = "csv"
+ARROW = "arrow"
+NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    CSV: "text/csv",
+    ARROW: "application/vnd.apache.arrow.stream",
+    NDJSON: "application/x-ndjson",
+}
+
+EXTENSIONS = {CSV: "csv", ARROW: "arrows", NDJSON: "ndjson"}
+
+# Column kinds -> Arrow types (built lazily, pyarrow is optional)
+_ARROW_TYPES = {
+    "str": lambda pa: pa.string(),
+    "int": lambda pa: pa.int64(),
+    "money": lambda pa: pa.decimal128(14, 2),
+    "date": lambda pa: pa.date32(),
+    "datetime": lambda pa: pa.timestamp("us", tz="UTC"),
+}
+
+
+def negotiate_format(accept: str | None, requested: str | None, allowed: Sequence[str]) -> str | None:
+    """Export format: ``requested`` if given, else the best match of the Accept header.
+    
+    Returns None when nothing in ``allowed`` is acceptable, callers then
+    fall back to their default representation.
+    """
+    if requested:
+        return requested
+    if not accept:
+        return None
+    
+    ranges = []
+    for n, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        ranges.append((-quality, n, media_type.lower()))
+    
+    for quality, _, media_type in sorted(ranges):
+        if quality == 0:
+            break
+        for fmt in allowed:
+            if MEDIA_TYPES[fmt] == media_type:
+                return fmt
+    return None
+
+
+def _cell(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+async def _csv_chunks(columns: Sequence[tuple[str, str]], batches: AsyncIterator[Sequence[tuple]]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    async for rows in batches:
+        writer.writerows([[_cell(value) for value in row] for row in rows])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Writable file object that hands out what was written since the last take()."""
+    
+    closed = False
+    
+    def __init__(self):
+        self.parts = []
+    
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+    
+    def flush(self) -> None:
+        pass
+    
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+async def _arrow_chunks(pa, columns: Sequence[tuple[str, str]], batches: AsyncIterator[Sequence[tuple]]):
+    schema = pa.schema([(name, _ARROW_TYPES[kind](pa)) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    async for rows in batches:
+        if not rows:
+            continue
+        values = list(zip(*rows))
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [
+                pa.array([_cell(value) for value in values[n]], type=schema.field(n).type)
+                for n in range(len(columns))
+            ],
+            schema=schema
+        ))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+async def _gzip_chunks(chunks: AsyncIterator[bytes]):
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        # Sync flush per chunk so the client receives data as it is produced
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def stream_export(
+    fmt: str,
+    columns: Sequence[tuple[str, str]],
+    batches: AsyncIterator[Sequence[tuple]],
+    filename: str,
+    accept_encoding: str | None = None
+) -> StreamingResponse:
+    """Streaming CSV or Arrow IPC response of row batches.
+    
+    ``columns`` are (name, kind) pairs, kind being one of str, int, money,
+    date and datetime.  The body is gzipped when the client accepts it.
+    """
+    if fmt == ARROW:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail="Arrow export is not available on this server"
+            )
+        body = _arrow_chunks(pa, columns, batches)
+    else:
+        body = _csv_chunks(columns, batches)
+    
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{EXTENSIONS[fmt]}"',
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if accept_encoding and "gzip" in accept_encoding.lower():
+        body = _gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
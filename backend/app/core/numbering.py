@@ -0,0 +1,95 @@
+"""Document number allocation (orders, receipts, invoices, ...).
+
+Numbers are unique per tenant and document type.  Each process reserves a
+block of numbers from ``document_counters`` in its own short transaction and
+hands them out from memory, so issuing a number normally costs no database
+round trip and never blocks on other requests.  Unused numbers of a block
+are lost when the process exits, so numbering may have gaps.
+"""
+
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from uuid import UUID
+
+
+ORDER = "ORD"
+RECEIPT = "RCP"
+INVOICE = "INV"
+
+# Upsert + increment is atomic; the row lock is held only by this statement's
+# own transaction, never by the caller's business transaction.
+_RESERVE_BLOCK_SQL = text("""
+    INSERT INTO document_counters (tenant_id, doc_type, last_value)
+    VALUES (:tenant_id, :doc_type, :count)
+    ON CONFLICT (tenant_id, doc_type) DO UPDATE
+    SET last_value = document_counters.last_value + EXCLUDED.last_value
+    RETURNING last_value
+""")
+
+
+class DocumentNumberAllocator:
+    """Per-process cache of reserved number blocks."""
+    
+    def __init__(self, block_size: int = 100):
+        self.block_size = block_size
+        self._blocks: dict[tuple[UUID, str], list[int]] = {}
+        self._pending: dict[tuple[UUID, str], asyncio.Future] = {}
+    
+    async def next_numbers(self, db: AsyncSession, tenant_id: UUID, doc_type: str, count: int) -> list[int]:
+        """Issue ``count`` new numbers for a tenant and document type."""
+        numbers = []
+        key = (tenant_id, doc_type)
+        while len(numbers) < count:
+            block = self._blocks.get(key)
+            if not block or block[0] > block[1]:
+                await self._refill(db, key, count - len(numbers))
+                continue
+            take = min(count - len(numbers), block[1] - block[0] + 1)
+            numbers.extend(range(block[0], block[0] + take))
+            block[0] += take
+        return numbers
+    
+    async def _refill(self, db: AsyncSession, key: tuple[UUID, str], needed: int) -> None:
+        """Reserve a new block; concurrent callers wait for the same reservation."""
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(
+                self._reserve(db, key[0], key[1], max(self.block_size, needed))
+            )
+            self._pending[key] = pending
+            try:
+                self._blocks[key] = await asyncio.shield(pending)
+            finally:
+                del self._pending[key]
+        else:
+            await asyncio.shield(pending)
+    
+    async def next_number(self, db: AsyncSession, tenant_id: UUID, doc_type: str) -> int:
+        """Issue one number for a tenant and document type."""
+        numbers = await self.next_numbers(db, tenant_id, doc_type, 1)
+        return numbers[0]
+    
+    async def _reserve(self, db: AsyncSession, tenant_id: UUID, doc_type: str, count: int) -> list[int]:
+        """Reserve ``count`` numbers on a separate connection; returns [first, last]."""
+        async with db.bind.connect() as conn:
+            result = await conn.execute(
+                _RESERVE_BLOCK_SQL,
+                {"tenant_id": tenant_id, "doc_type": doc_type, "count": count}
+            )
+            last = result.scalar_one()
+            await conn.commit()
+        return [last - count + 1, last]
+
+
+document_numbers = DocumentNumberAllocator()
+
+
+def format_document_number(doc_type: str, number: int) -> str:
+    """ORD-000042."""
+    return f"{doc_type}-{number:06d}"
+
+
+async def next_document_number(db: AsyncSession, tenant_id: UUID, doc_type: str) -> str:
+    """Issue a formatted document number, e.g. ``RCP-000042``."""
+    return format_document_number(doc_type, await document_numbers.next_number(db, tenant_id, doc_type))
@@ -8,6 +8,7 @@ from app.models.base import Base
 # Import all models to register them with Base
 from app.models import (  # noqa: F401
     Tenant,
+    DocumentCounter,
     Role,
     User,
     Session,
@@ -18,8 +19,16 @@ from app.models import (  # noqa: F401
     Rack,
     Cell,
     Inventory,
+    StockSummary,
     Receipt,
     ReceiptItem,
+    CostLayer,
+    CostLayerConsumption,
+    InventoryMovement,
+    InventoryCheckpoint,
+    InventoryCheckpointBalance,
+    InventorySnapshot,
+    InventorySnapshotRun,
     Transfer,
     Order,
     OrderItem,
@@ -29,6 +38,9 @@ from app.models import (  # noqa: F401
     StorageCharge,
     OrderAdjustment,
     MarketplaceFee,
+    PnLDailyRollup,
+    Invoice,
+    InvoiceLine,
     Integration,
     SyncLog,
     Notification,
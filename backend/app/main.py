@@ -10,6 +10,7 @@ from app.modules.warehouse.router import router as warehouse_router
 from app.modules.warehouse.cells_router import router as warehouse_cells_router
 from app.modules.orders.router import router as orders_router
 from app.modules.finance.router import router as finance_router
+from app.modules.billing.router import router as billing_router
 from app.modules.integrations.router import router as integrations_router
 from app.modules.notifications.router import router as notifications_router
 from app.modules.dashboard.router import router as dashboard_router
@@ -33,6 +34,7 @@ app.include_router(warehouse_router, prefix="/api/v1")
 app.include_router(warehouse_cells_router, prefix="/api/v1")
 app.include_router(orders_router, prefix="/api/v1")
 app.include_router(finance_router, prefix="/api/v1")
+app.include_router(billing_router, prefix="/api/v1")
 app.include_router(integrations_router, prefix="/api/v1")
 app.include_router(notifications_router, prefix="/api/v1")
 app.include_router(dashboard_router, prefix="/api/v1")
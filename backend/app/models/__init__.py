@@ -1,12 +1,13 @@
 """Models package - exports all models."""
 
 from app.models.base import Base, TimestampMixin
-from app.models.tenant import Tenant
+from app.models.tenant import Tenant, DocumentCounter
 from app.models.user import Role, User, Session
 from app.models.product import Category, Product, ProductCostHistory
-from app.models.warehouse import Warehouse, Zone, Rack, Cell, Inventory, Receipt, ReceiptItem, Transfer
+from app.models.warehouse import Warehouse, Zone, Rack, Cell, Inventory, StockSummary, Receipt, ReceiptItem, CostLayer, CostLayerConsumption, InventoryMovement, InventoryCheckpoint, InventoryCheckpointBalance, InventorySnapshot, InventorySnapshotRun, Transfer
 from app.models.order import OrderStatus, Order, OrderItem, Reservation, OrderHistory
-from app.models.finance import Tariff, StorageCharge, OrderAdjustment, MarketplaceFee
+from app.models.finance import Tariff, StorageCharge, OrderAdjustment, MarketplaceFee, PnLDailyRollup
+from app.models.billing import Invoice, InvoiceLine
 from app.models.integration import Integration, SyncLog
 from app.models.notification import Notification
 
@@ -14,6 +15,7 @@ __all__ = [
     "Base",
     "TimestampMixin",
     "Tenant",
+    "DocumentCounter",
     "Role",
     "User",
     "Session",
@@ -25,8 +27,16 @@ __all__ = [
     "Rack",
     "Cell",
     "Inventory",
+    "StockSummary",
     "Receipt",
     "ReceiptItem",
+    "CostLayer",
+    "CostLayerConsumption",
+    "InventoryMovement",
+    "InventoryCheckpoint",
+    "InventoryCheckpointBalance",
+    "InventorySnapshot",
+    "InventorySnapshotRun",
     "Transfer",
     "OrderStatus",
     "Order",
@@ -37,6 +47,9 @@ __all__ = [
     "StorageCharge",
     "OrderAdjustment",
     "MarketplaceFee",
+    "PnLDailyRollup",
+    "Invoice",
+    "InvoiceLine",
     "Integration",
     "SyncLog",
     "Notification",
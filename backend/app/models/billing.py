@@ -0,0 +1,79 @@
+"""Billing models: Invoice, InvoiceLine."""
+
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, ForeignKey, Numeric, Integer, Date, UniqueConstraint
+from uuid import UUID, uuid4
+from datetime import date
+from decimal import Decimal
+
+from app.models.base import Base, TimestampMixin
+
+# Forward references for type hints
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from app.models.tenant import Tenant
+
+
+class Invoice(Base, TimestampMixin):
+    """Invoice of a tenant for one billing period (a calendar month)."""
+    
+    __tablename__ = "invoices"
+    
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    invoice_number: Mapped[str] = mapped_column(String(50), nullable=False)
+    period_start: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    period_end: Mapped[date] = mapped_column(Date, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="draft", server_default="draft", nullable=False)
+    lines_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    total_amount: Mapped[Decimal] = mapped_column(
+        Numeric(14, 2),
+        default=Decimal("0"),
+        server_default="0",
+        nullable=False
+    )
+    
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'period_start', name='uq_invoice_tenant_period'),
+    )
+    
+    # Relationships
+    tenant: Mapped["Tenant"] = relationship("Tenant")
+    lines: Mapped[list["InvoiceLine"]] = relationship(
+        "InvoiceLine",
+        back_populates="invoice",
+        cascade="all, delete-orphan",
+        order_by="InvoiceLine.line_type"
+    )
+
+
+class InvoiceLine(Base):
+    """Invoice line: storage of a product, a per-order fee or an adjustment."""
+    
+    __tablename__ = "invoice_lines"
+    
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    invoice_id: Mapped[UUID] = mapped_column(
+        ForeignKey("invoices.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    line_type: Mapped[str] = mapped_column(String(30), nullable=False)
+    description: Mapped[str] = mapped_column(String(255), nullable=False)
+    order_id: Mapped[UUID | None] = mapped_column(
+        ForeignKey("orders.id", ondelete="SET NULL"),
+        nullable=True
+    )
+    product_id: Mapped[UUID | None] = mapped_column(
+        ForeignKey("products.id", ondelete="SET NULL"),
+        nullable=True
+    )
+    quantity: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    amount: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False)
+    
+    # Relationships
+    invoice: Mapped["Invoice"] = relationship("Invoice", back_populates="lines")
@@ -1,7 +1,7 @@
-"""Finance models: Tariff, StorageCharge, OrderAdjustment."""
+"""Finance models: Tariff, StorageCharge, OrderAdjustment, MarketplaceFee, PnLDailyRollup."""
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey, Text, Integer, Numeric, Date, DateTime, UniqueConstraint
+from sqlalchemy import String, ForeignKey, Text, Integer, Numeric, Date, DateTime, UniqueConstraint, Computed, Index
 from decimal import Decimal
 from uuid import UUID, uuid4
 from datetime import date, datetime
@@ -13,45 +13,46 @@ from app.models.base import Base, TimestampMixin
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from app.models.tenant import Tenant
-    from app.models.product import Product
+    from app.models.product import Product, Category
     from app.models.order import Order
     from app.models.user import User
     from app.models.integration import Integration
 
 
 class Tariff(Base, TimestampMixin):
-    """Tariff (pricing configuration per tenant)."""
+    """Tariff rate of one type, effective for a date range.
+    
+    Types: ``processing`` and ``packaging`` (per order), ``storage`` (per
+    unit and day), ``storage_volume`` (per m³ and day).  Rows without a
+    tenant are defaults for tenants that have no rate of their own.
+    ``effective_to`` is inclusive; NULL means open-ended.
+    """
     
     __tablename__ = "tariffs"
     
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
-    tenant_id: Mapped[UUID] = mapped_column(
+    tenant_id: Mapped[UUID | None] = mapped_column(
         ForeignKey("tenants.id", ondelete="CASCADE"),
-        nullable=False,
-        unique=True,
-        index=True
+        nullable=True
     )
-    processing_rate: Mapped[Decimal] = mapped_column(
-        Numeric(10, 4),
-        default=Decimal("0"),
-        server_default="0",
-        nullable=False
-    )
-    storage_rate: Mapped[Decimal] = mapped_column(
-        Numeric(10, 4),
-        default=Decimal("0"),
-        server_default="0",
+    tariff_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    rate: Mapped[Decimal] = mapped_column(Numeric(12, 4), nullable=False)
+    unit: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    effective_from: Mapped[date] = mapped_column(Date, nullable=False)
+    effective_to: Mapped[date | None] = mapped_column(Date, nullable=True)
+    created_by: Mapped[UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="RESTRICT"),
         nullable=False
     )
-    packaging_rate: Mapped[Decimal] = mapped_column(
-        Numeric(10, 4),
-        default=Decimal("0"),
-        server_default="0",
-        nullable=False
+    
+    __table_args__ = (
+        Index('idx_tariffs_tenant', 'tenant_id'),
+        Index('idx_tariffs_type', 'tariff_type'),
+        Index('idx_tariffs_effective', 'effective_from', 'effective_to'),
     )
     
     # Relationships
-    tenant: Mapped["Tenant"] = relationship("Tenant")
+    tenant: Mapped["Tenant | None"] = relationship("Tenant")
 
 
 class StorageCharge(Base):
@@ -127,7 +128,11 @@ class OrderAdjustment(Base):
 
 
 class MarketplaceFee(Base, TimestampMixin):
-    """Marketplace fee configuration."""
+    """One component of an integration's marketplace fee.
+    
+    Components without a category apply to every order of the integration;
+    a category's components apply to the order lines of that category.
+    """
     
     __tablename__ = "marketplace_fees"
     
@@ -137,9 +142,55 @@ class MarketplaceFee(Base, TimestampMixin):
         nullable=False,
         index=True
     )
+    category_id: Mapped[UUID | None] = mapped_column(
+        ForeignKey("categories.id", ondelete="CASCADE"),
+        nullable=True
+    )
     fee_type: Mapped[str] = mapped_column(String(20), nullable=False)  # "percent" or "fixed"
     fee_value: Mapped[Decimal] = mapped_column(Numeric(10, 4), nullable=False)
     is_active: Mapped[bool] = mapped_column(default=True, nullable=False)
     
     # Relationships
     integration: Mapped["Integration"] = relationship("Integration")
+    category: Mapped["Category | None"] = relationship("Category")
+
+
+class PnLDailyRollup(Base):
+    """PnL totals of non-cancelled orders per tenant, creation day and source.
+    
+    Sums of the PnL columns stored on the orders, maintained in the same
+    transaction as every change that affects an order's PnL (creation,
+    shipping, cancellation, adjustments, tariff recomputes).  Rebuilt for a
+    date range by ``PnLRollupService.rebuild``.
+    """
+    
+    __tablename__ = "pnl_daily_rollups"
+    
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    source: Mapped[str] = mapped_column(String(50), primary_key=True)
+    orders_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    revenue: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    cost_of_goods: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    processing_cost: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    packaging_cost: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    storage_cost: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    marketplace_fee: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    shipping_cost: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    other_costs: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=Decimal("0"), server_default="0", nullable=False)
+    margin: Mapped[Decimal] = mapped_column(
+        Numeric(14, 2),
+        Computed(
+            "revenue - cost_of_goods - processing_cost - packaging_cost - "
+            "storage_cost - marketplace_fee - shipping_cost - other_costs",
+            persisted=True
+        )
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
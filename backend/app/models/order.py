@@ -3,7 +3,7 @@
 import enum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import String, ForeignKey, Text, Integer, Numeric, DateTime, UniqueConstraint, func
-from sqlalchemy import Computed
+from sqlalchemy import Computed, Index
 from decimal import Decimal
 from uuid import UUID, uuid4
 from datetime import datetime
@@ -72,7 +72,7 @@ class Order(Base, TimestampMixin):
         nullable=False
     )
     
-    # PnL fields
+    # PnL fields (costs are written by PnLRollupService.recompute_orders)
     cost_of_goods: Mapped[Decimal] = mapped_column(
         Numeric(12, 2),
         default=Decimal("0"),
@@ -143,7 +143,8 @@ class Order(Base, TimestampMixin):
     
     __table_args__ = (
         UniqueConstraint('tenant_id', 'order_number', name='uq_order_tenant_number'),
-        UniqueConstraint('tenant_id', 'status', 'created_at', name='idx_orders_tenant_status_created'),
+        Index('idx_orders_tenant_status_created', 'tenant_id', 'status', 'created_at'),
+        Index('idx_orders_tenant_created_id', 'tenant_id', 'created_at', 'id'),
     )
     
     # Relationships
@@ -252,10 +253,10 @@ class OrderHistory(Base):
     )
     old_status: Mapped[OrderStatus | None] = mapped_column(nullable=True)
     new_status: Mapped[OrderStatus] = mapped_column(nullable=False)
-    changed_by: Mapped[UUID] = mapped_column(
+    changed_by: Mapped[UUID | None] = mapped_column(
         ForeignKey("users.id", ondelete="SET NULL"),
-        nullable=False
-    )
+        nullable=True
+    )  # NULL for system runs (batch allocation)
     changed_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=datetime.utcnow,
@@ -265,4 +266,4 @@ class OrderHistory(Base):
     
     # Relationships
     order: Mapped["Order"] = relationship("Order")
-    user: Mapped["User"] = relationship("User")
+    user: Mapped["User | None"] = relationship("User")
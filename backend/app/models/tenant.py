@@ -1,7 +1,7 @@
-"""Tenant model."""
+"""Tenant models: Tenant, DocumentCounter."""
 
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Text, Numeric
+from sqlalchemy import String, Text, Numeric, BigInteger, ForeignKey
 from decimal import Decimal
 from uuid import UUID, uuid4
 
@@ -32,3 +32,20 @@ class Tenant(Base, TimestampMixin):
         nullable=False
     )
     is_active: Mapped[bool] = mapped_column(default=True, nullable=False)
+
+
+class DocumentCounter(Base):
+    """Last issued document number per tenant and document type.
+
+    Advanced in blocks by ``app.core.numbering`` outside of business
+    transactions, like a sequence: numbers are never reused, gaps are allowed.
+    """
+    
+    __tablename__ = "document_counters"
+    
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    doc_type: Mapped[str] = mapped_column(String(20), primary_key=True)
+    last_value: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
@@ -1,7 +1,7 @@
-"""Warehouse models: Warehouse, Zone, Rack, Cell, Inventory."""
+"""Warehouse models: Warehouse, Zone, Rack, Cell, Inventory, StockSummary, receipts, cost layers."""
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey, Text, Integer, Numeric, Boolean, Date, DateTime, UniqueConstraint
+from sqlalchemy import String, ForeignKey, Text, Integer, BigInteger, Numeric, Boolean, Date, DateTime, UniqueConstraint, Computed, Identity, Index, func, text
 from decimal import Decimal
 from uuid import UUID, uuid4
 from datetime import datetime, date
@@ -138,6 +138,35 @@ class Inventory(Base, TimestampMixin):
     tenant: Mapped["Tenant"] = relationship("Tenant")
 
 
+class StockSummary(Base):
+    """Available-to-promise stock per tenant and product.
+    
+    Maintained in the same transaction as every change of ``inventory``
+    quantities, so it always equals the sum over the product's cells.
+    Rebuilt from ``inventory`` by ``StockSummaryService.reconcile``.
+    """
+    
+    __tablename__ = "stock_summary"
+    
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    product_id: Mapped[UUID] = mapped_column(
+        ForeignKey("products.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True
+    )
+    on_hand: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    reserved: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    available: Mapped[int] = mapped_column(Integer, Computed("on_hand - reserved", persisted=True))
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+
+
 class Receipt(Base, TimestampMixin):
     """Receipt document."""
     
@@ -149,7 +178,7 @@ class Receipt(Base, TimestampMixin):
         nullable=False,
         index=True
     )
-    receipt_number: Mapped[str] = mapped_column(String(50), nullable=False, unique=True, index=True)
+    receipt_number: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
     status: Mapped[str] = mapped_column(String(30), default="draft", nullable=False, index=True)
     expected_date: Mapped[date | None] = mapped_column(Date, nullable=True)
     supplier: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -160,6 +189,10 @@ class Receipt(Base, TimestampMixin):
     )
     completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'receipt_number', name='uq_receipt_tenant_number'),
+    )
+    
     # Relationships
     items: Mapped[list["ReceiptItem"]] = relationship("ReceiptItem", back_populates="receipt", cascade="all, delete-orphan")
     tenant: Mapped["Tenant"] = relationship("Tenant")
@@ -188,6 +221,7 @@ class ReceiptItem(Base, TimestampMixin):
     )
     lot_number: Mapped[str | None] = mapped_column(String(100), nullable=True)
     expiry_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+    unit_cost: Mapped[Decimal | None] = mapped_column(Numeric(12, 2), nullable=True)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     
     # Relationships
@@ -196,6 +230,196 @@ class ReceiptItem(Base, TimestampMixin):
     cell: Mapped["Cell | None"] = relationship("Cell")
 
 
+class CostLayer(Base):
+    """FIFO cost layer: units of one inbound lot at their purchase cost.
+    
+    Created with every receipt line; shipments consume the oldest layers of
+    a product first (see ``CostLayerConsumption``).
+    """
+    
+    __tablename__ = "cost_layers"
+    
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    product_id: Mapped[UUID] = mapped_column(
+        ForeignKey("products.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    receipt_item_id: Mapped[UUID | None] = mapped_column(
+        ForeignKey("receipt_items.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True
+    )
+    received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    unit_cost: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    remaining_quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    
+    __table_args__ = (
+        # Open layers of a product in consumption order
+        Index(
+            'idx_cost_layers_open', 'product_id', 'received_at', 'id',
+            postgresql_where=text('remaining_quantity > 0')
+        ),
+    )
+
+
+class CostLayerConsumption(Base):
+    """Units of a cost layer shipped with an order line."""
+    
+    __tablename__ = "cost_layer_consumptions"
+    
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    layer_id: Mapped[UUID] = mapped_column(
+        ForeignKey("cost_layers.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    order_id: Mapped[UUID] = mapped_column(
+        ForeignKey("orders.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    order_item_id: Mapped[UUID] = mapped_column(
+        ForeignKey("order_items.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    unit_cost: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+
+
+class InventoryMovement(Base):
+    """Append-only ledger of inventory changes, one row per lot and document.
+    
+    Written in the same statement as every change of ``inventory``
+    quantities: ``quantity`` and ``reserved_quantity`` are the deltas of the
+    lot's on-hand and reserved units.  Rows are never updated or deleted.
+    """
+    
+    __tablename__ = "inventory_movements"
+    
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    product_id: Mapped[UUID] = mapped_column(
+        ForeignKey("products.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    cell_id: Mapped[UUID] = mapped_column(
+        ForeignKey("cells.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    # No foreign key: emptied lots may be removed, their history stays
+    inventory_id: Mapped[UUID | None] = mapped_column(nullable=True)
+    lot_number: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    movement_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    reserved_quantity: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    document_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    document_id: Mapped[UUID | None] = mapped_column(nullable=True)
+    occurred_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+    
+    __table_args__ = (
+        Index('idx_inventory_movements_tenant_product', 'tenant_id', 'product_id', 'occurred_at'),
+        Index('idx_inventory_movements_cell', 'cell_id', 'occurred_at'),
+        # Deltas since a checkpoint
+        Index('idx_inventory_movements_occurred_at', 'occurred_at'),
+    )
+
+
+class InventoryCheckpoint(Base):
+    """Balances of every lot key at ``as_of``, derived from the movement ledger.
+    
+    Point-in-time balances start from the latest checkpoint before the
+    requested time and add the movements after it.
+    """
+    
+    __tablename__ = "inventory_checkpoints"
+    
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    as_of: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, unique=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+
+
+class InventoryCheckpointBalance(Base):
+    """Non-zero balance of a (tenant, product, cell) at a checkpoint."""
+    
+    __tablename__ = "inventory_checkpoint_balances"
+    
+    checkpoint_id: Mapped[UUID] = mapped_column(
+        ForeignKey("inventory_checkpoints.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    product_id: Mapped[UUID] = mapped_column(
+        ForeignKey("products.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    cell_id: Mapped[UUID] = mapped_column(
+        ForeignKey("cells.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    reserved_quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class InventorySnapshot(Base):
+    """End-of-day stock of a product in a cell, one row per day.
+    
+    Range-partitioned by month of ``snapshot_date``; partitions are created
+    by ``InventorySnapshotService`` and dropped by its retention policy.
+    No foreign keys, so history outlives deleted cells and products.
+    """
+    
+    __tablename__ = "inventory_snapshots"
+    
+    snapshot_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    tenant_id: Mapped[UUID] = mapped_column(primary_key=True)
+    product_id: Mapped[UUID] = mapped_column(primary_key=True)
+    cell_id: Mapped[UUID] = mapped_column(primary_key=True)
+    lot_number: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    reserved_quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    
+    __table_args__ = {"postgresql_partition_by": "RANGE (snapshot_date)"}
+
+
+class InventorySnapshotRun(Base):
+    """Completed snapshot of a day; a day without a run has no snapshot."""
+    
+    __tablename__ = "inventory_snapshot_runs"
+    
+    snapshot_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    rows_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+
+
 class Transfer(Base, TimestampMixin):
     """Transfer between cells."""
     
@@ -0,0 +1 @@
+"""Billing module."""
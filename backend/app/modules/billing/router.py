@@ -0,0 +1,80 @@
+"""Billing router."""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+
+from app.auth.permissions import require_permission, require_role, Permission, get_tenant_filter
+from app.database import get_db
+from app.models import User
+from app.tasks.celery_app import celery_app
+from .schemas import InvoiceResponse, InvoiceDetailResponse, BillingRunResponse
+from .service import BillingService, month_period, previous_month
+
+router = APIRouter(prefix="/billing", tags=["billing"])
+
+
+@router.get("/invoices", response_model=list[InvoiceResponse])
+async def list_invoices(
+    response: Response,
+    period: str | None = Query(None, description="YYYY-MM"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_VIEW))
+):
+    """List invoices, newest first; the next page is in ``X-Next-Cursor``."""
+    service = BillingService(db)
+    try:
+        invoices, next_cursor = await service.list_invoices(tenant_id, period, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return invoices
+
+
+@router.get("/invoices/{invoice_id}", response_model=InvoiceDetailResponse)
+async def get_invoice(
+    invoice_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_VIEW))
+):
+    """Get an invoice with its lines."""
+    service = BillingService(db)
+    invoice = await service.get_invoice(invoice_id, tenant_id)
+    if not invoice:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Invoice {invoice_id} not found"
+        )
+    return invoice
+
+
+@router.post("/runs", response_model=BillingRunResponse)
+async def start_billing_run(
+    period: str | None = Query(None, description="YYYY-MM, default: previous month"),
+    regenerate: bool = False,
+    user: User = Depends(require_role("admin"))
+):
+    """Queue the billing run of a month for all active tenants.
+    
+    Tenants that already have an invoice for the month are skipped, so a
+    failed or interrupted run is resumed by starting it again.  With
+    ``regenerate`` draft invoices are built anew.
+    """
+    period = period or previous_month()
+    try:
+        month_period(period)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    result = celery_app.send_task("app.tasks.billing.run_monthly_billing", args=[period, regenerate])
+    return BillingRunResponse(period=period, task_id=result.id)
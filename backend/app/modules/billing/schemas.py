@@ -0,0 +1,48 @@
+"""Billing schemas."""
+
+from pydantic import BaseModel
+from uuid import UUID
+from decimal import Decimal
+from datetime import datetime, date
+
+
+class InvoiceLineResponse(BaseModel):
+    """Invoice line response schema."""
+    id: UUID
+    line_type: str
+    description: str
+    order_id: UUID | None
+    product_id: UUID | None
+    quantity: int
+    amount: Decimal
+    
+    class Config:
+        from_attributes = True
+
+
+class InvoiceResponse(BaseModel):
+    """Invoice response schema."""
+    id: UUID
+    tenant_id: UUID
+    invoice_number: str
+    period_start: date
+    period_end: date
+    status: str
+    lines_count: int
+    total_amount: Decimal
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class InvoiceDetailResponse(InvoiceResponse):
+    """Invoice with lines."""
+    lines: list[InvoiceLineResponse]
+
+
+class BillingRunResponse(BaseModel):
+    """Queued billing run."""
+    period: str
+    task_id: str
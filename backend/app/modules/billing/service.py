@@ -0,0 +1,216 @@
+"""Monthly billing: invoices per tenant and period."""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, text, bindparam, any_, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.orm import selectinload
+from uuid import UUID
+from datetime import date, timedelta
+
+from app.models import Tenant, Order, OrderStatus, Invoice
+from app.core.numbering import INVOICE
+from app.modules.orders.service import encode_cursor, decode_cursor
+
+
+STORAGE = "storage"
+PROCESSING = "processing"
+PACKAGING = "packaging"
+ADJUSTMENT = "adjustment"
+
+LINE_TYPES = (STORAGE, PROCESSING, PACKAGING, ADJUSTMENT)
+
+# Invoices and their lines for a shard of tenants in one statement.  Lines:
+# storage charges of the period per product, processing and packaging of
+# every order shipped in the period, manual adjustments recorded in the
+# period.  Tenants that already have an invoice for the period are left
+# alone, so the statement can be re-run and run concurrently for
+# overlapping shards.  Invoice numbers come from the tenants' INV counters
+# in ``document_counters`` (shared with the block allocator of
+# app.core.numbering), taken in tenant order; a number lost to a concurrent
+# shard is a gap, as with any document type.
+_BILL_TENANTS_SQL = text("""
+    WITH tenants AS (
+        SELECT t.id AS tenant_id
+        FROM tenants t
+        WHERE t.id = ANY(CAST(:tenant_ids AS uuid[]))
+          AND NOT EXISTS (
+              SELECT 1 FROM invoices i
+              WHERE i.tenant_id = t.id AND i.period_start = :period_start
+          )
+    ),
+    numbers AS (
+        INSERT INTO document_counters (tenant_id, doc_type, last_value)
+        SELECT tenant_id, :doc_type, 1 FROM tenants ORDER BY tenant_id
+        ON CONFLICT (tenant_id, doc_type) DO UPDATE
+        SET last_value = document_counters.last_value + 1
+        RETURNING tenant_id, last_value
+    ),
+    lines AS (
+        SELECT sc.tenant_id, 'storage' AS line_type, 'Storage ' || p.sku AS description,
+               CAST(NULL AS uuid) AS order_id, sc.product_id,
+               SUM(sc.quantity) AS quantity, SUM(sc.amount) AS amount
+        FROM storage_charges sc
+        JOIN tenants t ON t.tenant_id = sc.tenant_id
+        JOIN products p ON p.id = sc.product_id
+        WHERE sc.charge_date BETWEEN :period_start AND :period_end
+        GROUP BY sc.tenant_id, sc.product_id, p.sku
+        UNION ALL
+        SELECT o.tenant_id, c.line_type, c.label || ' ' || o.order_number,
+               o.id, NULL, 1, c.amount
+        FROM orders o
+        JOIN tenants t ON t.tenant_id = o.tenant_id
+        CROSS JOIN LATERAL (
+            VALUES ('processing', 'Processing', o.processing_cost),
+                   ('packaging', 'Packaging', o.packaging_cost)
+        ) AS c(line_type, label, amount)
+        WHERE o.shipped_at >= :period_start
+          AND o.shipped_at < CAST(:period_end AS date) + 1
+          AND o.status <> :cancelled
+          AND c.amount <> 0
+        UNION ALL
+        SELECT o.tenant_id, 'adjustment', LEFT(a.adjustment_type || ': ' || a.description, 255),
+               o.id, NULL, 1, a.amount
+        FROM order_adjustments a
+        JOIN orders o ON o.id = a.order_id
+        JOIN tenants t ON t.tenant_id = o.tenant_id
+        WHERE a.created_at >= :period_start
+          AND a.created_at < CAST(:period_end AS date) + 1
+    ),
+    invoices AS (
+        INSERT INTO invoices (
+            id, tenant_id, invoice_number, period_start, period_end,
+            status, lines_count, total_amount, created_at, updated_at
+        )
+        SELECT gen_random_uuid(), t.tenant_id,
+               :doc_type || '-' || LPAD(CAST(n.last_value AS text), GREATEST(6, LENGTH(CAST(n.last_value AS text))), '0'),
+               :period_start, :period_end,
+               'draft', COUNT(l.amount), COALESCE(SUM(l.amount), 0), now(), now()
+        FROM tenants t
+        JOIN numbers n ON n.tenant_id = t.tenant_id
+        LEFT JOIN lines l ON l.tenant_id = t.tenant_id
+        GROUP BY t.tenant_id, n.last_value
+        ORDER BY t.tenant_id
+        ON CONFLICT (tenant_id, period_start) DO NOTHING
+        RETURNING id, tenant_id
+    ),
+    inserted AS (
+        INSERT INTO invoice_lines (
+            id, invoice_id, line_type, description, order_id, product_id, quantity, amount
+        )
+        SELECT gen_random_uuid(), i.id, l.line_type, l.description, l.order_id, l.product_id,
+               l.quantity, l.amount
+        FROM invoices i
+        JOIN lines l ON l.tenant_id = i.tenant_id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM invoices) AS invoices, (SELECT COUNT(*) FROM inserted) AS lines
+""").bindparams(bindparam("cancelled", OrderStatus.CANCELLED, type_=Order.status.type))
+
+
+def month_period(period: str) -> tuple[date, date]:
+    """First and last day of a month given as ``YYYY-MM``."""
+    try:
+        year, month = (int(part) for part in period.split("-"))
+        start = date(year, month, 1)
+    except ValueError:
+        raise ValueError(f"Invalid period: {period}, expected YYYY-MM")
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def previous_month(today: date | None = None) -> str:
+    """``YYYY-MM`` of the month before `today`."""
+    last_day = (today or date.today()).replace(day=1) - timedelta(days=1)
+    return f"{last_day.year:04d}-{last_day.month:02d}"
+
+
+def shards(items: list, size: int) -> list[list]:
+    """Split `items` into consecutive chunks of at most `size`."""
+    return [items[n:n + size] for n in range(0, len(items), size)]
+
+
+class BillingService:
+    """Service for tenant invoices."""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_unbilled_tenants(self, period_start: date, regenerate: bool = False) -> list[UUID]:
+        """Active tenants without an invoice for the period (with `regenerate`: or with a draft one)."""
+        billed = select(Invoice.tenant_id).where(Invoice.period_start == period_start)
+        if regenerate:
+            billed = billed.where(Invoice.status != "draft")
+        result = await self.db.execute(
+            select(Tenant.id)
+            .where(Tenant.is_active == True, Tenant.id.not_in(billed))
+            .order_by(Tenant.id)
+        )
+        return list(result.scalars().all())
+    
+    async def bill_tenants(
+        self,
+        tenant_ids: list[UUID],
+        period: str,
+        regenerate: bool = False
+    ) -> dict:
+        """Create the period's invoices of a shard of tenants in one transaction and commit.
+        
+        Tenants already invoiced for the period are skipped; with
+        `regenerate` their draft invoices are replaced first.
+        """
+        period_start, period_end = month_period(period)
+        if regenerate:
+            await self.db.execute(
+                delete(Invoice).where(
+                    Invoice.tenant_id == any_(bindparam("tenant_ids", list(tenant_ids), type_=ARRAY(PG_UUID(as_uuid=True)))),
+                    Invoice.period_start == period_start,
+                    Invoice.status == "draft"
+                )
+            )
+        result = await self.db.execute(
+            _BILL_TENANTS_SQL,
+            {
+                "tenant_ids": list(tenant_ids),
+                "period_start": period_start,
+                "period_end": period_end,
+                "doc_type": INVOICE,
+            }
+        )
+        invoices, lines = result.one()
+        await self.db.commit()
+        return {"invoices_created": invoices, "lines_created": lines}
+    
+    async def list_invoices(
+        self,
+        tenant_id: UUID | None,
+        period: str | None = None,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> tuple[list[Invoice], str | None]:
+        """Page of invoices, newest first, and the cursor of the next page."""
+        query = select(Invoice)
+        if tenant_id:
+            query = query.where(Invoice.tenant_id == tenant_id)
+        if period:
+            query = query.where(Invoice.period_start == month_period(period)[0])
+        if cursor:
+            created_at, invoice_id = decode_cursor(cursor)
+            query = query.where(tuple_(Invoice.created_at, Invoice.id) < tuple_(created_at, invoice_id))
+        result = await self.db.execute(
+            query.order_by(Invoice.created_at.desc(), Invoice.id.desc()).limit(limit + 1)
+        )
+        invoices = list(result.scalars().all())
+        
+        next_cursor = None
+        if len(invoices) > limit:
+            invoices = invoices[:limit]
+            next_cursor = encode_cursor(invoices[-1].created_at, invoices[-1].id)
+        return invoices, next_cursor
+    
+    async def get_invoice(self, invoice_id: UUID, tenant_id: UUID | None = None) -> Invoice | None:
+        """Get an invoice with its lines."""
+        query = select(Invoice).options(selectinload(Invoice.lines)).where(Invoice.id == invoice_id)
+        if tenant_id:
+            query = query.where(Invoice.tenant_id == tenant_id)
+        result = await self.db.execute(query)
+        return result.scalar_one_or_none()
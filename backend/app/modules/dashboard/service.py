@@ -50,9 +50,9 @@ class DashboardService:
             try:
                 pnl_report = await pnl_service.generate_pnl_report(tenant_id, today, today)
                 pnl_today = {
-                    "revenue": pnl_report.get("total_revenue", 0.0),
-                    "margin": pnl_report.get("total_margin", 0.0),
-                    "margin_percent": pnl_report.get("margin_percent", 0.0)
+                    "revenue": float(pnl_report["total_revenue"]),
+                    "margin": float(pnl_report["total_margin"]),
+                    "margin_percent": float(pnl_report["margin_percent"])
                 }
             except Exception:
                 pass  # Если нет данных, используем значения по умолчанию
@@ -0,0 +1,146 @@
+"""Compiled marketplace fee schedules with a per-process cache."""
+
+from collections.abc import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, cast, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from uuid import UUID
+from decimal import Decimal, ROUND_HALF_UP
+
+from app.models import MarketplaceFee
+from app.modules.finance.tariff_cache import _micros
+
+
+PERCENT = "percent"
+FIXED = "fixed"
+
+FEE_TYPES = (PERCENT, FIXED)
+
+CENT = Decimal("0.01")
+
+
+class FeeSchedule:
+    """Active fee components of one integration, summed by type and category.
+    
+    Components without a category apply to every order: the percent to the
+    value of its lines, the fixed amount once per order.  A category's own
+    percent replaces the integration-wide percent for lines of that
+    category; its fixed amount is added once per order with such lines.
+    """
+    
+    def __init__(self, rows: Iterable):
+        self.percent: dict[UUID | None, Decimal] = {}
+        self.fixed: dict[UUID | None, Decimal] = {}
+        for row in rows:
+            target = self.percent if row.fee_type == PERCENT else self.fixed
+            target[row.category_id] = target.get(row.category_id, Decimal("0")) + row.fee_value
+    
+    def fee(self, lines: Iterable[tuple[UUID | None, Decimal]]) -> Decimal:
+        """Fee of one order from its (category_id, line value) pairs, in cents."""
+        default_percent = self.percent.get(None, Decimal("0"))
+        amount = self.fixed.get(None, Decimal("0"))
+        categories = set()
+        for category_id, value in lines:
+            amount += value * self.percent.get(category_id, default_percent) / 100
+            categories.add(category_id)
+        amount += sum(self.fixed.get(category_id, Decimal("0")) for category_id in categories - {None})
+        return amount.quantize(CENT, ROUND_HALF_UP)
+
+
+def order_fees(schedules: dict[UUID, FeeSchedule], rows: Iterable) -> dict[UUID, Decimal]:
+    """Fees of a batch of orders.
+    
+    `rows` carry ``order_id``, ``integration_id``, ``category_id`` and
+    ``value`` (line value per category, None for an order without lines).
+    """
+    lines: dict[UUID, list] = {}
+    integrations: dict[UUID, UUID] = {}
+    for row in rows:
+        integrations[row.order_id] = row.integration_id
+        order_lines = lines.setdefault(row.order_id, [])
+        if row.value is not None:
+            order_lines.append((row.category_id, row.value))
+    return {
+        order_id: schedules[integrations[order_id]].fee(order_lines)
+        for order_id, order_lines in lines.items()
+    }
+
+
+class FeeCache:
+    """Per-process cache of compiled fee schedules by integration.
+    
+    Fees are written by the API but read by every process, Celery workers
+    included, so entries are checked against the stored fees on each
+    `get_many`, as tariff schedules are: the version of an integration's
+    schedule is the number of its fee rows (inactive ones included) and
+    the sum of their ``updated_at``.  One grouped aggregate checks all
+    requested integrations; `invalidate` only spares the check in the
+    writing process.
+    """
+    
+    def __init__(self):
+        self._schedules: dict[UUID, tuple[tuple[int, int], FeeSchedule]] = {}
+    
+    async def get_many(self, db: AsyncSession, integration_ids: Iterable[UUID]) -> dict[UUID, FeeSchedule]:
+        """Current schedules of integrations; changed and missing ones are loaded with one query."""
+        integration_ids = set(integration_ids)
+        cached_ids = [integration_id for integration_id in integration_ids if integration_id in self._schedules]
+        schedules = {}
+        if cached_ids:
+            result = await db.execute(
+                select(
+                    MarketplaceFee.integration_id,
+                    func.count(),
+                    func.coalesce(func.sum(cast(func.extract("epoch", MarketplaceFee.updated_at) * 1000000, BigInteger)), 0)
+                ).where(
+                    MarketplaceFee.integration_id == any_(
+                        bindparam("integration_ids", cached_ids, type_=ARRAY(PG_UUID(as_uuid=True)))
+                    )
+                ).group_by(MarketplaceFee.integration_id)
+            )
+            versions = {row[0]: (row[1], int(row[2])) for row in result.all()}
+            for integration_id in cached_ids:
+                version, schedule = self._schedules[integration_id]
+                if version == versions.get(integration_id, (0, 0)):
+                    schedules[integration_id] = schedule
+        missing = [integration_id for integration_id in integration_ids if integration_id not in schedules]
+        if missing:
+            schedules.update(await self.load(db, missing))
+        return schedules
+    
+    async def load(self, db: AsyncSession, integration_ids: list[UUID]) -> dict[UUID, FeeSchedule]:
+        """(Re)load schedules of many integrations with one query."""
+        result = await db.execute(
+            select(
+                MarketplaceFee.integration_id,
+                MarketplaceFee.category_id,
+                MarketplaceFee.fee_type,
+                MarketplaceFee.fee_value,
+                MarketplaceFee.is_active,
+                MarketplaceFee.updated_at,
+            ).where(
+                MarketplaceFee.integration_id == any_(
+                    bindparam("integration_ids", list(integration_ids), type_=ARRAY(PG_UUID(as_uuid=True)))
+                )
+            )
+        )
+        by_integration: dict[UUID, list] = {integration_id: [] for integration_id in integration_ids}
+        for row in result.all():
+            by_integration[row.integration_id].append(row)
+        
+        schedules = {}
+        for integration_id, rows in by_integration.items():
+            version = (len(rows), sum(_micros(row.updated_at) for row in rows))
+            schedules[integration_id] = FeeSchedule(row for row in rows if row.is_active)
+            self._schedules[integration_id] = (version, schedules[integration_id])
+        return schedules
+    
+    def invalidate(self, integration_id: UUID | None = None) -> None:
+        """Drop an integration's schedule, or all of them."""
+        if integration_id is None:
+            self._schedules.clear()
+        else:
+            self._schedules.pop(integration_id, None)
+
+
+fee_cache = FeeCache()
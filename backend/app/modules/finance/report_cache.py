@@ -0,0 +1,165 @@
+"""Report result cache in Redis, with a per-process fallback.
+
+Entries are keyed by (tenant, report type, period, group_by) and carry the
+fingerprint of the stored data they were computed from.  Every write that
+changes the stored PnL of an order (order changes, adjustments, tariff and
+fee recomputes) goes through the daily rollup and stamps the rollup rows of
+the order's day, so the fingerprint of a period changes exactly when
+something inside the period changed.  Daily storage charges are per product,
+not per order, and do not enter the PnL reports.  A lookup with a
+different fingerprint is a miss and the entry is replaced.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from uuid import UUID
+from datetime import date
+from decimal import Decimal
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+PNL = "pnl"
+
+
+def report_key(tenant_id: UUID, report_type: str, start_date: date, end_date: date, group_by: str) -> str:
+    """Cache key of a report."""
+    return f"{tenant_id}:{report_type}:{start_date}:{end_date}:{group_by}"
+
+
+def is_closed(end_date: date, today: date | None = None) -> bool:
+    """Whether a period lies entirely in past months."""
+    return end_date < (today or date.today()).replace(day=1)
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    raise TypeError(f"Cannot cache {type(value).__name__}")
+
+
+def _decode(value: dict):
+    if "__decimal__" in value:
+        return Decimal(value["__decimal__"])
+    return value
+
+
+def dumps(fingerprint: str, report: dict) -> str:
+    """Serialize an entry; Decimals are kept exact."""
+    return json.dumps({"fingerprint": fingerprint, "report": report}, default=_encode)
+
+
+def loads(raw: str | bytes) -> tuple[str, dict]:
+    """Fingerprint and report of a serialized entry."""
+    entry = json.loads(raw, object_hook=_decode)
+    return entry["fingerprint"], entry["report"]
+
+
+class ReportCache:
+    """Report results in Redis, or in process memory while Redis is unreachable.
+    
+    Entries of closed periods (past months) never expire; those of periods
+    that are still open expire after `ttl` seconds.  Hit, miss and error
+    counts are kept per process.
+    """
+    
+    def __init__(
+        self,
+        url: str,
+        ttl: int = 600,
+        prefix: str = "fms:report:",
+        local_size: int = 1024,
+        retry_after: float = 30
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.local_size = local_size
+        self.retry_after = retry_after
+        self._client = None
+        self._client_loop = None
+        self._down_until = 0.0
+        self._local: OrderedDict[str, tuple[float | None, str]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "errors": 0}
+    
+    def _redis(self):
+        """Redis client of the running event loop, None while Redis is marked down."""
+        if time.monotonic() < self._down_until:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            self._client_loop = loop
+        return self._client
+    
+    def _failed(self, e: Exception) -> None:
+        self.stats["errors"] += 1
+        self._down_until = time.monotonic() + self.retry_after
+        logger.warning("Report cache: Redis unavailable, using process memory: %s", e)
+    
+    async def _read(self, key: str) -> str | bytes | None:
+        client = self._redis()
+        if client is not None:
+            try:
+                return await client.get(self.prefix + key)
+            except Exception as e:
+                self._failed(e)
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at is not None and time.monotonic() > expires_at:
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return raw
+    
+    async def _write(self, key: str, raw: str, ttl: int | None) -> None:
+        client = self._redis()
+        if client is not None:
+            try:
+                await client.set(self.prefix + key, raw, ex=ttl)
+                return
+            except Exception as e:
+                self._failed(e)
+        self._local[key] = (None if ttl is None else time.monotonic() + ttl, raw)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+    
+    async def get(self, key: str, fingerprint: str) -> dict | None:
+        """Cached report computed from data with `fingerprint`, or None."""
+        raw = await self._read(key)
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+        cached_fingerprint, report = loads(raw)
+        if cached_fingerprint != fingerprint:
+            self.stats["stale"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return report
+    
+    async def set(self, key: str, fingerprint: str, report: dict, closed: bool = False) -> None:
+        """Store a report; entries of closed periods do not expire."""
+        await self._write(key, dumps(fingerprint, report), None if closed else self.ttl)
+    
+    def get_stats(self) -> dict:
+        """Counters of this process and the backend in use."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "backend": "memory" if time.monotonic() < self._down_until else "redis",
+            "local_entries": len(self._local),
+        }
+
+
+report_cache = ReportCache(settings.REDIS_URL)
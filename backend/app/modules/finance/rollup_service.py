@@ -0,0 +1,372 @@
+"""Stored per-order PnL and the daily PnL rollup."""
+
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, func, cast, text, or_, tuple_, any_, bindparam, Date, Numeric, Select
+from sqlalchemy.dialects.postgresql import insert as pg_insert, ARRAY, UUID as PG_UUID
+from uuid import UUID
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from app.models import (
+    Tariff,
+    Order,
+    OrderItem,
+    OrderStatus,
+    Product,
+    OrderAdjustment,
+    PnLDailyRollup,
+    CostLayerConsumption,
+)
+from .fee_cache import fee_cache, order_fees
+from .tariff_cache import PROCESSING, PACKAGING
+
+
+COST_COLUMNS = (
+    "cost_of_goods",
+    "processing_cost",
+    "packaging_cost",
+    "storage_cost",
+    "marketplace_fee",
+    "shipping_cost",
+    "other_costs",
+)
+
+MONEY_COLUMNS = ("revenue",) + COST_COLUMNS
+
+# Order columns written by the recompute; revenue (total_amount) and
+# shipping_cost are inputs of the order itself.
+RECOMPUTED_COLUMNS = tuple(name for name in COST_COLUMNS if name != "shipping_cost")
+
+# Target statuses whose transition changes an order's PnL: cancelled orders
+# drop out of the rollup, shipped ones move to the cost of the FIFO layers
+# they consumed.
+PNL_STATUSES = frozenset({OrderStatus.SHIPPED, OrderStatus.CANCELLED})
+
+
+def line_cost_of_goods(*conditions):
+    """Cost of goods per order line of the orders matching `conditions`.
+    
+    Shipped units are at the cost of the FIFO layers they consumed, the
+    rest (not shipped yet, or older than cost layers) at the line's cost
+    price.  Returns the expression and the subquery to outer-join on
+    ``order_item_id``.
+    """
+    consumed = (
+        select(
+            CostLayerConsumption.order_item_id,
+            func.sum(CostLayerConsumption.quantity).label("quantity"),
+            func.sum(CostLayerConsumption.quantity * CostLayerConsumption.unit_cost).label("amount")
+        )
+        .join(Order, Order.id == CostLayerConsumption.order_id)
+        .where(*conditions)
+        .group_by(CostLayerConsumption.order_item_id)
+        .subquery("consumed")
+    )
+    amount = (
+        OrderItem.cost_price * (OrderItem.quantity - func.coalesce(consumed.c.quantity, 0))
+        + func.coalesce(consumed.c.amount, 0)
+    )
+    return amount, consumed
+
+
+def order_pnl_query(*conditions, fees: dict[UUID, Decimal]) -> Select:
+    """Revenue and costs computed from their sources, one row per order.
+    
+    Only the recompute uses this; everything else reads the columns it
+    stores on the order (`stored_pnl_query`).  Costs are aggregated by
+    joined subqueries restricted to the same orders, so any number of orders
+    is computed by a single statement.  Marketplace fees are computed from
+    the cached fee schedules beforehand (`fees` by order id) and passed in
+    as arrays.  Amounts are rounded to cents per order.
+    """
+    line_cogs, consumed = line_cost_of_goods(*conditions)
+    cogs = (
+        select(OrderItem.order_id, func.sum(line_cogs).label("amount"))
+        .join(Order, Order.id == OrderItem.order_id)
+        .outerjoin(consumed, consumed.c.order_item_id == OrderItem.id)
+        .where(*conditions)
+        .group_by(OrderItem.order_id)
+        .subquery("cogs")
+    )
+    adjustments = (
+        select(OrderAdjustment.order_id, func.sum(OrderAdjustment.amount).label("amount"))
+        .join(Order, Order.id == OrderAdjustment.order_id)
+        .where(*conditions)
+        .group_by(OrderAdjustment.order_id)
+        .subquery("adjustments")
+    )
+    fee_amounts = select(
+        func.unnest(bindparam("fee_order_ids", list(fees), type_=ARRAY(PG_UUID(as_uuid=True)))).label("order_id"),
+        func.unnest(bindparam("fee_amounts", list(fees.values()), type_=ARRAY(Numeric(12, 2)))).label("amount"),
+    ).subquery("fees")
+    
+    def rate(tariff_type):
+        # Rate effective on the order date; the tenant's own before the default
+        day = cast(Order.created_at, Date)
+        return (
+            select(Tariff.rate)
+            .where(
+                Tariff.tariff_type == tariff_type,
+                or_(Tariff.tenant_id == Order.tenant_id, Tariff.tenant_id.is_(None)),
+                Tariff.effective_from <= day,
+                or_(Tariff.effective_to.is_(None), Tariff.effective_to >= day)
+            )
+            .order_by(Tariff.tenant_id.is_(None), Tariff.effective_from.desc())
+            .limit(1)
+            .correlate(Order)
+            .scalar_subquery()
+        )
+    
+    def cents(value, name):
+        return func.round(func.coalesce(value, 0), 2).label(name)
+    
+    return (
+        select(
+            Order.id.label("order_id"),
+            Order.tenant_id,
+            Order.created_at,
+            Order.source,
+            Order.total_amount.label("revenue"),
+            cents(cogs.c.amount, "cost_of_goods"),
+            cents(rate(PROCESSING), "processing_cost"),
+            cents(rate(PACKAGING), "packaging_cost"),
+            # Storage is charged per product and day, not per order
+            # (billed on the invoice), so it has no per-order share.
+            cast(0, Numeric(12, 2)).label("storage_cost"),
+            cents(fee_amounts.c.amount, "marketplace_fee"),
+            Order.shipping_cost,
+            cents(adjustments.c.amount, "other_costs"),
+        )
+        .outerjoin(cogs, cogs.c.order_id == Order.id)
+        .outerjoin(adjustments, adjustments.c.order_id == Order.id)
+        .outerjoin(fee_amounts, fee_amounts.c.order_id == Order.id)
+        .where(*conditions)
+    )
+
+
+def stored_pnl_query(*conditions) -> Select:
+    """Stored revenue and costs, one row per order matching `conditions`."""
+    return select(
+        Order.id.label("order_id"),
+        Order.tenant_id,
+        Order.created_at,
+        Order.source,
+        Order.total_amount.label("revenue"),
+        *[getattr(Order, name) for name in COST_COLUMNS],
+    ).where(*conditions)
+
+
+def period_conditions(
+    tenant_id: UUID | None,
+    start_date: date,
+    end_date: date,
+    include_cancelled: bool = False
+) -> list:
+    """Orders (of a tenant) created from start_date to end_date inclusive.
+    
+    Cancelled orders are left out unless `include_cancelled`.
+    """
+    conditions = [
+        Order.created_at >= datetime.combine(start_date, time.min),
+        Order.created_at < datetime.combine(end_date + timedelta(days=1), time.min),
+    ]
+    if not include_cancelled:
+        conditions.append(Order.status != OrderStatus.CANCELLED)
+    if tenant_id:
+        conditions.append(Order.tenant_id == tenant_id)
+    return conditions
+
+
+def _order_ids(order_ids: list[UUID]):
+    return Order.id == any_(bindparam("order_ids", list(order_ids), type_=ARRAY(PG_UUID(as_uuid=True))))
+
+
+class PnLRollupService:
+    """Service for the stored per-order PnL and the (tenant, day, source) rollup.
+    
+    The cost columns of an order are recomputed whenever one of their
+    sources changes, and the rollup aggregates exactly what is stored, so
+    taking an order out of the rollup always removes what was added.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    def _rollup_rows(self, sign: int, *conditions) -> Select:
+        """Rollup rows of the orders matching `conditions`, times `sign`."""
+        day = cast(func.date_trunc("day", Order.created_at), Date)
+        return (
+            select(
+                Order.tenant_id,
+                day.label("day"),
+                Order.source,
+                (func.count() * sign).label("orders_count"),
+                (func.sum(Order.total_amount) * sign).label("revenue"),
+                *[(func.sum(getattr(Order, name)) * sign).label(name) for name in COST_COLUMNS],
+                func.now().label("updated_at"),
+            )
+            .where(*conditions)
+            .group_by(Order.tenant_id, day, Order.source)
+            .order_by(Order.tenant_id, day, Order.source)
+        )
+    
+    async def apply_orders(self, order_ids: list[UUID], sign: int = 1) -> None:
+        """Add (`sign` = 1) or remove (-1) the stored PnL of orders.
+        
+        Cancelled orders contribute nothing.  Must be called in the
+        transaction that changes the orders; does not commit.
+        """
+        if not order_ids:
+            return
+        rows = self._rollup_rows(sign, _order_ids(order_ids), Order.status != OrderStatus.CANCELLED)
+        stmt = pg_insert(PnLDailyRollup).from_select(
+            ["tenant_id", "day", "source", "orders_count", *MONEY_COLUMNS, "updated_at"], rows
+        )
+        await self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["tenant_id", "day", "source"],
+                set_={
+                    **{
+                        name: getattr(PnLDailyRollup, name) + stmt.excluded[name]
+                        for name in ("orders_count", *MONEY_COLUMNS)
+                    },
+                    "updated_at": func.now(),
+                }
+            )
+        )
+    
+    async def recompute_orders(self, order_ids: list[UUID]) -> int:
+        """Write freshly computed costs into the PnL columns of orders.
+        
+        One statement for any number of orders; rows whose costs did not
+        change are not touched.  Does not update the rollup (see
+        `add_orders` and `tracking`).  Returns the number of changed orders.
+        """
+        if not order_ids:
+            return 0
+        fees = await self.marketplace_fees(order_ids)
+        pnl = order_pnl_query(_order_ids(order_ids), fees=fees).subquery("order_pnl")
+        result = await self.db.execute(
+            update(Order)
+            .where(
+                Order.id == pnl.c.order_id,
+                tuple_(*[getattr(Order, name) for name in RECOMPUTED_COLUMNS]).is_distinct_from(
+                    tuple_(*[pnl.c[name] for name in RECOMPUTED_COLUMNS])
+                )
+            )
+            .values({name: pnl.c[name] for name in RECOMPUTED_COLUMNS})
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    async def marketplace_fees(self, order_ids: list[UUID]) -> dict[UUID, Decimal]:
+        """Fees of marketplace orders: one query for their lines, schedules from the cache."""
+        result = await self.db.execute(
+            select(
+                Order.id.label("order_id"),
+                Order.integration_id,
+                Product.category_id,
+                func.sum(OrderItem.price * OrderItem.quantity).label("value"),
+            )
+            .select_from(Order)
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(Product, Product.id == OrderItem.product_id)
+            .where(_order_ids(order_ids), Order.integration_id.is_not(None))
+            .group_by(Order.id, Order.integration_id, Product.category_id)
+        )
+        rows = result.all()
+        schedules = await fee_cache.get_many(self.db, {row.integration_id for row in rows})
+        return order_fees(schedules, rows)
+    
+    async def add_orders(self, order_ids: list[UUID]) -> int:
+        """Compute the PnL columns of new orders and add them to the rollup."""
+        changed = await self.recompute_orders(order_ids)
+        await self.apply_orders(order_ids, 1)
+        return changed
+    
+    async def _lock_orders(self, order_ids: list[UUID]) -> None:
+        if order_ids:
+            await self.db.execute(
+                select(Order.id).where(_order_ids(order_ids)).order_by(Order.id).with_for_update()
+            )
+    
+    @asynccontextmanager
+    async def tracking(self, order_ids: list[UUID]):
+        """Keep stored PnL and the rollup in step with changes made inside the block.
+        
+        The orders are locked and their PnL is taken out of the rollup on
+        entry; on exit it is recomputed and added back.
+        """
+        await self._lock_orders(order_ids)
+        await self.apply_orders(order_ids, -1)
+        yield
+        await self.add_orders(order_ids)
+    
+    async def refresh_orders(self, order_ids: list[UUID]) -> int:
+        """Recompute existing orders after a cost source changed (tariffs, fees).
+        
+        Does not commit; returns the number of orders whose PnL changed.
+        """
+        await self._lock_orders(order_ids)
+        await self.apply_orders(order_ids, -1)
+        return await self.add_orders(order_ids)
+    
+    async def recompute(
+        self,
+        start_date: date,
+        end_date: date,
+        tenant_id: UUID | None = None
+    ) -> dict:
+        """Recompute stored PnL of orders created from start_date to end_date (bulk job).
+        
+        Works one creation day per transaction, so the job runs alongside
+        normal traffic and an interrupted run can simply be started again.
+        Fee schedules are reloaded first, the job may run in a process that
+        has not seen the latest fee changes.
+        """
+        fee_cache.invalidate()
+        stats = {"days": 0, "orders": 0, "orders_changed": 0}
+        day = start_date
+        while day <= end_date:
+            result = await self.db.execute(
+                select(Order.id).where(*period_conditions(tenant_id, day, day, include_cancelled=True))
+            )
+            order_ids = list(result.scalars().all())
+            stats["orders_changed"] += await self.refresh_orders(order_ids)
+            await self.db.commit()
+            stats["days"] += 1
+            stats["orders"] += len(order_ids)
+            day += timedelta(days=1)
+        return stats
+    
+    async def rebuild(
+        self,
+        start_date: date,
+        end_date: date,
+        tenant_id: UUID | None = None
+    ) -> dict:
+        """Recompute the rollup for a date range (one tenant or all) and commit.
+        
+        Rollup writers are blocked for the duration, so changes committed
+        meanwhile are either in the recomputed rows or applied after them.
+        """
+        await self.db.execute(text("LOCK TABLE pnl_daily_rollups IN SHARE ROW EXCLUSIVE MODE"))
+        
+        stale = delete(PnLDailyRollup).where(
+            PnLDailyRollup.day >= start_date,
+            PnLDailyRollup.day <= end_date
+        )
+        if tenant_id:
+            stale = stale.where(PnLDailyRollup.tenant_id == tenant_id)
+        removed = await self.db.execute(stale)
+        
+        rows = self._rollup_rows(1, *period_conditions(tenant_id, start_date, end_date))
+        written = await self.db.execute(
+            insert(PnLDailyRollup).from_select(
+                ["tenant_id", "day", "source", "orders_count", *MONEY_COLUMNS, "updated_at"], rows
+            )
+        )
+        
+        await self.db.commit()
+        return {"rows_removed": removed.rowcount, "rows_written": written.rowcount}
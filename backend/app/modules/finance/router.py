@@ -1,27 +1,75 @@
 """Finance router."""
 
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, status
 from uuid import UUID
 from datetime import date
+from typing import Literal
 
-from app.auth.permissions import require_permission, Permission, get_tenant_filter
+from app.auth.permissions import require_permission, require_role, Permission, get_tenant_filter
 from app.auth.dependencies import get_current_user
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
+from app.core.export import negotiate_format, stream_export, CSV, ARROW
 from app.models import User
+from app.tasks.celery_app import celery_app
 from sqlalchemy.ext.asyncio import AsyncSession
-from .schemas import TariffResponse, TariffUpdate, PnLResponse, PnLReportResponse
-from .service import TariffService, PnLService
+from .schemas import (
+    TariffResponse,
+    TariffCreate,
+    TariffUpdate,
+    TariffRatesResponse,
+    MarketplaceFeeResponse,
+    MarketplaceFeeCreate,
+    PnLResponse,
+    PnLReportResponse,
+    OrderAdjustmentCreate,
+    OrderAdjustmentResponse,
+    PnLRollupRebuildResponse,
+    PnLRecomputeResponse,
+    ReportCacheStatsResponse,
+)
+from .service import TariffService, MarketplaceFeeService, PnLService, PNL_EXPORT_COLUMNS
+from .rollup_service import PnLRollupService
+from .report_cache import report_cache
 
 router = APIRouter(prefix="/finance", tags=["finance"])
 
 
-@router.get("/tariffs", response_model=TariffResponse | None)
+def _queue_pnl_recompute(tenant_id: UUID | None, start_date: date, end_date: date | None) -> None:
+    """Queue the PnL recompute of orders created from start_date to end_date (None: today)."""
+    end_date = min(end_date or date.today(), date.today())
+    if start_date <= end_date:
+        celery_app.send_task(
+            "app.tasks.finance.recompute_order_pnl",
+            args=[start_date.isoformat(), end_date.isoformat(), str(tenant_id) if tenant_id else None]
+        )
+
+
+@router.get("/tariffs", response_model=list[TariffResponse])
 async def get_tariffs(
+    on: date | None = None,
+    tenant_id: UUID | None = None,
     db: AsyncSession = Depends(get_db),
-    tenant_id: UUID | None = Depends(get_tenant_filter),
+    tenant_filter: UUID | None = Depends(get_tenant_filter),
     user: User = Depends(require_permission(Permission.FINANCE_VIEW))
 ):
-    """Get tariffs for current tenant."""
+    """List tariff versions of current tenant, optionally only those effective on a date.
+    
+    Admins pass ``tenant_id``; without it they get the default tariffs.
+    """
+    service = TariffService(db)
+    return await service.get_tariffs(tenant_filter or tenant_id, on)
+
+
+@router.get("/tariffs/rates", response_model=TariffRatesResponse)
+async def get_tariff_rates(
+    on: date | None = None,
+    tenant_id: UUID | None = None,
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_VIEW))
+):
+    """Rates effective on a date (default: today), tenant rates over defaults."""
+    tenant_id = tenant_filter or tenant_id
     if not tenant_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -29,27 +77,114 @@ async def get_tariffs(
         )
     
     service = TariffService(db)
-    tariff = await service.get_tariffs(tenant_id)
+    return await service.get_rates(tenant_id, on or date.today())
+
+
+@router.post("/tariffs", response_model=TariffResponse)
+async def create_tariff(
+    data: TariffCreate,
+    db: AsyncSession = Depends(get_db),
+    tenant_filter: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_EDIT))
+):
+    """Set one rate for a date range (admins: any tenant, or defaults without tenant_id)."""
+    service = TariffService(db)
+    try:
+        tariff = await service.create_tariff(tenant_filter or data.tenant_id, data, user.id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    _queue_pnl_recompute(tariff.tenant_id, tariff.effective_from, tariff.effective_to)
     return tariff
 
 
-@router.put("/tariffs", response_model=TariffResponse)
+@router.put("/tariffs", response_model=list[TariffResponse])
 async def update_tariffs(
     data: TariffUpdate,
+    tenant_id: UUID | None = None,
     db: AsyncSession = Depends(get_db),
-    tenant_id: UUID | None = Depends(get_tenant_filter),
+    tenant_filter: UUID | None = Depends(get_tenant_filter),
     user: User = Depends(require_permission(Permission.FINANCE_EDIT))
 ):
-    """Create or update tariffs for current tenant."""
-    if not tenant_id:
+    """Set new rates of current tenant from ``effective_from`` (default: today) on.
+    
+    Earlier rates stay in effect before that date.  Admins pass ``tenant_id``;
+    without it they change the default tariffs.  PnL of orders created since
+    ``effective_from`` is recomputed in the background.
+    """
+    service = TariffService(db)
+    tariffs = await service.update_tariffs(tenant_filter or tenant_id, data, user.id)
+    _queue_pnl_recompute(tenant_filter or tenant_id, data.effective_from or date.today(), None)
+    return tariffs
+
+
+@router.get("/integrations/{integration_id}/fees", response_model=list[MarketplaceFeeResponse])
+async def get_marketplace_fees(
+    integration_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_VIEW))
+):
+    """Get active fee components of an integration."""
+    service = MarketplaceFeeService(db)
+    try:
+        return await service.get_fees(integration_id, tenant_id)
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Tenant ID is required"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
         )
+
+
+@router.post("/integrations/{integration_id}/fees", response_model=MarketplaceFeeResponse)
+async def create_marketplace_fee(
+    integration_id: UUID,
+    data: MarketplaceFeeCreate,
+    recompute_from: date | None = None,
+    db: AsyncSession = Depends(get_db),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_EDIT))
+):
+    """Add a fee component to an integration.
     
-    service = TariffService(db)
-    tariff = await service.update_tariffs(tenant_id, data)
-    return tariff
+    Fees are not dated: PnL of orders created since ``recompute_from``
+    (default: today) is recomputed with the new fees in the background,
+    older orders keep the fees they were priced with.
+    """
+    service = MarketplaceFeeService(db)
+    try:
+        fee = await service.create_fee(integration_id, data, tenant_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    _queue_pnl_recompute(tenant_id, recompute_from or date.today(), None)
+    return fee
+
+
+@router.delete("/integrations/{integration_id}/fees/{fee_id}", response_model=MarketplaceFeeResponse)
+async def deactivate_marketplace_fee(
+    integration_id: UUID,
+    fee_id: UUID,
+    recompute_from: date | None = None,
+    db: AsyncSession = Depends(get_db),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_EDIT))
+):
+    """Switch a fee component off; ``recompute_from`` as for adding one."""
+    service = MarketplaceFeeService(db)
+    try:
+        fee = await service.deactivate_fee(integration_id, fee_id, tenant_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    _queue_pnl_recompute(tenant_id, recompute_from or date.today(), None)
+    return fee
 
 
 @router.get("/orders/{order_id}/pnl", response_model=PnLResponse)
@@ -62,7 +197,7 @@ async def get_order_pnl(
     """Get PnL for an order."""
     service = PnLService(db)
     try:
-        pnl = await service.calculate_order_pnl(order_id)
+        pnl = await service.calculate_order_pnl(order_id, tenant_id)
         return PnLResponse(**pnl)
     except ValueError as e:
         raise HTTPException(
@@ -71,16 +206,43 @@ async def get_order_pnl(
         )
 
 
+@router.post("/orders/{order_id}/adjustments", response_model=OrderAdjustmentResponse)
+async def add_order_adjustment(
+    order_id: UUID,
+    data: OrderAdjustmentCreate,
+    db: AsyncSession = Depends(get_db),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_EDIT))
+):
+    """Add a manual PnL adjustment to an order."""
+    service = PnLService(db)
+    try:
+        return await service.add_adjustment(order_id, data, user.id, tenant_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+
 @router.get("/reports/pnl", response_model=PnLReportResponse)
 async def get_pnl_report(
     start_date: date = Query(..., alias="start_date"),
     end_date: date = Query(..., alias="end_date"),
-    group_by: str = Query("day", alias="group_by"),
+    group_by: Literal["day", "week", "month", "source", "sku"] = Query("day", alias="group_by"),
+    include_orders: bool = False,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
     db: AsyncSession = Depends(get_db),
     tenant_id: UUID | None = Depends(get_tenant_filter),
     user: User = Depends(require_permission(Permission.FINANCE_REPORTS))
 ):
-    """Get PnL report for a period."""
+    """Get PnL report for a period.
+    
+    Totals are broken down by ``group_by``.  Per-order PnL is only included
+    with ``include_orders=true``, a page of ``limit`` orders at a time; pass
+    ``next_cursor`` of the response as ``cursor`` to get the next page.
+    """
     if not tenant_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -88,5 +250,101 @@ async def get_pnl_report(
         )
     
     service = PnLService(db)
-    report = await service.generate_pnl_report(tenant_id, start_date, end_date, group_by)
+    try:
+        report = await service.generate_pnl_report(
+            tenant_id, start_date, end_date, group_by, include_orders, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     return PnLReportResponse(**report)
+
+
+@router.get("/reports/pnl/export")
+async def export_pnl_report(
+    start_date: date,
+    end_date: date,
+    format: Literal["csv", "arrow"] | None = None,
+    accept: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.FINANCE_REPORTS))
+):
+    """Stream per-order PnL of a period as CSV (default) or an Arrow IPC stream.
+    
+    The format comes from ``format`` or the ``Accept`` header; the body is
+    gzipped if the client accepts it.  Rows are read with a server-side
+    cursor, so any period can be exported.
+    """
+    if not tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Tenant ID is required"
+        )
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date is before start_date"
+        )
+    
+    format = negotiate_format(accept, format, (CSV, ARROW)) or CSV
+    return stream_export(
+        format,
+        PNL_EXPORT_COLUMNS,
+        _stream_order_pnls(tenant_id, start_date, end_date),
+        f"pnl_{start_date}_{end_date}",
+        accept_encoding
+    )
+
+
+async def _stream_order_pnls(tenant_id: UUID, start_date: date, end_date: date):
+    """Export row batches; uses its own session because the response outlives get_db."""
+    async with AsyncSessionLocal() as db:
+        async for rows in PnLService(db).stream_order_pnls(tenant_id, start_date, end_date):
+            yield rows
+
+
+@router.post("/reports/pnl/rollup/rebuild", response_model=PnLRollupRebuildResponse)
+async def rebuild_pnl_rollup(
+    start_date: date,
+    end_date: date,
+    tenant_id: UUID | None = None,
+    user: User = Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_db)
+):
+    """Recompute the daily PnL rollup for a date range (one tenant or all)."""
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date is before start_date"
+        )
+    service = PnLRollupService(db)
+    return await service.rebuild(start_date, end_date, tenant_id)
+
+
+@router.post("/reports/pnl/recompute", response_model=PnLRecomputeResponse)
+async def recompute_order_pnl(
+    start_date: date,
+    end_date: date,
+    tenant_id: UUID | None = None,
+    user: User = Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_db)
+):
+    """Recompute stored PnL of orders created in a date range (one tenant or all) and the rollup."""
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date is before start_date"
+        )
+    service = PnLRollupService(db)
+    return await service.recompute(start_date, end_date, tenant_id)
+
+
+@router.get("/reports/cache/stats", response_model=ReportCacheStatsResponse)
+async def get_report_cache_stats(
+    user: User = Depends(require_role("admin"))
+):
+    """Hit/miss counters of the report cache (this process)."""
+    return report_cache.get_stats()
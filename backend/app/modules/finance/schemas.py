@@ -1,51 +1,180 @@
 """Finance schemas."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime, date
+from typing import Literal
+
+
+TariffType = Literal["processing", "packaging", "storage", "storage_volume"]
 
 
 class TariffResponse(BaseModel):
     """Tariff response schema."""
     id: UUID
+    tenant_id: UUID | None
+    tariff_type: str
+    rate: Decimal
+    unit: str | None
+    effective_from: date
+    effective_to: date | None
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class TariffCreate(BaseModel):
+    """One tariff rate for a date range (``effective_to`` inclusive, None = open)."""
+    tenant_id: UUID | None = None
+    tariff_type: TariffType
+    rate: Decimal = Field(..., ge=0)
+    unit: str | None = Field(None, max_length=50)
+    effective_from: date
+    effective_to: date | None = None
+
+
+class TariffUpdate(BaseModel):
+    """New rates effective from a date (default: today) on."""
+    effective_from: date | None = None
+    processing_rate: Decimal | None = Field(None, ge=0)
+    packaging_rate: Decimal | None = Field(None, ge=0)
+    storage_rate: Decimal | None = Field(None, ge=0)
+    storage_volume_rate: Decimal | None = Field(None, ge=0)
+
+
+class TariffRatesResponse(BaseModel):
+    """Rates of a tenant effective on a date."""
     tenant_id: UUID
-    processing_rate: Decimal
-    storage_rate: Decimal
-    packaging_rate: Decimal
+    date: date
+    processing: Decimal
+    packaging: Decimal
+    storage: Decimal
+    storage_volume: Decimal
+
+
+class MarketplaceFeeResponse(BaseModel):
+    """Marketplace fee component response schema."""
+    id: UUID
+    integration_id: UUID
+    category_id: UUID | None
+    fee_type: str
+    fee_value: Decimal
+    is_active: bool
     created_at: datetime
     updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class MarketplaceFeeCreate(BaseModel):
+    """Fee component: percent of line value or fixed amount per order, optionally for one category."""
+    fee_type: Literal["percent", "fixed"]
+    fee_value: Decimal = Field(..., ge=0)
+    category_id: UUID | None = None
+
 
+class OrderAdjustmentCreate(BaseModel):
+    """Manual PnL adjustment; positive amounts are costs, negative ones credits."""
+    adjustment_type: str = Field(..., max_length=50)
+    description: str = Field(..., max_length=255)
+    amount: Decimal
+    reason: str
+
+
+class OrderAdjustmentResponse(BaseModel):
+    """Manual PnL adjustment response schema."""
+    id: UUID
+    order_id: UUID
+    adjustment_type: str
+    description: str
+    amount: Decimal
+    reason: str
+    created_by: UUID
+    created_at: datetime
+    
     class Config:
         from_attributes = True
 
 
-class TariffUpdate(BaseModel):
-    """Tariff update schema."""
-    processing_rate: Decimal | None = None
-    storage_rate: Decimal | None = None
-    packaging_rate: Decimal | None = None
+class PnLRollupRebuildResponse(BaseModel):
+    """PnL rollup rebuild result."""
+    rows_removed: int
+    rows_written: int
+
+
+class PnLRecomputeResponse(BaseModel):
+    """Stored order PnL recompute result."""
+    days: int
+    orders: int
+    orders_changed: int
+
+
+class ReportCacheStatsResponse(BaseModel):
+    """Report cache counters of the serving process."""
+    hits: int
+    misses: int
+    stale: int
+    errors: int
+    hit_ratio: float
+    backend: str
+    local_entries: int
 
 
 class PnLResponse(BaseModel):
     """PnL response schema."""
     order_id: str
-    revenue: float
-    cost_of_goods: float
-    processing_cost: float
-    storage_cost: float
-    marketplace_fee: float
-    total_expenses: float
-    margin: float
-    margin_percent: float
+    created_at: datetime | None = None
+    source: str | None = None
+    revenue: Decimal
+    cost_of_goods: Decimal
+    processing_cost: Decimal
+    packaging_cost: Decimal
+    storage_cost: Decimal
+    marketplace_fee: Decimal
+    shipping_cost: Decimal
+    other_costs: Decimal
+    total_expenses: Decimal
+    margin: Decimal
+    margin_percent: Decimal
+
+
+class PnLGroupResponse(BaseModel):
+    """PnL of one report group (period, source or SKU)."""
+    key: str
+    orders_count: int
+    revenue: Decimal
+    cost_of_goods: Decimal
+    processing_cost: Decimal
+    packaging_cost: Decimal
+    storage_cost: Decimal
+    marketplace_fee: Decimal
+    shipping_cost: Decimal
+    other_costs: Decimal
+    total_expenses: Decimal
+    margin: Decimal
+    margin_percent: Decimal
 
 
 class PnLReportResponse(BaseModel):
     """PnL report response schema."""
     period: dict
-    total_revenue: float
-    total_expenses: float
-    total_margin: float
-    margin_percent: float
+    group_by: str
+    total_revenue: Decimal
+    total_cost_of_goods: Decimal
+    total_processing_cost: Decimal
+    total_packaging_cost: Decimal
+    total_storage_cost: Decimal
+    total_marketplace_fee: Decimal
+    total_shipping_cost: Decimal
+    total_other_costs: Decimal
+    total_expenses: Decimal
+    total_margin: Decimal
+    margin_percent: Decimal
     orders_count: int
-    orders: list[dict] = []
+    groups: list[PnLGroupResponse] = []
+    orders: list[PnLResponse] = []
+    next_cursor: str | None = None
@@ -1,179 +1,509 @@
-"""Finance services: TariffService and PnLService."""
+"""Finance services: TariffService, MarketplaceFeeService and PnLService."""
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from collections.abc import AsyncIterator
+from sqlalchemy import select, func, cast, or_, tuple_, Date
 from uuid import UUID
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
 
 from app.models import (
     Tariff,
+    MarketplaceFee,
+    Integration,
+    Category,
     Order,
     OrderItem,
-    OrderStatus,
-    StorageCharge,
-    MarketplaceFee,
+    OrderAdjustment,
+    PnLDailyRollup,
+    Product,
     Tenant,
 )
-from .schemas import TariffUpdate
+from app.modules.orders.service import encode_cursor, decode_cursor
+from .rollup_service import (
+    COST_COLUMNS,
+    MONEY_COLUMNS,
+    PnLRollupService,
+    stored_pnl_query,
+    period_conditions,
+    line_cost_of_goods,
+)
+from .fee_cache import fee_cache
+from .report_cache import report_cache, report_key, is_closed, PNL
+from .tariff_cache import tariff_cache, PROCESSING, PACKAGING, STORAGE, STORAGE_VOLUME
+from .schemas import TariffCreate, TariffUpdate, MarketplaceFeeCreate, OrderAdjustmentCreate
+
+
+PNL_GROUPS = ("day", "week", "month", "source", "sku")
+
+# Columns of the per-order PnL export: (name, kind) for app.core.export
+PNL_EXPORT_COLUMNS = (
+    ("order_id", "str"),
+    ("order_number", "str"),
+    ("created_at", "datetime"),
+    ("source", "str"),
+    ("status", "str"),
+    ("revenue", "money"),
+    *[(name, "money") for name in COST_COLUMNS],
+    ("margin", "money"),
+)
+
+CENT = Decimal("0.01")
+
+
+def _with_margin(row: dict) -> dict:
+    """Add total_expenses, margin and margin_percent to money columns."""
+    row["total_expenses"] = sum((row[name] for name in COST_COLUMNS), Decimal("0"))
+    row["margin"] = row["revenue"] - row["total_expenses"]
+    row["margin_percent"] = (
+        (row["margin"] / row["revenue"] * 100).quantize(CENT) if row["revenue"] else Decimal("0")
+    )
+    return row
 
 
 class TariffService:
     """Service for tariff operations."""
     
+    # TariffUpdate field -> tariff type and unit
+    UPDATE_FIELDS = {
+        "processing_rate": (PROCESSING, "order"),
+        "packaging_rate": (PACKAGING, "order"),
+        "storage_rate": (STORAGE, "unit/day"),
+        "storage_volume_rate": (STORAGE_VOLUME, "m³/day"),
+    }
+    
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def get_tariffs(self, tenant_id: UUID) -> Tariff | None:
-        """Get tariffs for a tenant."""
+    async def get_tariffs(self, tenant_id: UUID | None, on: date | None = None) -> list[Tariff]:
+        """Get tariff rows of a tenant (None: defaults), optionally effective on a date."""
+        query = select(Tariff).where(
+            Tariff.tenant_id == tenant_id if tenant_id else Tariff.tenant_id.is_(None)
+        )
+        if on:
+            query = query.where(
+                Tariff.effective_from <= on,
+                or_(Tariff.effective_to.is_(None), Tariff.effective_to >= on)
+            )
         result = await self.db.execute(
-            select(Tariff).where(Tariff.tenant_id == tenant_id)
+            query.order_by(Tariff.tariff_type, Tariff.effective_from)
         )
-        return result.scalar_one_or_none()
+        return list(result.scalars().all())
     
-    async def update_tariffs(self, tenant_id: UUID, data: TariffUpdate) -> Tariff:
-        """Create or update tariffs for a tenant."""
-        tariff = await self.get_tariffs(tenant_id)
-        if not tariff:
-            tariff = Tariff(tenant_id=tenant_id)
-            self.db.add(tariff)
-        
-        for key, value in data.model_dump(exclude_unset=True).items():
-            setattr(tariff, key, value)
-        
+    async def get_rates(self, tenant_id: UUID, on: date) -> dict:
+        """Rates of a tenant effective on a date, from the tariff cache."""
+        schedule = await tariff_cache.get(self.db, tenant_id)
+        return {"tenant_id": tenant_id, "date": on, **schedule.rates(on)}
+    
+    async def create_tariff(self, tenant_id: UUID | None, data: TariffCreate, created_by: UUID) -> Tariff:
+        """Set a rate for a date range; overlapping parts of older rates are cut out."""
+        if data.effective_to and data.effective_to < data.effective_from:
+            raise ValueError("effective_to is before effective_from")
+        tariff = await self._set_rate(
+            tenant_id, data.tariff_type, data.rate, data.unit,
+            data.effective_from, data.effective_to, created_by
+        )
         await self.db.commit()
+        tariff_cache.invalidate(tenant_id)
         await self.db.refresh(tariff)
         return tariff
+    
+    async def update_tariffs(self, tenant_id: UUID | None, data: TariffUpdate, created_by: UUID) -> list[Tariff]:
+        """Set new rates from ``data.effective_from`` on and return the rates then effective."""
+        effective_from = data.effective_from or date.today()
+        for field, value in data.model_dump(exclude_unset=True, exclude={"effective_from"}).items():
+            if value is None:
+                continue
+            tariff_type, unit = self.UPDATE_FIELDS[field]
+            await self._set_rate(tenant_id, tariff_type, value, unit, effective_from, None, created_by)
+        
+        await self.db.commit()
+        tariff_cache.invalidate(tenant_id)
+        return await self.get_tariffs(tenant_id, effective_from)
+    
+    async def _set_rate(
+        self,
+        tenant_id: UUID | None,
+        tariff_type: str,
+        rate: Decimal,
+        unit: str | None,
+        effective_from: date,
+        effective_to: date | None,
+        created_by: UUID
+    ) -> Tariff:
+        """Insert a rate version, trimming or splitting the versions it overlaps."""
+        if tenant_id:
+            # Serialize tariff writes of a tenant
+            await self.db.execute(select(Tenant.id).where(Tenant.id == tenant_id).with_for_update())
+        
+        query = select(Tariff).where(
+            Tariff.tenant_id == tenant_id if tenant_id else Tariff.tenant_id.is_(None),
+            Tariff.tariff_type == tariff_type,
+            or_(Tariff.effective_to.is_(None), Tariff.effective_to >= effective_from)
+        )
+        if effective_to:
+            query = query.where(Tariff.effective_from <= effective_to)
+        result = await self.db.execute(query.with_for_update())
+        
+        for old in result.scalars().all():
+            # Part of the old version after the new one
+            if effective_to and (old.effective_to is None or old.effective_to > effective_to):
+                if old.effective_from >= effective_from:
+                    old.effective_from = effective_to + timedelta(days=1)
+                    continue
+                self.db.add(Tariff(
+                    tenant_id=tenant_id,
+                    tariff_type=tariff_type,
+                    rate=old.rate,
+                    unit=old.unit,
+                    effective_from=effective_to + timedelta(days=1),
+                    effective_to=old.effective_to,
+                    created_by=old.created_by
+                ))
+            # Part of the old version before the new one
+            if old.effective_from < effective_from:
+                old.effective_to = effective_from - timedelta(days=1)
+            else:
+                await self.db.delete(old)
+        
+        tariff = Tariff(
+            tenant_id=tenant_id,
+            tariff_type=tariff_type,
+            rate=rate,
+            unit=unit,
+            effective_from=effective_from,
+            effective_to=effective_to,
+            created_by=created_by
+        )
+        self.db.add(tariff)
+        await self.db.flush()
+        return tariff
 
 
-class PnLService:
-    """Service for PnL calculations."""
+class MarketplaceFeeService:
+    """Service for marketplace fee components of integrations."""
     
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def calculate_order_pnl(self, order_id: UUID) -> dict:
-        """Calculate PnL for an order."""
+    async def _get_integration(self, integration_id: UUID, tenant_id: UUID | None) -> Integration:
+        query = select(Integration).where(Integration.id == integration_id)
+        if tenant_id:
+            query = query.where(Integration.tenant_id == tenant_id)
+        result = await self.db.execute(query)
+        integration = result.scalar_one_or_none()
+        if not integration:
+            raise ValueError(f"Integration {integration_id} not found")
+        return integration
+    
+    async def get_fees(self, integration_id: UUID, tenant_id: UUID | None = None) -> list[MarketplaceFee]:
+        """Get active fee components of an integration."""
+        await self._get_integration(integration_id, tenant_id)
         result = await self.db.execute(
-            select(Order)
-            .options(selectinload(Order.items))
-            .where(Order.id == order_id)
+            select(MarketplaceFee)
+            .where(MarketplaceFee.integration_id == integration_id, MarketplaceFee.is_active == True)
+            .order_by(MarketplaceFee.category_id.is_not(None), MarketplaceFee.fee_type, MarketplaceFee.created_at)
         )
-        order = result.scalar_one_or_none()
+        return list(result.scalars().all())
+    
+    async def create_fee(
+        self,
+        integration_id: UUID,
+        data: MarketplaceFeeCreate,
+        tenant_id: UUID | None = None
+    ) -> MarketplaceFee:
+        """Add a fee component to an integration."""
+        integration = await self._get_integration(integration_id, tenant_id)
+        if data.category_id:
+            result = await self.db.execute(
+                select(Category.id).where(
+                    Category.id == data.category_id,
+                    Category.tenant_id == integration.tenant_id
+                )
+            )
+            if result.scalar_one_or_none() is None:
+                raise ValueError(f"Category {data.category_id} not found")
+        
+        fee = MarketplaceFee(integration_id=integration_id, **data.model_dump())
+        self.db.add(fee)
+        await self.db.commit()
+        fee_cache.invalidate(integration_id)
+        await self.db.refresh(fee)
+        return fee
+    
+    async def deactivate_fee(self, integration_id: UUID, fee_id: UUID, tenant_id: UUID | None = None) -> MarketplaceFee:
+        """Switch a fee component off."""
+        await self._get_integration(integration_id, tenant_id)
+        result = await self.db.execute(
+            select(MarketplaceFee).where(
+                MarketplaceFee.id == fee_id,
+                MarketplaceFee.integration_id == integration_id
+            )
+        )
+        fee = result.scalar_one_or_none()
+        if not fee:
+            raise ValueError(f"Fee {fee_id} not found")
+        fee.is_active = False
+        await self.db.commit()
+        fee_cache.invalidate(integration_id)
+        await self.db.refresh(fee)
+        return fee
+
+
+class PnLService:
+    """Service for PnL calculations."""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    @staticmethod
+    def _order_row(row) -> dict:
+        """Per-order PnL dict from a row of stored_pnl_query."""
+        pnl = {"order_id": str(row.order_id), "created_at": row.created_at, "source": row.source}
+        for name in MONEY_COLUMNS:
+            pnl[name] = getattr(row, name)
+        return _with_margin(pnl)
+    
+    async def calculate_order_pnl(self, order_id: UUID, tenant_id: UUID | None = None) -> dict:
+        """PnL of an order, as stored on the order by the recompute."""
+        conditions = [Order.id == order_id]
+        if tenant_id:
+            conditions.append(Order.tenant_id == tenant_id)
+        result = await self.db.execute(stored_pnl_query(*conditions))
+        row = result.first()
         
+        if not row:
+            raise ValueError(f"Order {order_id} not found")
+        return self._order_row(row)
+    
+    async def add_adjustment(
+        self,
+        order_id: UUID,
+        data: OrderAdjustmentCreate,
+        created_by: UUID,
+        tenant_id: UUID | None = None
+    ) -> OrderAdjustment:
+        """Add a manual PnL adjustment (extra cost, negative for a credit) to an order."""
+        query = select(Order).where(Order.id == order_id)
+        if tenant_id:
+            query = query.where(Order.tenant_id == tenant_id)
+        result = await self.db.execute(query)
+        order = result.scalar_one_or_none()
         if not order:
             raise ValueError(f"Order {order_id} not found")
         
-        # Get tariffs
-        tariff_result = await self.db.execute(
-            select(Tariff).where(Tariff.tenant_id == order.tenant_id)
-        )
-        tariff = tariff_result.scalar_one_or_none()
+        async with PnLRollupService(self.db).tracking([order_id]):
+            adjustment = OrderAdjustment(order_id=order_id, created_by=created_by, **data.model_dump())
+            self.db.add(adjustment)
+            order.has_manual_adjustments = True
+            await self.db.flush()
         
-        # Revenue
-        revenue = float(order.total_amount)
+        await self.db.commit()
+        await self.db.refresh(adjustment)
+        return adjustment
+    
+    async def generate_pnl_report(
+        self,
+        tenant_id: UUID,
+        start_date: date,
+        end_date: date,
+        group_by: str = "day",
+        include_orders: bool = False,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> dict:
+        """Generate PnL report for a period.
         
-        # Cost of goods
-        cost_of_goods = sum(
-            float(item.cost_price * item.quantity) for item in order.items
-        )
+        Totals and the `group_by` breakdown are served from the report cache
+        while the stored PnL of the period is unchanged (see
+        `report_cache`), otherwise computed by `_pnl_summary`.  With
+        `include_orders` a keyset page of per-order PnL is added;
+        ``next_cursor`` points to the next page.
+        """
+        if group_by not in PNL_GROUPS:
+            raise ValueError(f"Unknown group_by: {group_by}")
+        if end_date < start_date:
+            raise ValueError("end_date is before start_date")
         
-        # Processing cost
-        processing_cost = float(tariff.processing_rate) if tariff else 0
+        key = report_key(tenant_id, PNL, start_date, end_date, group_by)
+        fingerprint = await self._pnl_fingerprint(tenant_id, start_date, end_date)
+        report = await report_cache.get(key, fingerprint)
+        if report is None:
+            report = await self._pnl_summary(tenant_id, start_date, end_date, group_by)
+            await report_cache.set(key, fingerprint, report, closed=is_closed(end_date))
         
-        # Storage cost
-        storage_cost = await self._calculate_storage_cost(order)
+        report["orders"], report["next_cursor"] = [], None
+        if include_orders:
+            report["orders"], report["next_cursor"] = await self.get_order_pnls(
+                tenant_id, start_date, end_date, limit, cursor
+            )
+        return report
+    
+    async def _pnl_fingerprint(self, tenant_id: UUID, start_date: date, end_date: date) -> str:
+        """Fingerprint of the stored PnL of a period, taken from its rollup rows.
         
-        # Marketplace fee
-        marketplace_fee = await self._get_marketplace_fee(order)
+        Every change of an order's stored PnL rewrites the rollup rows of
+        the order's day with a new ``updated_at``; rows that go away change
+        the count.
+        """
+        rollup = PnLDailyRollup.__table__
+        result = await self.db.execute(
+            select(
+                func.count(),
+                func.max(rollup.c.updated_at),
+                func.sum(func.extract("epoch", rollup.c.updated_at))
+            ).where(
+                rollup.c.tenant_id == tenant_id,
+                rollup.c.day >= start_date,
+                rollup.c.day <= end_date
+            )
+        )
+        count, last_update, stamps = result.one()
+        return f"{count}:{last_update}:{stamps}"
+    
+    async def _pnl_summary(self, tenant_id: UUID, start_date: date, end_date: date, group_by: str) -> dict:
+        """Totals and the `group_by` breakdown of a period.
         
-        # Total expenses
-        total_expenses = cost_of_goods + processing_cost + storage_cost + marketplace_fee
+        One aggregate query: over the daily rollup for day, week, month and
+        source, over the orders themselves for sku.  For ``sku`` the order
+        revenue and order-level costs are split between lines in proportion
+        to the line value; cost of goods is taken per line.
+        """
+        if group_by == "sku":
+            rows = self._sku_rows(tenant_id, start_date, end_date)
+            orders_count = func.count(func.distinct(rows.c.order_id))
+        else:
+            rollup = PnLDailyRollup.__table__
+            if group_by == "source":
+                key = rollup.c.source
+            elif group_by == "day":
+                key = rollup.c.day
+            else:
+                key = cast(func.date_trunc(group_by, rollup.c.day), Date)
+            rows = (
+                select(key.label("key"), rollup.c.orders_count, *[rollup.c[name] for name in MONEY_COLUMNS])
+                .where(
+                    rollup.c.tenant_id == tenant_id,
+                    rollup.c.day >= start_date,
+                    rollup.c.day <= end_date
+                )
+                .subquery("pnl_rows")
+            )
+            orders_count = func.sum(rows.c.orders_count)
         
-        # Margin
-        margin = revenue - total_expenses
-        margin_percent = (margin / revenue * 100) if revenue > 0 else 0
+        result = await self.db.execute(
+            select(
+                func.grouping(rows.c.key).label("is_total"),
+                rows.c.key,
+                orders_count.label("orders_count"),
+                *[func.round(func.sum(rows.c[name]), 2).label(name) for name in MONEY_COLUMNS],
+            )
+            .group_by(func.grouping_sets(tuple_(rows.c.key), tuple_()))
+            .having(or_(func.grouping(rows.c.key) == 1, orders_count != 0))
+            .order_by(func.grouping(rows.c.key), rows.c.key)
+        )
+        
+        totals = _with_margin({name: Decimal("0.00") for name in MONEY_COLUMNS})
+        totals["orders_count"] = 0
+        groups = []
+        for row in result.all():
+            values = {
+                name: Decimal("0.00") if getattr(row, name) is None else getattr(row, name)
+                for name in MONEY_COLUMNS
+            }
+            values["orders_count"] = row.orders_count or 0
+            if row.is_total:
+                totals = _with_margin(values)
+            else:
+                groups.append({"key": str(row.key), **_with_margin(values)})
         
         return {
-            "order_id": str(order_id),
-            "revenue": revenue,
-            "cost_of_goods": cost_of_goods,
-            "processing_cost": processing_cost,
-            "storage_cost": storage_cost,
-            "marketplace_fee": marketplace_fee,
-            "total_expenses": total_expenses,
-            "margin": margin,
-            "margin_percent": round(margin_percent, 2)
+            "period": {"start": str(start_date), "end": str(end_date)},
+            "group_by": group_by,
+            **{f"total_{name}": totals[name] for name in MONEY_COLUMNS},
+            "total_expenses": totals["total_expenses"],
+            "total_margin": totals["margin"],
+            "margin_percent": totals["margin_percent"],
+            "orders_count": totals["orders_count"],
+            "groups": groups,
         }
     
-    async def _calculate_storage_cost(self, order: Order) -> float:
-        """Calculate storage costs (proportional to days)."""
-        if not order.shipped_at:
-            return 0
-        
-        storage_charges = await self.db.execute(
-            select(StorageCharge).where(
-                StorageCharge.tenant_id == order.tenant_id,
-                StorageCharge.order_id == order.id
+    def _sku_rows(self, tenant_id: UUID, start_date: date, end_date: date):
+        """Order PnL split between order lines, keyed by SKU."""
+        conditions = period_conditions(tenant_id, start_date, end_date)
+        orders = stored_pnl_query(*conditions).subquery("order_pnl")
+        line_cogs, consumed = line_cost_of_goods(*conditions)
+        line_value = OrderItem.price * OrderItem.quantity
+        order_value = func.sum(line_value).over(partition_by=OrderItem.order_id)
+        order_quantity = func.sum(OrderItem.quantity).over(partition_by=OrderItem.order_id)
+        share = func.coalesce(
+            line_value / func.nullif(order_value, 0),
+            OrderItem.quantity / cast(func.nullif(order_quantity, 0), OrderItem.price.type)
+        )
+        return (
+            select(
+                Product.sku.label("key"),
+                orders.c.order_id,
+                (orders.c.revenue * share).label("revenue"),
+                line_cogs.label("cost_of_goods"),
+                *[(orders.c[name] * share).label(name) for name in COST_COLUMNS[1:]],
             )
+            .join(OrderItem, OrderItem.order_id == orders.c.order_id)
+            .outerjoin(consumed, consumed.c.order_item_id == OrderItem.id)
+            .join(Product, Product.id == OrderItem.product_id)
+            .subquery("pnl_rows")
         )
-        charges = storage_charges.scalars().all()
-        return sum(float(c.amount) for c in charges)
     
-    async def _get_marketplace_fee(self, order: Order) -> float:
-        """Get marketplace fee."""
-        if not order.integration_id:
-            return 0
-        
-        fee_result = await self.db.execute(
-            select(MarketplaceFee).where(
-                MarketplaceFee.integration_id == order.integration_id,
-                MarketplaceFee.is_active == True
-            )
+    async def get_order_pnls(
+        self,
+        tenant_id: UUID,
+        start_date: date,
+        end_date: date,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        """Page of per-order PnL for a period, oldest first, and the next cursor."""
+        conditions = period_conditions(tenant_id, start_date, end_date)
+        if cursor:
+            created_at, order_id = decode_cursor(cursor)
+            conditions.append(tuple_(Order.created_at, Order.id) > tuple_(created_at, order_id))
+        result = await self.db.execute(
+            stored_pnl_query(*conditions)
+            .order_by(Order.created_at, Order.id)
+            .limit(limit + 1)
         )
-        fee = fee_result.scalar_one_or_none()
-        if not fee:
-            return 0
+        rows = result.all()
         
-        if fee.fee_type == "percent":
-            return float(order.total_amount * fee.fee_value / 100)
-        return float(fee.fee_value)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].order_id)
+        return [self._order_row(row) for row in rows], next_cursor
     
-    async def generate_pnl_report(
+    async def stream_order_pnls(
         self,
         tenant_id: UUID,
         start_date: date,
         end_date: date,
-        group_by: str = "day"
-    ) -> dict:
-        """Generate PnL report for a period."""
-        orders_result = await self.db.execute(
-            select(Order).where(
-                Order.tenant_id == tenant_id,
-                Order.created_at >= start_date,
-                Order.created_at <= end_date,
-                Order.status != OrderStatus.CANCELLED
+        batch_size: int = 5000
+    ) -> AsyncIterator[list[tuple]]:
+        """Batches of PNL_EXPORT_COLUMNS rows for a period, oldest first, from a server-side cursor."""
+        if end_date < start_date:
+            raise ValueError("end_date is before start_date")
+        result = await self.db.stream(
+            select(
+                Order.id,
+                Order.order_number,
+                Order.created_at,
+                Order.source,
+                Order.status,
+                Order.total_amount,
+                *[getattr(Order, name) for name in COST_COLUMNS],
+                Order.margin,
             )
+            .where(*period_conditions(tenant_id, start_date, end_date))
+            .order_by(Order.created_at, Order.id)
+            .execution_options(yield_per=batch_size)
         )
-        orders = orders_result.scalars().all()
-        
-        total_revenue = 0
-        total_expenses = 0
-        order_pnls = []
-        
-        for order in orders:
-            pnl = await self.calculate_order_pnl(order.id)
-            order_pnls.append(pnl)
-            total_revenue += pnl["revenue"]
-            total_expenses += pnl["total_expenses"]
-        
-        return {
-            "period": {"start": str(start_date), "end": str(end_date)},
-            "total_revenue": total_revenue,
-            "total_expenses": total_expenses,
-            "total_margin": total_revenue - total_expenses,
-            "margin_percent": round((total_revenue - total_expenses) / total_revenue * 100, 2) if total_revenue else 0,
-            "orders_count": len(orders),
-            "orders": order_pnls
-        }
+        async for rows in result.partitions():
+            yield [tuple(row) for row in rows]
@@ -0,0 +1,123 @@
+"""Daily storage charges."""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text
+from uuid import UUID
+from datetime import date, timedelta
+
+from app.models import Tenant
+from .tariff_cache import tariff_cache, STORAGE, STORAGE_VOLUME
+
+
+# Charges of one tenant for one day in one statement.  Stock at the end of
+# the day is the current on-hand stock with later movements rolled back:
+# receipts posted after the day are taken out, shipments (fulfilled
+# reservations) after the day are put back.  Transfers do not change the
+# per-product total.  The rate per unit is the unit rate plus the volume
+# rate times the product volume (dimensions in cm).  Existing charges are
+# kept, so the statement can be re-run for any day.  Charges are per product
+# and not attributed to orders, so order PnL is not affected; they are billed
+# with the tenant's monthly invoice.
+_CHARGE_DAY_SQL = text("""
+    WITH movements AS (
+        SELECT product_id, on_hand AS quantity
+        FROM stock_summary
+        WHERE tenant_id = :tenant_id
+        UNION ALL
+        SELECT ri.product_id, -SUM(ri.received_quantity)
+        FROM receipt_items ri
+        JOIN receipts r ON r.id = ri.receipt_id
+        WHERE r.tenant_id = :tenant_id
+          AND ri.created_at >= CAST(:charge_date AS date) + 1
+        GROUP BY ri.product_id
+        UNION ALL
+        SELECT res.product_id, SUM(res.quantity)
+        FROM reservations res
+        JOIN orders o ON o.id = res.order_id
+        WHERE o.tenant_id = :tenant_id
+          AND res.status = 'fulfilled'
+          AND res.fulfilled_at >= CAST(:charge_date AS date) + 1
+        GROUP BY res.product_id
+    ),
+    stock AS (
+        SELECT m.product_id, SUM(m.quantity) AS quantity,
+               CAST(:unit_rate AS numeric)
+                 + COALESCE(p.length * p.width * p.height / 1000000, 0) * CAST(:volume_rate AS numeric)
+                 AS rate
+        FROM movements m
+        JOIN products p ON p.id = m.product_id AND p.is_active
+        GROUP BY m.product_id, p.length, p.width, p.height
+        HAVING SUM(m.quantity) > 0
+    ),
+    charged AS (
+        INSERT INTO storage_charges (
+            id, tenant_id, order_id, charge_date, product_id,
+            quantity, rate, amount, created_at
+        )
+        SELECT gen_random_uuid(), CAST(:tenant_id AS uuid), NULL, CAST(:charge_date AS date), product_id,
+               quantity, ROUND(rate, 4), ROUND(quantity * rate, 2), now()
+        FROM stock
+        WHERE rate > 0
+        ORDER BY product_id
+        ON CONFLICT (tenant_id, charge_date, product_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT COUNT(*) AS created FROM charged
+""")
+
+
+class StorageChargeService:
+    """Service for daily per-product storage charges."""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_billable_tenants(self, start_date: date, end_date: date) -> list[UUID]:
+        """Active tenants that may have a storage rate between start_date and end_date."""
+        result = await self.db.execute(
+            select(Tenant.id).where(Tenant.is_active == True).order_by(Tenant.id)
+        )
+        schedules = await tariff_cache.load(self.db, list(result.scalars().all()))
+        return [
+            tenant_id for tenant_id, schedule in schedules.items()
+            if schedule.charges((STORAGE, STORAGE_VOLUME), start_date, end_date)
+        ]
+    
+    async def charge_day(self, tenant_id: UUID, charge_date: date) -> int:
+        """Charge storage of a tenant's stock at the end of `charge_date`.
+        
+        Rates are those effective on `charge_date`.  Products already
+        charged for the day are skipped.  Commits; returns the number of
+        charges created.
+        """
+        schedule = await tariff_cache.get(self.db, tenant_id)
+        unit_rate = schedule.rate(STORAGE, charge_date)
+        volume_rate = schedule.rate(STORAGE_VOLUME, charge_date)
+        if not unit_rate and not volume_rate:
+            return 0
+        
+        result = await self.db.execute(
+            _CHARGE_DAY_SQL,
+            {
+                "tenant_id": tenant_id,
+                "charge_date": charge_date,
+                "unit_rate": unit_rate,
+                "volume_rate": volume_rate,
+            }
+        )
+        created = result.scalar_one()
+        await self.db.commit()
+        return created
+    
+    async def charge_range(self, tenant_id: UUID, start_date: date, end_date: date) -> int:
+        """Charge every day from start_date to end_date inclusive (backfill).
+        
+        Each day is committed on its own, so an interrupted run can simply
+        be started again.
+        """
+        created = 0
+        day = start_date
+        while day <= end_date:
+            created += await self.charge_day(tenant_id, day)
+            day += timedelta(days=1)
+        return created
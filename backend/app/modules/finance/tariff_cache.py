@@ -0,0 +1,166 @@
+"""Compiled tariff schedules with a per-process cache."""
+
+from bisect import bisect_right
+from collections.abc import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, cast, or_, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from uuid import UUID
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from app.models import Tariff
+
+
+PROCESSING = "processing"
+PACKAGING = "packaging"
+STORAGE = "storage"
+STORAGE_VOLUME = "storage_volume"
+
+TARIFF_TYPES = (PROCESSING, PACKAGING, STORAGE, STORAGE_VOLUME)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class _Intervals:
+    """Non-overlapping [start, end] date intervals with a rate, searchable by date."""
+    
+    def __init__(self, intervals: list[tuple[date, date | None, Decimal]]):
+        self.intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [start for start, _, _ in self.intervals]
+    
+    def find(self, day: date) -> Decimal | None:
+        n = bisect_right(self.starts, day) - 1
+        if n < 0:
+            return None
+        _, end, rate = self.intervals[n]
+        if end is not None and day > end:
+            return None
+        return rate
+    
+    def any_positive(self, start: date, end: date) -> bool:
+        return any(
+            rate > 0 and first <= end and (last is None or last >= start)
+            for first, last, rate in self.intervals
+        )
+
+
+class TariffSchedule:
+    """Rates of one tenant by type and date.
+    
+    The tenant's own rates take precedence over the defaults (rows without
+    a tenant); a type without any rate costs nothing.
+    """
+    
+    def __init__(self, rows: Iterable):
+        own: dict[str, list] = {}
+        defaults: dict[str, list] = {}
+        for row in rows:
+            target = defaults if row.tenant_id is None else own
+            target.setdefault(row.tariff_type, []).append(
+                (row.effective_from, row.effective_to, row.rate)
+            )
+        self._own = {tariff_type: _Intervals(items) for tariff_type, items in own.items()}
+        self._defaults = {tariff_type: _Intervals(items) for tariff_type, items in defaults.items()}
+    
+    def rate(self, tariff_type: str, day: date) -> Decimal:
+        """Rate of a type effective on `day`."""
+        for index in (self._own.get(tariff_type), self._defaults.get(tariff_type)):
+            if index is not None:
+                rate = index.find(day)
+                if rate is not None:
+                    return rate
+        return Decimal("0")
+    
+    def rates(self, day: date) -> dict[str, Decimal]:
+        """Rates of all types effective on `day`."""
+        return {tariff_type: self.rate(tariff_type, day) for tariff_type in TARIFF_TYPES}
+    
+    def charges(self, tariff_types: Iterable[str], start: date, end: date) -> bool:
+        """Whether any of the types may have a non-zero rate between start and end."""
+        return any(
+            index.any_positive(start, end)
+            for tariff_type in tariff_types
+            for index in (self._own.get(tariff_type), self._defaults.get(tariff_type))
+            if index is not None
+        )
+
+
+def _micros(moment: datetime) -> int:
+    """Microseconds since the epoch, exactly (naive values are UTC, as in SQL)."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+class TariffCache:
+    """Per-process cache of compiled tariff schedules.
+    
+    Tariffs are written by the API but read by every process, Celery
+    workers included, so an entry is checked against the stored tariffs on
+    each `get`: the version of a tenant's schedule is the number of its
+    rows (own and default) and the sum of their ``updated_at``.  Any
+    insert, update or delete changes it; the check is one small aggregate
+    instead of loading and compiling the rows.  `invalidate` only spares
+    the check in the writing process.
+    """
+    
+    def __init__(self):
+        self._schedules: dict[UUID, tuple[tuple[int, int], TariffSchedule]] = {}
+    
+    async def get(self, db: AsyncSession, tenant_id: UUID) -> TariffSchedule:
+        """Current schedule of a tenant, reloaded when its tariffs changed."""
+        cached = self._schedules.get(tenant_id)
+        if cached:
+            result = await db.execute(
+                select(
+                    func.count(),
+                    func.coalesce(func.sum(cast(func.extract("epoch", Tariff.updated_at) * 1000000, BigInteger)), 0)
+                ).where(or_(Tariff.tenant_id == tenant_id, Tariff.tenant_id.is_(None)))
+            )
+            count, total = result.one()
+            if cached[0] == (count, int(total)):
+                return cached[1]
+        schedules = await self.load(db, [tenant_id])
+        return schedules[tenant_id]
+    
+    async def load(self, db: AsyncSession, tenant_ids: list[UUID]) -> dict[UUID, TariffSchedule]:
+        """(Re)load schedules of many tenants with one query."""
+        result = await db.execute(
+            select(
+                Tariff.tenant_id,
+                Tariff.tariff_type,
+                Tariff.rate,
+                Tariff.effective_from,
+                Tariff.effective_to,
+                Tariff.updated_at,
+            ).where(
+                or_(
+                    Tariff.tenant_id == any_(bindparam("tenant_ids", list(tenant_ids), type_=ARRAY(PG_UUID(as_uuid=True)))),
+                    Tariff.tenant_id.is_(None)
+                )
+            )
+        )
+        rows = result.all()
+        defaults = [row for row in rows if row.tenant_id is None]
+        by_tenant: dict[UUID, list] = {tenant_id: list(defaults) for tenant_id in tenant_ids}
+        for row in rows:
+            if row.tenant_id is not None:
+                by_tenant[row.tenant_id].append(row)
+        
+        schedules = {}
+        for tenant_id, tenant_rows in by_tenant.items():
+            version = (len(tenant_rows), sum(_micros(row.updated_at) for row in tenant_rows))
+            schedules[tenant_id] = TariffSchedule(tenant_rows)
+            self._schedules[tenant_id] = (version, schedules[tenant_id])
+        return schedules
+    
+    def invalidate(self, tenant_id: UUID | None = None) -> None:
+        """Drop a tenant's schedule, or all of them when defaults changed."""
+        if tenant_id is None:
+            self._schedules.clear()
+        else:
+            self._schedules.pop(tenant_id, None)
+
+
+tariff_cache = TariffCache()
@@ -8,6 +8,7 @@ from datetime import datetime, date
 from decimal import Decimal
 
 from app.models import Integration, Order, OrderItem, OrderStatus, Product, SyncLog
+from app.modules.finance.rollup_service import PnLRollupService
 
 
 class MarketplaceClient(ABC):
@@ -114,6 +115,7 @@ class IntegrationService:
         created = 0
         updated = 0
         errors = []
+        created_ids = []
         
         for order_data in orders:
             try:
@@ -196,11 +198,16 @@ class IntegrationService:
                     for item in items
                 )
                 
+                created_ids.append(order.id)
                 created += 1
-                
+            
             except Exception as e:
                 errors.append(f"Error processing order {order_data.get('external_id', 'unknown')}: {str(e)}")
         
+        # Рассчитать PnL новых заказов и учесть его в дневном PnL
+        await self.db.flush()
+        await PnLRollupService(self.db).add_orders(created_ids)
+        
         # Обновить время синхронизации
         integration.last_sync_at = datetime.utcnow()
         integration.last_sync_status = "success" if not errors else "error"
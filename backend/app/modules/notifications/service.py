@@ -5,7 +5,7 @@ from sqlalchemy import select, func
 from uuid import UUID
 from datetime import datetime
 
-from app.models import Notification, User, Product, Inventory
+from app.models import Notification, User, Product, StockSummary
 
 
 class NotificationService:
@@ -87,56 +87,54 @@ class AlertService:
     
     async def check_low_stock_alerts(self, tenant_id: UUID) -> list[dict]:
         """Check products with low stock levels."""
+        current_stock = func.coalesce(StockSummary.available, 0)
         products_result = await self.db.execute(
-            select(Product).where(
+            select(Product, current_stock.label("current_stock"))
+            .outerjoin(
+                StockSummary,
+                (StockSummary.tenant_id == Product.tenant_id) & (StockSummary.product_id == Product.id)
+            )
+            .where(
                 Product.tenant_id == tenant_id,
                 Product.min_stock_level > 0,
-                Product.is_active == True
+                Product.is_active == True,
+                current_stock < Product.min_stock_level
+            )
+        )
+        low_stock = products_result.all()
+        if not low_stock:
+            return []
+        
+        # Get tenant managers
+        users_result = await self.db.execute(
+            select(User).where(
+                User.tenant_id == tenant_id,
+                User.is_active == True
             )
         )
-        products = products_result.scalars().all()
+        users = users_result.scalars().all()
         
         alerts = []
-        for product in products:
-            # Get current stock
-            inventory_result = await self.db.execute(
-                select(func.sum(Inventory.quantity - Inventory.reserved_quantity))
-                .where(
-                    Inventory.tenant_id == tenant_id,
-                    Inventory.product_id == product.id
+        for product, current_stock in low_stock:
+            # Create notifications for all users
+            for user in users:
+                await self.notification_service.create_notification(
+                    user_id=user.id,
+                    notification_type="low_stock",
+                    title="Низкий остаток товара",
+                    message=f"Товар {product.name} (SKU: {product.sku}) — остаток {current_stock} шт. (мин: {product.min_stock_level})",
+                    data={
+                        "product_id": str(product.id),
+                        "current_stock": current_stock,
+                        "min_stock_level": product.min_stock_level
+                    }
                 )
-            )
-            current_stock = inventory_result.scalar_one() or 0
             
-            if current_stock < product.min_stock_level:
-                # Get tenant managers
-                users_result = await self.db.execute(
-                    select(User).where(
-                        User.tenant_id == tenant_id,
-                        User.is_active == True
-                    )
-                )
-                users = users_result.scalars().all()
-                
-                # Create notifications for all users
-                for user in users:
-                    await self.notification_service.create_notification(
-                        user_id=user.id,
-                        notification_type="low_stock",
-                        title="Низкий остаток товара",
-                        message=f"Товар {product.name} (SKU: {product.sku}) — остаток {current_stock} шт. (мин: {product.min_stock_level})",
-                        data={
-                            "product_id": str(product.id),
-                            "current_stock": current_stock,
-                            "min_stock_level": product.min_stock_level
-                        }
-                    )
-                
-                alerts.append({
-                    "product_id": str(product.id),
-                    "sku": product.sku,
-                    "current_stock": current_stock,
-                    "min_level": product.min_stock_level
-                })
+            alerts.append({
+                "product_id": str(product.id),
+                "sku": product.sku,
+                "current_stock": current_stock,
+                "min_level": product.min_stock_level
+            })
         
         return alerts
@@ -1,30 +1,101 @@
 """Orders router."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Literal
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth.permissions import require_permission, Permission
-from app.database import get_db
-from .schemas import OrderResponse, OrderCreate, OrderUpdate, OrderStatus
-from .service import OrderService
-from app.modules.warehouse.service import ReservationService
+from app.auth.permissions import require_permission, require_role, Permission
+from app.database import get_db, AsyncSessionLocal
+from app.core.export import negotiate_format, stream_export, CSV, ARROW, NDJSON
+from .schemas import (
+    OrderResponse, OrderCreate, OrderUpdate, OrderStatus, AllocationRunResponse,
+    BulkOrderActionRequest, BulkOrderCancelRequest, BulkOrderActionResponse,
+    OrderBatchCreate, OrderBatchResponse, OrderListFilter
+)
+from .service import OrderService, EXPORT_COLUMNS
+from app.modules.warehouse.allocation_service import AllocationService
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
 @router.get("", response_model=list[OrderResponse])
 async def list_orders(
-    status: OrderStatus | None = None,
+    response: Response,
+    status_: list[OrderStatus] | None = Query(None, alias="status"),
+    source: str | None = None,
+    integration_id: UUID | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    shipped_from: datetime | None = None,
+    shipped_to: datetime | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    format: Literal["json", "ndjson", "csv", "arrow"] | None = None,
+    accept: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
     user=Depends(require_permission(Permission.ORDERS_VIEW)),
     db: AsyncSession = Depends(get_db)
 ):
-    """List orders for current tenant."""
+    """List orders for current tenant, newest first.
+    
+    Pages are keyset-based: pass the ``X-Next-Cursor`` header of a page as
+    ``cursor`` to get the next one.  ``format=ndjson`` streams every matching
+    order (no paging), one JSON object per line; ``csv`` and ``arrow``
+    (Arrow IPC stream) export every matching order, one row per order,
+    gzipped if the client accepts it.  Without ``format`` the ``Accept``
+    header selects the representation.
+    """
+    filters = OrderListFilter(
+        status=status_,
+        source=source,
+        integration_id=integration_id,
+        created_from=created_from,
+        created_to=created_to,
+        shipped_from=shipped_from,
+        shipped_to=shipped_to
+    )
+    
+    format = negotiate_format(accept, format, (NDJSON, CSV, ARROW)) or "json"
+    if format in (CSV, ARROW):
+        return stream_export(
+            format, EXPORT_COLUMNS, _stream_order_rows(user.tenant_id, filters), "orders", accept_encoding
+        )
+    if format == NDJSON:
+        return StreamingResponse(
+            _stream_orders_ndjson(user.tenant_id, filters),
+            media_type="application/x-ndjson"
+        )
+    
     service = OrderService(db)
-    orders = await service.list_orders(user.tenant_id, status)
+    try:
+        orders, next_cursor = await service.list_orders(user.tenant_id, filters, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return orders
 
 
+async def _stream_orders_ndjson(tenant_id: UUID, filters: OrderListFilter):
+    """NDJSON lines; uses its own session because the response outlives get_db."""
+    async with AsyncSessionLocal() as db:
+        async for order in OrderService(db).stream_orders(tenant_id, filters):
+            yield OrderResponse.model_validate(order).model_dump_json() + "\n"
+
+
+async def _stream_order_rows(tenant_id: UUID, filters: OrderListFilter):
+    """Export row batches; uses its own session like the NDJSON stream."""
+    async with AsyncSessionLocal() as db:
+        async for rows in OrderService(db).stream_export_rows(tenant_id, filters):
+            yield rows
+
+
 @router.post("", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(
     data: OrderCreate,
@@ -51,6 +122,68 @@ async def create_order(
         )
 
 
+@router.post("/batch", response_model=OrderBatchResponse)
+async def create_orders_batch(
+    data: OrderBatchCreate,
+    user=Depends(require_permission(Permission.ORDERS_CREATE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create up to 5000 orders at once; failures are reported per order."""
+    tenant_id = data.tenant_id if data.tenant_id else user.tenant_id
+    if not tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tenant ID is required"
+        )
+    
+    # Проверка доступа к тенанту
+    if user.role.name != "admin" and tenant_id != user.tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    service = OrderService(db)
+    return await service.create_orders_batch(tenant_id, data.orders)
+
+
+@router.post("/allocate", response_model=AllocationRunResponse)
+async def allocate_orders(
+    tenant_id: UUID | None = None,
+    user=Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_db)
+):
+    """Allocate stock to all NEW / AWAITING_STOCK orders (one tenant or all)."""
+    service = AllocationService(db)
+    if tenant_id:
+        return await service.allocate_tenant(tenant_id, user.id)
+    return await service.allocate_all(user.id)
+
+
+@router.post("/ship", response_model=BulkOrderActionResponse)
+async def ship_orders(
+    data: BulkOrderActionRequest,
+    user=Depends(require_permission(Permission.ORDERS_EDIT)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Ship many orders in one transaction; rejected orders are reported per id."""
+    tenant_id = None if user.role.name == "admin" else user.tenant_id
+    service = OrderService(db)
+    return await service.ship_orders(data.order_ids, user.id, tenant_id)
+
+
+@router.post("/cancel", response_model=BulkOrderActionResponse)
+async def cancel_orders(
+    data: BulkOrderCancelRequest,
+    user=Depends(require_permission(Permission.ORDERS_EDIT)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Cancel many orders in one transaction and release their reservations."""
+    tenant_id = None if user.role.name == "admin" else user.tenant_id
+    service = OrderService(db)
+    return await service.cancel_orders(data.order_ids, data.reason, user.id, tenant_id)
+
+
 @router.get("/{id}", response_model=OrderResponse)
 async def get_order(
     id: UUID,
@@ -101,7 +234,13 @@ async def update_order(
     
     # Обновить статус, если указан
     if data.status and data.status != order.status:
-        order = await service.update_status(id, data.status, user.id)
+        try:
+            order = await service.update_status(id, data.status, user.id, order.tenant_id)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
     
     # Обновить другие поля
     for key, value in data.model_dump(exclude_unset=True, exclude={"status"}).items():
@@ -135,13 +274,8 @@ async def reserve_order(
             detail="Access denied"
         )
     
-    reservation_service = ReservationService(db)
     try:
-        reservations = await reservation_service.reserve_for_order(id)
-        
-        # Обновить статус заказа на CONFIRMED
-        order = await service.update_status(id, OrderStatus.CONFIRMED, user.id)
-        
+        order, reservations = await service.reserve_order(id, user.id, order.tenant_id)
         return {
             "order_id": str(id),
             "status": "reserved",
@@ -177,20 +311,15 @@ async def ship_order(
             detail="Access denied"
         )
     
-    reservation_service = ReservationService(db)
-    try:
-        # Списать товар при отгрузке
-        await reservation_service.fulfill_reservations(id)
-        
-        # Обновить статус заказа на SHIPPED
-        order = await service.update_status(id, OrderStatus.SHIPPED, user.id)
-        
-        return order
-    except ValueError as e:
+    # Списать товар и перевести заказ в SHIPPED одной транзакцией
+    result = await service.ship_orders([id], user.id)
+    if result["failed"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            detail=result["failed"][0]["error"]
         )
+    
+    return await service.get_order(id)
 
 
 @router.post("/{id}/cancel", response_model=OrderResponse)
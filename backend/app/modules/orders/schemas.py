@@ -1,6 +1,6 @@
 """Order schemas."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime
@@ -83,7 +83,7 @@ class OrderResponse(BaseModel):
 
 class OrderCreate(BaseModel):
     """Order create schema."""
-    tenant_id: UUID
+    tenant_id: UUID | None = None  # По умолчанию тенант пользователя
     order_number: str | None = None  # Автогенерация, если не указан
     external_id: str | None = None
     source: str = "manual"
@@ -106,3 +106,68 @@ class OrderUpdate(BaseModel):
     delivery_method: str | None = None
     assigned_picker: UUID | None = None
     notes: str | None = None
+
+
+class OrderListFilter(BaseModel):
+    """Order list filters; date ranges are [from, to)."""
+    status: list[OrderStatus] | None = None
+    source: str | None = None
+    integration_id: UUID | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    shipped_from: datetime | None = None
+    shipped_to: datetime | None = None
+
+
+class OrderBatchCreate(BaseModel):
+    """Bulk order create schema (one tenant per batch)."""
+    tenant_id: UUID | None = None
+    orders: list[OrderCreate] = Field(..., min_length=1, max_length=5000)
+
+
+class OrderBatchResult(BaseModel):
+    """Result for one order of a batch, in request order."""
+    index: int
+    status: str  # created, failed
+    order_id: UUID | None = None
+    order_number: str | None = None
+    error: str | None = None
+
+
+class OrderBatchResponse(BaseModel):
+    """Bulk order create result schema."""
+    created: int
+    failed: int
+    results: list[OrderBatchResult]
+
+
+class AllocationRunResponse(BaseModel):
+    """Batch allocation run result schema."""
+    tenants: int = 1
+    orders_processed: int
+    orders_confirmed: int
+    orders_awaiting_stock: int
+    reservations_created: int
+    units_reserved: int
+
+
+class BulkOrderActionRequest(BaseModel):
+    """Bulk ship request schema."""
+    order_ids: list[UUID] = Field(..., min_length=1, max_length=10000)
+
+
+class BulkOrderCancelRequest(BulkOrderActionRequest):
+    """Bulk cancel request schema."""
+    reason: str
+
+
+class BulkOrderFailure(BaseModel):
+    """Order rejected by a bulk action."""
+    order_id: UUID
+    error: str
+
+
+class BulkOrderActionResponse(BaseModel):
+    """Bulk ship/cancel result schema."""
+    processed: list[UUID]
+    failed: list[BulkOrderFailure]
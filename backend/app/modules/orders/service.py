@@ -1,14 +1,84 @@
 """Order service."""
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, insert, func, literal, tuple_, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID, insert as pg_insert
 from sqlalchemy.orm import selectinload
-from uuid import UUID
+import base64
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import nullcontext
+from uuid import UUID, uuid4
 from datetime import datetime
 from decimal import Decimal
 
-from app.models import Order, OrderItem, OrderStatus, OrderHistory
-from .schemas import OrderCreate
+from app.models import Order, OrderItem, OrderStatus, OrderHistory, Product, Reservation
+from app.core.numbering import document_numbers, format_document_number, next_document_number, ORDER
+from app.modules.finance.rollup_service import PnLRollupService, PNL_STATUSES
+from .schemas import OrderCreate, OrderListFilter
+
+
+# Allowed status changes: current status -> statuses it may move to
+ORDER_TRANSITIONS: dict[OrderStatus, frozenset[OrderStatus]] = {
+    OrderStatus.NEW: frozenset({OrderStatus.CONFIRMED, OrderStatus.AWAITING_STOCK, OrderStatus.CANCELLED}),
+    OrderStatus.AWAITING_STOCK: frozenset({OrderStatus.CONFIRMED, OrderStatus.CANCELLED}),
+    OrderStatus.CONFIRMED: frozenset({
+        OrderStatus.AWAITING_STOCK,
+        OrderStatus.PICKING,
+        OrderStatus.SHIPPED,
+        OrderStatus.CANCELLED,
+    }),
+    OrderStatus.PICKING: frozenset({OrderStatus.PACKED, OrderStatus.SHIPPED, OrderStatus.CANCELLED}),
+    OrderStatus.PACKED: frozenset({OrderStatus.SHIPPED, OrderStatus.CANCELLED}),
+    OrderStatus.SHIPPED: frozenset({OrderStatus.DELIVERED}),
+    OrderStatus.DELIVERED: frozenset(),
+    OrderStatus.CANCELLED: frozenset(),
+}
+
+# Timestamp column set when an order enters the status
+STATUS_TIMESTAMPS = {
+    OrderStatus.CONFIRMED: "confirmed_at",
+    OrderStatus.PICKING: "picked_at",
+    OrderStatus.SHIPPED: "shipped_at",
+    OrderStatus.DELIVERED: "delivered_at",
+    OrderStatus.CANCELLED: "cancelled_at",
+}
+
+
+def allowed_sources(new_status: OrderStatus) -> list[OrderStatus]:
+    """Statuses from which an order may move to `new_status`."""
+    return [status for status, targets in ORDER_TRANSITIONS.items() if new_status in targets]
+
+
+def encode_cursor(created_at: datetime, order_id: UUID) -> str:
+    """Opaque keyset cursor for the order after which the next page starts."""
+    raw = f"{created_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+# Columns of the CSV / Arrow order export: (name, kind) for app.core.export
+EXPORT_COLUMNS = (
+    ("id", "str"),
+    ("order_number", "str"),
+    ("external_id", "str"),
+    ("source", "str"),
+    ("status", "str"),
+    ("customer_name", "str"),
+    ("delivery_method", "str"),
+    ("total_amount", "money"),
+    ("shipping_cost", "money"),
+    ("margin", "money"),
+    ("created_at", "datetime"),
+    ("shipped_at", "datetime"),
+)
 
 
 class OrderService:
@@ -17,14 +87,78 @@ class OrderService:
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def list_orders(self, tenant_id: UUID, status: OrderStatus | None = None) -> list[Order]:
-        """List orders for a tenant, optionally filtered by status."""
+    def _list_query(self, tenant_id: UUID, filters: OrderListFilter | None):
+        """Orders of a tenant matching `filters`, newest first (created_at, id)."""
         query = select(Order).where(Order.tenant_id == tenant_id)
-        if status:
-            query = query.where(Order.status == status)
-        query = query.order_by(Order.created_at.desc())
-        result = await self.db.execute(query)
-        return list(result.scalars().all())
+        if filters:
+            if filters.status:
+                query = query.where(Order.status.in_(filters.status))
+            if filters.source:
+                query = query.where(Order.source == filters.source)
+            if filters.integration_id:
+                query = query.where(Order.integration_id == filters.integration_id)
+            if filters.created_from:
+                query = query.where(Order.created_at >= filters.created_from)
+            if filters.created_to:
+                query = query.where(Order.created_at < filters.created_to)
+            if filters.shipped_from:
+                query = query.where(Order.shipped_at >= filters.shipped_from)
+            if filters.shipped_to:
+                query = query.where(Order.shipped_at < filters.shipped_to)
+        return query.order_by(Order.created_at.desc(), Order.id.desc())
+    
+    async def list_orders(
+        self,
+        tenant_id: UUID,
+        filters: OrderListFilter | None = None,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> tuple[list[Order], str | None]:
+        """One page of orders (keyset pagination) and the cursor of the next page."""
+        query = self._list_query(tenant_id, filters).options(selectinload(Order.items))
+        if cursor:
+            created_at, order_id = decode_cursor(cursor)
+            query = query.where(tuple_(Order.created_at, Order.id) < tuple_(created_at, order_id))
+        result = await self.db.execute(query.limit(limit + 1))
+        orders = list(result.scalars().all())
+        
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id)
+        return orders, next_cursor
+    
+    async def stream_orders(
+        self,
+        tenant_id: UUID,
+        filters: OrderListFilter | None = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Order]:
+        """All matching orders with items, read through a server-side cursor."""
+        query = (
+            self._list_query(tenant_id, filters)
+            .options(selectinload(Order.items))
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.db.stream(query)
+        async for order in result.scalars():
+            yield order
+    
+    async def stream_export_rows(
+        self,
+        tenant_id: UUID,
+        filters: OrderListFilter | None = None,
+        batch_size: int = 5000
+    ) -> AsyncIterator[list[tuple]]:
+        """Batches of EXPORT_COLUMNS rows of all matching orders, from a server-side cursor."""
+        query = (
+            self._list_query(tenant_id, filters)
+            .with_only_columns(*[getattr(Order, name) for name, _ in EXPORT_COLUMNS])
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.db.stream(query)
+        async for rows in result.partitions():
+            yield [tuple(row) for row in rows]
     
     async def get_order(self, order_id: UUID) -> Order | None:
         """Get order by ID with items."""
@@ -32,6 +166,7 @@ class OrderService:
             select(Order)
             .options(selectinload(Order.items))
             .where(Order.id == order_id)
+            .execution_options(populate_existing=True)
         )
         return result.scalar_one_or_none()
     
@@ -40,7 +175,7 @@ class OrderService:
         # Генерация номера заказа, если не указан
         order_number = data.order_number
         if not order_number:
-            order_number = f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            order_number = await next_document_number(self.db, tenant_id, ORDER)
         
         order = Order(
             tenant_id=tenant_id,
@@ -62,17 +197,15 @@ class OrderService:
         # Вычислить себестоимость товара для каждого item
         total = Decimal(0)
         cost_of_goods = Decimal(0)
+        costs = await self._product_costs(
+            tenant_id, [item.product_id for item in data.items if item.cost_price is None]
+        )
         
         for item_data in data.items:
-            # Если cost_price не указан, получить из продукта
+            # Если cost_price не указан, взять из продукта
             cost_price = item_data.cost_price
             if cost_price is None:
-                from app.models import Product
-                product = await self.db.get(Product, item_data.product_id)
-                if product:
-                    cost_price = product.cost_price
-                else:
-                    cost_price = Decimal(0)
+                cost_price = costs.get(item_data.product_id, Decimal(0))
             
             item = OrderItem(
                 order_id=order.id,
@@ -87,50 +220,345 @@ class OrderService:
         
         order.total_amount = total
         order.cost_of_goods = cost_of_goods
+        await self.db.flush()
+        await PnLRollupService(self.db).add_orders([order.id])
         
         await self.db.commit()
         await self.db.refresh(order)
         return order
     
+    async def create_orders_batch(self, tenant_id: UUID, orders: list[OrderCreate]) -> dict:
+        """Create many orders of one tenant in one transaction.
+        
+        Products of all orders are resolved with one query; orders and items
+        are written with one bulk insert each.  Invalid orders (unknown
+        product, duplicate line, order number already used) are reported
+        per order and do not abort the batch.
+        """
+        results: list[dict] = [{"index": n, "status": "failed"} for n in range(len(orders))]
+        
+        product_ids = list({item.product_id for data in orders for item in data.items})
+        costs = await self._product_costs(tenant_id, product_ids)
+        
+        # 1. Validate and price every order in memory
+        valid = []
+        for n, data in enumerate(orders):
+            seen = set()
+            error = None
+            if data.tenant_id and data.tenant_id != tenant_id:
+                error = "Order belongs to another tenant"
+            elif not data.items:
+                error = "Order has no items"
+            for item in data.items:
+                if error:
+                    break
+                if item.product_id not in costs:
+                    error = f"Product {item.product_id} not found"
+                elif item.product_id in seen:
+                    error = f"Product {item.product_id} appears twice"
+                elif item.quantity <= 0:
+                    error = f"Quantity of product {item.product_id} must be positive"
+                seen.add(item.product_id)
+            if error:
+                results[n]["error"] = error
+            else:
+                valid.append(n)
+        
+        numbers = await document_numbers.next_numbers(
+            self.db, tenant_id, ORDER, sum(1 for n in valid if not orders[n].order_number)
+        )
+        numbers.reverse()
+        
+        order_rows = []
+        item_rows = {}
+        for n in valid:
+            data = orders[n]
+            order_id = uuid4()
+            items = []
+            total = Decimal(0)
+            cost_of_goods = Decimal(0)
+            for item in data.items:
+                cost_price = item.cost_price if item.cost_price is not None else costs[item.product_id]
+                total += item.price * item.quantity
+                cost_of_goods += cost_price * item.quantity
+                items.append({
+                    "id": uuid4(),
+                    "order_id": order_id,
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                    "price": item.price,
+                    "cost_price": cost_price,
+                })
+            order_rows.append({
+                "id": order_id,
+                "tenant_id": tenant_id,
+                "order_number": data.order_number or format_document_number(ORDER, numbers.pop()),
+                "external_id": data.external_id,
+                "source": data.source or "manual",
+                "status": OrderStatus.NEW,
+                "customer_name": data.customer_name,
+                "customer_phone": data.customer_phone,
+                "customer_email": data.customer_email,
+                "delivery_address": data.delivery_address,
+                "delivery_method": data.delivery_method,
+                "total_amount": total,
+                "cost_of_goods": cost_of_goods,
+                "notes": data.notes,
+            })
+            item_rows[order_id] = items
+            results[n].update(order_id=order_id, order_number=order_rows[-1]["order_number"])
+        
+        # 2. Bulk insert; orders whose number is already taken are skipped
+        created = set()
+        if order_rows:
+            result = await self.db.execute(
+                pg_insert(Order)
+                .on_conflict_do_nothing(constraint="uq_order_tenant_number")
+                .returning(Order.id),
+                order_rows
+            )
+            created = set(result.scalars().all())
+        
+        rows = [row for order_id in created for row in item_rows[order_id]]
+        if rows:
+            await self.db.execute(insert(OrderItem), rows)
+        await PnLRollupService(self.db).add_orders(list(created))
+        await self.db.commit()
+        
+        for result in results:
+            if result.get("order_id") in created:
+                result["status"] = "created"
+            elif "order_id" in result:
+                result["error"] = f"Order number {result['order_number']} already exists"
+                del result["order_id"]
+        
+        return {
+            "created": len(created),
+            "failed": len(results) - len(created),
+            "results": results,
+        }
+    
+    async def _product_costs(self, tenant_id: UUID, product_ids: list[UUID]) -> dict[UUID, Decimal]:
+        """Cost price of the tenant's products, in one query."""
+        if not product_ids:
+            return {}
+        result = await self.db.execute(
+            select(Product.id, Product.cost_price).where(
+                Product.tenant_id == tenant_id,
+                Product.id == any_(bindparam("product_ids", product_ids, type_=ARRAY(PG_UUID(as_uuid=True))))
+            )
+        )
+        return dict(result.all())
+    
     async def update_status(
         self, 
         order_id: UUID, 
         new_status: OrderStatus, 
-        user_id: UUID
+        user_id: UUID,
+        tenant_id: UUID | None = None
     ) -> Order:
-        """Update order status and save history."""
+        """Update order status and save history (see `transition_orders`)."""
+        moved = await self.transition_orders([order_id], new_status, user_id, tenant_id)
+        if not moved:
+            failed = await self._describe_rejected([order_id], moved, new_status, tenant_id)
+            raise ValueError(failed[0]["error"])
+        await self.db.commit()
+        return await self.get_order(order_id)
+    
+    async def transition_orders(
+        self,
+        order_ids: list[UUID],
+        new_status: OrderStatus,
+        user_id: UUID | None,
+        tenant_id: UUID | None = None,
+        on_moved: Callable[[list[UUID]], Awaitable] | None = None,
+        **values
+    ) -> list[UUID]:
+        """Move orders to `new_status` with one compare-and-set statement.
+        
+        Only orders whose current status allows the move (``ORDER_TRANSITIONS``)
+        and that belong to `tenant_id`, if given, are updated; they are
+        selected and locked in id order first, so the history records the
+        status actually replaced and nothing else is locked or recomputed.
+        The status timestamp, extra `values` and the history rows are written
+        by the same statement; moves that change the order PnL (shipping,
+        cancelling) also update the daily PnL rollup.  `on_moved` is awaited
+        with the moved ids before the PnL is recomputed, for work the
+        recompute must see (the stock write-off of a shipment).  Does not
+        commit.  Returns the ids that moved.
+        """
+        if not order_ids:
+            return []
+        new_status = OrderStatus(new_status)
+        
+        # Lock only the orders that can move; others (wrong status, other
+        # tenants) are neither locked nor touched by the PnL tracking
+        movable = (
+            select(Order.id)
+            .where(
+                Order.id == any_(bindparam("order_ids", list(order_ids), type_=ARRAY(PG_UUID(as_uuid=True)))),
+                Order.status.in_(allowed_sources(new_status))
+            )
+            .order_by(Order.id)
+            .with_for_update()
+        )
+        if tenant_id:
+            movable = movable.where(Order.tenant_id == tenant_id)
+        result = await self.db.execute(movable)
+        movable_ids = list(result.scalars().all())
+        if not movable_ids:
+            return []
+        
+        current = (
+            select(Order.id, Order.status)
+            .where(Order.id == any_(bindparam("movable_ids", movable_ids, type_=ARRAY(PG_UUID(as_uuid=True)))))
+            .cte("current")
+        )
+        
+        if new_status in STATUS_TIMESTAMPS:
+            values.setdefault(STATUS_TIMESTAMPS[new_status], func.now())
+        moved = (
+            update(Order)
+            .where(Order.id == current.c.id)
+            .values(status=new_status, updated_at=func.now(), **values)
+            .returning(Order.id, current.c.status.label("old_status"))
+            .cte("moved")
+        )
+        history = (
+            insert(OrderHistory)
+            .from_select(
+                ["id", "order_id", "old_status", "new_status", "changed_by", "changed_at"],
+                select(
+                    func.gen_random_uuid(),
+                    moved.c.id,
+                    moved.c.old_status,
+                    literal(new_status, OrderHistory.new_status.type),
+                    literal(user_id, OrderHistory.changed_by.type),
+                    func.now()
+                )
+            )
+            .returning(OrderHistory.order_id)
+        )
+        tracking = PnLRollupService(self.db).tracking(movable_ids) if new_status in PNL_STATUSES else nullcontext()
+        async with tracking:
+            result = await self.db.execute(history)
+            moved_ids = list(result.scalars().all())
+            if on_moved is not None:
+                await on_moved(moved_ids)
+        return moved_ids
+    
+    async def _describe_rejected(
+        self,
+        order_ids: list[UUID],
+        moved: list[UUID],
+        new_status: OrderStatus,
+        tenant_id: UUID | None = None
+    ) -> list[dict]:
+        """Explain why orders were not moved by a transition.
+        
+        Orders of other tenants are reported as not found, so that their
+        existence and status do not leak.
+        """
+        rejected = set(order_ids) - set(moved)
+        if not rejected:
+            return []
+        query = select(Order.id, Order.status).where(Order.id.in_(rejected))
+        if tenant_id:
+            query = query.where(Order.tenant_id == tenant_id)
+        result = await self.db.execute(query)
+        statuses = dict(result.all())
+        return [
+            {
+                "order_id": order_id,
+                "error": (
+                    f"Cannot change order status from {statuses[order_id].value} to {new_status.value}"
+                    if order_id in statuses else "Order not found"
+                )
+            }
+            for order_id in order_ids if order_id in rejected
+        ]
+    
+    async def reserve_order(
+        self,
+        order_id: UUID,
+        user_id: UUID,
+        tenant_id: UUID | None = None
+    ) -> tuple[Order, list[Reservation]]:
+        """Reserve stock for an order and confirm it, in one transaction.
+        
+        Only orders that may become CONFIRMED, or already are (to top up
+        their reservations), are reserved.  The status is re-checked under
+        lock after the stock, in the same order as allocation takes its
+        locks; if a concurrent change won, the reservations are rolled back.
+        """
+        from app.modules.warehouse.service import ReservationService
+        
         order = await self.get_order(order_id)
-        if not order:
-            raise ValueError(f"Order {order_id} not found")
-        
-        old_status = order.status
-        order.status = new_status
-        
-        # Сохранить в историю
-        history = OrderHistory(
-            order_id=order_id,
-            old_status=old_status,
-            new_status=new_status,
-            changed_by=user_id,
-            changed_at=datetime.utcnow()
+        if not order or (tenant_id and order.tenant_id != tenant_id):
+            raise ValueError("Order not found")
+        if order.status != OrderStatus.CONFIRMED and order.status not in allowed_sources(OrderStatus.CONFIRMED):
+            raise ValueError(f"Cannot reserve stock for an order in status {order.status.value}")
+        
+        reservations = await ReservationService(self.db).reserve_lines_for_order(order_id)
+        if order.status == OrderStatus.CONFIRMED:
+            result = await self.db.execute(
+                select(Order.id)
+                .where(Order.id == order_id, Order.status == OrderStatus.CONFIRMED)
+                .with_for_update()
+            )
+            confirmed = result.first() is not None
+        else:
+            confirmed = bool(await self.transition_orders([order_id], OrderStatus.CONFIRMED, user_id, tenant_id))
+        if not confirmed:
+            await self.db.rollback()
+            raise ValueError("Order status changed concurrently, retry")
+        
+        await self.db.commit()
+        return await self.get_order(order_id), reservations
+    
+    async def ship_orders(
+        self,
+        order_ids: list[UUID],
+        user_id: UUID,
+        tenant_id: UUID | None = None
+    ) -> dict:
+        """Ship many orders in one transaction: write off reservations, set SHIPPED."""
+        from app.modules.warehouse.service import ReservationService
+        
+        # Written off before the PnL recompute, so that cost of goods comes
+        # from the FIFO layers the shipment consumed
+        shipped = await self.transition_orders(
+            order_ids,
+            OrderStatus.SHIPPED,
+            user_id,
+            tenant_id,
+            on_moved=ReservationService(self.db).fulfill_for_orders
         )
-        self.db.add(history)
-        
-        # Обновить timestamps
-        if new_status == OrderStatus.CONFIRMED:
-            order.confirmed_at = datetime.utcnow()
-        elif new_status == OrderStatus.PICKING:
-            order.picked_at = datetime.utcnow()
-        elif new_status == OrderStatus.SHIPPED:
-            order.shipped_at = datetime.utcnow()
-        elif new_status == OrderStatus.DELIVERED:
-            order.delivered_at = datetime.utcnow()
-        elif new_status == OrderStatus.CANCELLED:
-            order.cancelled_at = datetime.utcnow()
+        failed = await self._describe_rejected(order_ids, shipped, OrderStatus.SHIPPED, tenant_id)
+        await self.db.commit()
+        return {"processed": shipped, "failed": failed}
+    
+    async def cancel_orders(
+        self,
+        order_ids: list[UUID],
+        reason: str,
+        user_id: UUID,
+        tenant_id: UUID | None = None
+    ) -> dict:
+        """Cancel many orders in one transaction and release their reservations."""
+        from app.modules.warehouse.service import ReservationService
         
+        cancelled = await self.transition_orders(
+            order_ids,
+            OrderStatus.CANCELLED,
+            user_id,
+            tenant_id,
+            cancellation_reason=reason
+        )
+        await ReservationService(self.db).release_for_orders(cancelled)
+        failed = await self._describe_rejected(order_ids, cancelled, OrderStatus.CANCELLED, tenant_id)
         await self.db.commit()
-        await self.db.refresh(order)
-        return order
+        return {"processed": cancelled, "failed": failed}
     
     async def cancel_order(
         self, 
@@ -139,33 +567,7 @@ class OrderService:
         user_id: UUID
     ) -> Order:
         """Cancel order and release reservations."""
-        order = await self.get_order(order_id)
-        if not order:
-            raise ValueError(f"Order {order_id} not found")
-        
-        if order.status in [OrderStatus.SHIPPED, OrderStatus.DELIVERED]:
-            raise ValueError("Cannot cancel shipped or delivered order")
-        
-        old_status = order.status
-        order.status = OrderStatus.CANCELLED
-        order.cancellation_reason = reason
-        order.cancelled_at = datetime.utcnow()
-        
-        # Сохранить в историю
-        history = OrderHistory(
-            order_id=order_id,
-            old_status=old_status,
-            new_status=OrderStatus.CANCELLED,
-            changed_by=user_id,
-            changed_at=datetime.utcnow()
-        )
-        self.db.add(history)
-        
-        # Снять резервы (импорт внутри метода, чтобы избежать циклических зависимостей)
-        from app.modules.warehouse.service import ReservationService
-        reservation_service = ReservationService(self.db)
-        await reservation_service.release_reservations(order_id)
-        
-        await self.db.commit()
-        await self.db.refresh(order)
-        return order
+        result = await self.cancel_orders([order_id], reason, user_id)
+        if result["failed"]:
+            raise ValueError(result["failed"][0]["error"])
+        return await self.get_order(order_id)
@@ -0,0 +1,307 @@
+"""Batch allocation of stock to pending orders."""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from uuid import UUID
+from datetime import datetime
+
+from app.models import Tenant, Inventory, Order, OrderItem, OrderStatus
+from app.modules.orders.service import OrderService
+from .stock_service import StockSummaryService
+
+
+PENDING_STATUSES = (OrderStatus.NEW, OrderStatus.AWAITING_STOCK)
+
+_UUID_ARRAY = ARRAY(PG_UUID(as_uuid=True))
+
+# Reservation rows of the allocations plus a reserve movement per lot and
+# order in the ledger (lots are already locked by the stock snapshot).
+_INSERT_RESERVATIONS_SQL = text("""
+    WITH alloc AS (
+        SELECT *
+        FROM unnest(
+            CAST(:order_ids AS uuid[]),
+            CAST(:order_item_ids AS uuid[]),
+            CAST(:inventory_ids AS uuid[]),
+            CAST(:product_ids AS uuid[]),
+            CAST(:cell_ids AS uuid[]),
+            CAST(:quantities AS integer[])
+        ) AS v(order_id, order_item_id, inventory_id, product_id, cell_id, quantity)
+    ),
+    created AS (
+        INSERT INTO reservations (
+            id, order_id, order_item_id, inventory_id, product_id, cell_id,
+            quantity, status, created_at
+        )
+        SELECT gen_random_uuid(), order_id, order_item_id, inventory_id,
+               product_id, cell_id, quantity, 'reserved', now()
+        FROM alloc
+    )
+    INSERT INTO inventory_movements (
+        tenant_id, product_id, cell_id, inventory_id, lot_number, movement_type,
+        quantity, reserved_quantity, document_type, document_id, occurred_at
+    )
+    SELECT i.tenant_id, a.product_id, a.cell_id, a.inventory_id, i.lot_number, 'reserve',
+           0, SUM(a.quantity), 'order', a.order_id, now()
+    FROM alloc a
+    JOIN inventory i ON i.id = a.inventory_id
+    GROUP BY i.tenant_id, a.product_id, a.cell_id, a.inventory_id, i.lot_number, a.order_id
+""")
+
+_ADD_INVENTORY_RESERVED_SQL = text("""
+    UPDATE inventory i
+    SET reserved_quantity = i.reserved_quantity + v.quantity,
+        updated_at = now()
+    FROM unnest(CAST(:ids AS uuid[]), CAST(:quantities AS integer[])) AS v(id, quantity)
+    WHERE i.id = v.id
+""")
+
+_ADD_ITEM_RESERVED_SQL = text("""
+    UPDATE order_items oi
+    SET reserved_quantity = oi.reserved_quantity + v.quantity,
+        shortage = v.shortage
+    FROM unnest(
+        CAST(:ids AS uuid[]),
+        CAST(:quantities AS integer[]),
+        CAST(:shortages AS integer[])
+    ) AS v(id, quantity, shortage)
+    WHERE oi.id = v.id
+""")
+
+
+def fefo_key(lot: dict) -> tuple:
+    """Sort key for lots: expiry date first (lots without expiry last), then FIFO."""
+    return (lot["expiry_date"] is None, lot["expiry_date"], lot["received_at"], lot["inventory_id"])
+
+
+def allocate_stock(lines: list[dict], lots: list[dict]) -> list[dict]:
+    """Allocate lots to order lines in memory.
+    
+    ``lines`` must already be in priority order and carry ``order_item_id``,
+    ``order_id``, ``product_id`` and ``need``; ``lots`` must be in FEFO order
+    and carry ``inventory_id``, ``product_id``, ``cell_id`` and ``available``.
+    ``available`` is decremented in place.  Returns one allocation per
+    (line, lot) pair.
+    """
+    queues: dict[UUID, list[dict]] = {}
+    for lot in lots:
+        if lot["available"] > 0:
+            queues.setdefault(lot["product_id"], []).append(lot)
+    heads = dict.fromkeys(queues, 0)
+    
+    allocations = []
+    for line in lines:
+        queue = queues.get(line["product_id"])
+        if not queue:
+            continue
+        
+        head = heads[line["product_id"]]
+        remaining = line["need"]
+        while remaining > 0 and head < len(queue):
+            lot = queue[head]
+            quantity = min(lot["available"], remaining)
+            allocations.append({
+                "order_id": line["order_id"],
+                "order_item_id": line["order_item_id"],
+                "inventory_id": lot["inventory_id"],
+                "product_id": lot["product_id"],
+                "cell_id": lot["cell_id"],
+                "quantity": quantity,
+            })
+            lot["available"] -= quantity
+            remaining -= quantity
+            if lot["available"] == 0:
+                head += 1
+        heads[line["product_id"]] = head
+    
+    return allocations
+
+
+class AllocationService:
+    """Service for allocating stock to all pending orders of a tenant at once."""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def allocate_all(self, user_id: UUID | None = None) -> dict:
+        """Run allocation for every active tenant, one transaction per tenant."""
+        result = await self.db.execute(
+            select(Tenant.id).where(Tenant.is_active == True).order_by(Tenant.id)
+        )
+        tenant_ids = list(result.scalars().all())
+        
+        totals = {
+            "tenants": 0,
+            "orders_processed": 0,
+            "orders_confirmed": 0,
+            "orders_awaiting_stock": 0,
+            "reservations_created": 0,
+            "units_reserved": 0,
+        }
+        for tenant_id in tenant_ids:
+            stats = await self.allocate_tenant(tenant_id, user_id)
+            totals["tenants"] += 1
+            for key in totals:
+                if key != "tenants":
+                    totals[key] += stats[key]
+        return totals
+    
+    async def allocate_tenant(self, tenant_id: UUID, user_id: UUID | None = None) -> dict:
+        """Allocate available stock to NEW / AWAITING_STOCK orders of a tenant.
+        
+        Orders are served oldest ``created_at`` first, lots FEFO within each
+        SKU.  Fully reserved orders become CONFIRMED, the rest AWAITING_STOCK.
+        Orders locked by a concurrent transaction are skipped until the next run.
+        """
+        started = datetime.utcnow()
+        
+        # 1. Pending orders in priority order
+        result = await self.db.execute(
+            select(Order.id, Order.status)
+            .where(Order.tenant_id == tenant_id, Order.status.in_(PENDING_STATUSES))
+            .order_by(Order.created_at, Order.id)
+            .with_for_update(skip_locked=True)
+        )
+        orders = result.all()
+        stats = {
+            "tenant_id": tenant_id,
+            "orders_processed": len(orders),
+            "orders_confirmed": 0,
+            "orders_awaiting_stock": 0,
+            "reservations_created": 0,
+            "units_reserved": 0,
+        }
+        if not orders:
+            await self.db.commit()
+            stats["duration_ms"] = 0
+            return stats
+        
+        priority = {order_id: n for n, (order_id, _) in enumerate(orders)}
+        order_ids = list(priority)
+        
+        # 2. Open order lines
+        result = await self.db.execute(
+            select(
+                OrderItem.id,
+                OrderItem.order_id,
+                OrderItem.product_id,
+                (OrderItem.quantity - OrderItem.reserved_quantity).label("need"),
+                OrderItem.shortage,
+            )
+            .where(
+                OrderItem.order_id == any_(bindparam("order_ids", order_ids, type_=_UUID_ARRAY)),
+                OrderItem.quantity > OrderItem.reserved_quantity
+            )
+        )
+        lines = [
+            {
+                "order_item_id": row.id,
+                "order_id": row.order_id,
+                "product_id": row.product_id,
+                "need": row.need,
+                "shortage": row.shortage,
+            }
+            for row in result.all()
+        ]
+        lines.sort(key=lambda line: (priority[line["order_id"]], line["order_item_id"]))
+        
+        # 3. Stock snapshot, locked in id order like ReservationService
+        product_ids = list({line["product_id"] for line in lines})
+        lots = []
+        if product_ids:
+            result = await self.db.execute(
+                select(
+                    Inventory.id,
+                    Inventory.product_id,
+                    Inventory.cell_id,
+                    (Inventory.quantity - Inventory.reserved_quantity).label("available"),
+                    Inventory.expiry_date,
+                    Inventory.received_at,
+                )
+                .where(
+                    Inventory.tenant_id == tenant_id,
+                    Inventory.product_id == any_(bindparam("product_ids", product_ids, type_=_UUID_ARRAY)),
+                    Inventory.quantity > Inventory.reserved_quantity
+                )
+                .order_by(Inventory.id)
+                .with_for_update()
+            )
+            lots = [
+                {
+                    "inventory_id": row.id,
+                    "product_id": row.product_id,
+                    "cell_id": row.cell_id,
+                    "available": row.available,
+                    "expiry_date": row.expiry_date,
+                    "received_at": row.received_at,
+                }
+                for row in result.all()
+            ]
+            lots.sort(key=fefo_key)
+        
+        # 4. Allocate in memory
+        allocations = allocate_stock(lines, lots)
+        
+        # 5. Write everything back in bulk
+        reserved_by_item: dict[UUID, int] = {}
+        reserved_by_lot: dict[UUID, int] = {}
+        for alloc in allocations:
+            reserved_by_item[alloc["order_item_id"]] = reserved_by_item.get(alloc["order_item_id"], 0) + alloc["quantity"]
+            reserved_by_lot[alloc["inventory_id"]] = reserved_by_lot.get(alloc["inventory_id"], 0) + alloc["quantity"]
+        
+        if allocations:
+            await self.db.execute(
+                _INSERT_RESERVATIONS_SQL,
+                {
+                    "order_ids": [alloc["order_id"] for alloc in allocations],
+                    "order_item_ids": [alloc["order_item_id"] for alloc in allocations],
+                    "inventory_ids": [alloc["inventory_id"] for alloc in allocations],
+                    "product_ids": [alloc["product_id"] for alloc in allocations],
+                    "cell_ids": [alloc["cell_id"] for alloc in allocations],
+                    "quantities": [alloc["quantity"] for alloc in allocations],
+                }
+            )
+            await self.db.execute(
+                _ADD_INVENTORY_RESERVED_SQL,
+                {"ids": list(reserved_by_lot), "quantities": list(reserved_by_lot.values())}
+            )
+            await StockSummaryService(self.db).apply(
+                [(tenant_id, alloc["product_id"], 0, alloc["quantity"]) for alloc in allocations]
+            )
+        
+        changed_lines = []
+        for line in lines:
+            reserved = reserved_by_item.get(line["order_item_id"], 0)
+            if reserved or line["shortage"] != line["need"]:
+                changed_lines.append((line["order_item_id"], reserved, line["need"] - reserved))
+        if changed_lines:
+            ids, quantities, shortages = zip(*changed_lines)
+            await self.db.execute(
+                _ADD_ITEM_RESERVED_SQL,
+                {"ids": list(ids), "quantities": list(quantities), "shortages": list(shortages)}
+            )
+        
+        short_orders = {
+            line["order_id"] for line in lines
+            if reserved_by_item.get(line["order_item_id"], 0) < line["need"]
+        }
+        confirmed = []
+        awaiting = []
+        for order_id, old_status in orders:
+            new_status = OrderStatus.AWAITING_STOCK if order_id in short_orders else OrderStatus.CONFIRMED
+            if new_status != old_status:
+                (awaiting if order_id in short_orders else confirmed).append(order_id)
+        
+        order_service = OrderService(self.db)
+        await order_service.transition_orders(confirmed, OrderStatus.CONFIRMED, user_id)
+        await order_service.transition_orders(awaiting, OrderStatus.AWAITING_STOCK, user_id)
+        
+        await self.db.commit()
+        
+        stats["orders_confirmed"] = len(orders) - len(short_orders)
+        stats["orders_awaiting_stock"] = len(short_orders)
+        stats["reservations_created"] = len(allocations)
+        stats["units_reserved"] = sum(reserved_by_lot.values())
+        stats["duration_ms"] = int((datetime.utcnow() - started).total_seconds() * 1000)
+        return stats
@@ -1,41 +1,233 @@
 """Warehouse cells, inventory, receipts, transfers router."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
+from datetime import date, datetime
+from typing import Literal
 
-from app.database import get_db
-from app.auth.permissions import require_permission, Permission
+from app.database import get_db, AsyncSessionLocal
+from app.auth.permissions import require_permission, require_role, Permission, get_tenant_filter
+from app.core.export import negotiate_format, stream_export, CSV, ARROW
 from app.models import User
 from .schemas import (
     InventoryResponse,
+    InventoryListFilter,
+    InventoryGroupRow,
+    InventoryValuationRow,
+    InventoryMovementResponse,
+    InventoryBalanceResponse,
+    InventorySnapshotResponse,
+    StockSummaryResponse,
+    StockReconcileResponse,
     ReceiptCreate,
     ReceiptResponse,
     TransferCreate,
-    TransferResponse
+    TransferResponse,
+    TransferBatchCreate,
+    TransferBatchResponse
 )
 from .service import InventoryService
-from .receipt_service import ReceiptService
+from .stock_service import StockSummaryService
+from .receipt_service import ReceiptService, spool_upload
 from .transfer_service import TransferService
+from .valuation_service import InventoryValuationService, valuation_columns
+from .ledger_service import InventoryLedgerService, MOVEMENT_TYPES
+from .snapshot_service import InventorySnapshotService
 
 router = APIRouter(tags=["warehouse"])
 
 
-@router.get("/inventory", response_model=list[InventoryResponse])
+@router.get("/inventory", response_model=list[InventoryResponse] | list[InventoryGroupRow])
 async def list_inventory(
+    response: Response,
     product_id: UUID | None = None,
+    cell_id: UUID | None = None,
+    zone_id: UUID | None = None,
+    warehouse_id: UUID | None = None,
+    lot_number: str | None = None,
+    expiry_before: date | None = None,
+    non_zero: bool = False,
+    group_by: Literal["product", "cell", "zone"] | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
     user: User = Depends(require_permission(Permission.WAREHOUSE_INVENTORY)),
     db: AsyncSession = Depends(get_db)
 ):
-    """List inventory for current tenant."""
+    """List inventory for current tenant, by product and cell.
+    
+    Pages are keyset-based: pass the ``X-Next-Cursor`` header of a page as
+    ``cursor`` to get the next one.  With ``group_by`` the rows are totals
+    per product, cell or zone (lots, quantity, reserved, available),
+    summed in the database and paged the same way.
+    """
     if not user.tenant_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User must belong to a tenant"
         )
+    filters = InventoryListFilter(
+        product_id=product_id,
+        cell_id=cell_id,
+        zone_id=zone_id,
+        warehouse_id=warehouse_id,
+        lot_number=lot_number,
+        expiry_before=expiry_before,
+        non_zero=non_zero
+    )
     service = InventoryService(db)
-    inventories = await service.get_inventory(user.tenant_id, product_id)
-    return [InventoryResponse.model_validate(inv) for inv in inventories]
+    try:
+        if group_by:
+            rows, next_cursor = await service.aggregate_inventory(user.tenant_id, group_by, filters, limit, cursor)
+        else:
+            rows, next_cursor = await service.list_inventory(user.tenant_id, filters, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
+@router.get("/inventory/summary", response_model=list[StockSummaryResponse])
+async def get_stock_summary(
+    product_id: list[UUID] | None = Query(None),
+    user: User = Depends(require_permission(Permission.WAREHOUSE_INVENTORY)),
+    db: AsyncSession = Depends(get_db)
+):
+    """On-hand, reserved and available stock per product for current tenant."""
+    if not user.tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User must belong to a tenant"
+        )
+    service = StockSummaryService(db)
+    return await service.get_summary(user.tenant_id, product_id)
+
+
+@router.get("/inventory/report", response_model=list[InventoryValuationRow])
+async def get_inventory_report(
+    group_by: list[Literal["tenant", "warehouse", "zone", "product"]] = Query(["product"]),
+    as_of: date | None = None,
+    warehouse_id: UUID | None = None,
+    product_id: UUID | None = None,
+    format: Literal["json", "csv", "arrow"] | None = None,
+    accept: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.WAREHOUSE_INVENTORY)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stock value and aging, aggregated in the database.
+    
+    One row per combination of the ``group_by`` dimensions (repeat the
+    parameter to combine them, e.g. warehouse and product): quantity,
+    value, quantity and value by days since receipt (0-30, 31-90, 91-180,
+    180+) and quantity by days to expiry as of ``as_of`` (default today).
+    ``csv`` and ``arrow`` stream the rows, gzipped if the client accepts it.
+    """
+    format = negotiate_format(accept, format, (CSV, ARROW)) or "json"
+    if format in (CSV, ARROW):
+        return stream_export(
+            format,
+            valuation_columns(group_by),
+            _stream_report_rows(tenant_id, group_by, as_of, warehouse_id, product_id),
+            "inventory-report",
+            accept_encoding
+        )
+    
+    service = InventoryValuationService(db)
+    return await service.get_report(tenant_id, group_by, as_of, warehouse_id, product_id)
+
+
+async def _stream_report_rows(tenant_id, group_by, as_of, warehouse_id, product_id):
+    """Report row batches; uses its own session because the response outlives get_db."""
+    async with AsyncSessionLocal() as db:
+        async for rows in InventoryValuationService(db).stream_report_rows(
+            tenant_id, group_by, as_of, warehouse_id, product_id
+        ):
+            yield rows
+
+
+@router.get("/inventory/movements", response_model=list[InventoryMovementResponse])
+async def list_inventory_movements(
+    response: Response,
+    product_id: UUID | None = None,
+    cell_id: UUID | None = None,
+    movement_type: Literal[MOVEMENT_TYPES] | None = None,
+    occurred_from: datetime | None = None,
+    occurred_to: datetime | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.WAREHOUSE_INVENTORY)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Inventory ledger, newest first; the next page is in ``X-Next-Cursor``."""
+    service = InventoryLedgerService(db)
+    try:
+        movements, next_cursor = await service.list_movements(
+            tenant_id, product_id, cell_id, movement_type, occurred_from, occurred_to, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return movements
+
+
+@router.get("/inventory/balances", response_model=list[InventoryBalanceResponse])
+async def get_inventory_balances(
+    at: datetime,
+    product_id: UUID | None = None,
+    cell_id: UUID | None = None,
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.WAREHOUSE_INVENTORY)),
+    db: AsyncSession = Depends(get_db)
+):
+    """On-hand and reserved stock per product and cell at a point in time.
+    
+    Derived from the movement ledger: the latest checkpoint before ``at``
+    plus the movements after it.
+    """
+    service = InventoryLedgerService(db)
+    return await service.get_balances(tenant_id, at, product_id, cell_id)
+
+
+@router.get("/inventory/snapshots/{day}", response_model=list[InventorySnapshotResponse])
+async def get_inventory_snapshot(
+    day: date,
+    product_id: UUID | None = None,
+    cell_id: UUID | None = None,
+    tenant_id: UUID | None = Depends(get_tenant_filter),
+    user: User = Depends(require_permission(Permission.WAREHOUSE_INVENTORY)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stock per product and cell at the end of a day (UTC), from the daily snapshot."""
+    service = InventorySnapshotService(db)
+    rows = await service.get_stock(tenant_id, day, product_id, cell_id)
+    if rows is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No inventory snapshot for {day}"
+        )
+    return rows
+
+
+@router.post("/inventory/summary/reconcile", response_model=StockReconcileResponse)
+async def reconcile_stock_summary(
+    tenant_id: UUID | None = None,
+    user: User = Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_db)
+):
+    """Rebuild stock summary from inventory (one tenant or all)."""
+    service = StockSummaryService(db)
+    return await service.reconcile(tenant_id)
 
 
 @router.post("/receipts", response_model=ReceiptResponse)
@@ -61,6 +253,33 @@ async def create_receipt(
         )
 
 
+@router.post("/receipts/upload", response_model=ReceiptResponse)
+async def upload_receipt(
+    request: Request,
+    user: User = Depends(require_permission(Permission.WAREHOUSE_INVENTORY)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create receipt from a CSV body (text/csv), spooled first and posted in chunks.
+    
+    Header: product_id,cell_id,quantity,lot_number,expiry_date
+    """
+    if not user.tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User must belong to a tenant"
+        )
+    service = ReceiptService(db)
+    try:
+        with await spool_upload(request.stream()) as upload:
+            receipt = await service.create_receipt_from_csv(user.tenant_id, upload, user.id)
+        return ReceiptResponse.model_validate(receipt)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 @router.post("/transfers", response_model=TransferResponse)
 async def create_transfer(
     data: TransferCreate,
@@ -82,3 +301,25 @@ async def create_transfer(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+
+
+@router.post("/transfers/batch", response_model=TransferBatchResponse)
+async def create_transfers_batch(
+    data: TransferBatchCreate,
+    user: User = Depends(require_permission(Permission.WAREHOUSE_MANAGE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Move up to 5000 products between cells at once; failures are reported per move."""
+    if not user.tenant_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User must belong to a tenant"
+        )
+    service = TransferService(db)
+    try:
+        return await service.create_transfers_batch(user.tenant_id, data.transfers, user.id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
@@ -0,0 +1,208 @@
+"""Inventory movement ledger, checkpoints and point-in-time balances."""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text, func, union_all, literal, Select
+from uuid import UUID, uuid4
+from datetime import datetime
+
+from app.models import InventoryMovement, InventoryCheckpoint, InventoryCheckpointBalance
+
+
+RECEIPT = "receipt"
+TRANSFER_OUT = "transfer_out"
+TRANSFER_IN = "transfer_in"
+RESERVE = "reserve"
+RELEASE = "release"
+SHIP = "ship"
+ADJUST = "adjust"
+
+MOVEMENT_TYPES = (RECEIPT, TRANSFER_OUT, TRANSFER_IN, RESERVE, RELEASE, SHIP, ADJUST)
+
+# Checkpoint at :as_of in one statement:
+#
+# previous   - the latest checkpoint before :as_of (none for the first one);
+# checkpoint - the new checkpoint row, skipped if one exists at :as_of;
+# balances   - previous balances plus the movements in [previous, :as_of),
+#              non-zero keys only.
+_CREATE_CHECKPOINT_SQL = text("""
+    WITH previous AS (
+        SELECT id, as_of
+        FROM inventory_checkpoints
+        WHERE as_of < :as_of
+        ORDER BY as_of DESC
+        LIMIT 1
+    ),
+    checkpoint AS (
+        INSERT INTO inventory_checkpoints (id, as_of, created_at)
+        VALUES (:checkpoint_id, :as_of, now())
+        ON CONFLICT (as_of) DO NOTHING
+        RETURNING id
+    ),
+    balances AS (
+        INSERT INTO inventory_checkpoint_balances (
+            checkpoint_id, tenant_id, product_id, cell_id, quantity, reserved_quantity
+        )
+        SELECT c.id, d.tenant_id, d.product_id, d.cell_id,
+               SUM(d.quantity), SUM(d.reserved_quantity)
+        FROM (
+            SELECT b.tenant_id, b.product_id, b.cell_id, b.quantity, b.reserved_quantity
+            FROM inventory_checkpoint_balances b
+            JOIN previous p ON p.id = b.checkpoint_id
+            UNION ALL
+            SELECT m.tenant_id, m.product_id, m.cell_id, m.quantity, m.reserved_quantity
+            FROM inventory_movements m
+            WHERE m.occurred_at >= COALESCE((SELECT as_of FROM previous), '-infinity')
+              AND m.occurred_at < :as_of
+        ) d
+        CROSS JOIN checkpoint c
+        GROUP BY c.id, d.tenant_id, d.product_id, d.cell_id
+        HAVING SUM(d.quantity) <> 0 OR SUM(d.reserved_quantity) <> 0
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM checkpoint) AS created, (SELECT COUNT(*) FROM balances) AS balances
+""")
+
+
+class InventoryLedgerService:
+    """Service for the movement ledger and balances derived from it.
+    
+    Movements are written by the services that change inventory, in the
+    same statements.  A balance at time X is the latest checkpoint before X
+    plus the movements between the two, so history queries read at most one
+    checkpoint period of the ledger.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def list_movements(
+        self,
+        tenant_id: UUID | None,
+        product_id: UUID | None = None,
+        cell_id: UUID | None = None,
+        movement_type: str | None = None,
+        occurred_from: datetime | None = None,
+        occurred_to: datetime | None = None,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> tuple[list[InventoryMovement], str | None]:
+        """Page of movements, newest first, and the cursor of the next page."""
+        query = select(InventoryMovement)
+        if tenant_id:
+            query = query.where(InventoryMovement.tenant_id == tenant_id)
+        if product_id:
+            query = query.where(InventoryMovement.product_id == product_id)
+        if cell_id:
+            query = query.where(InventoryMovement.cell_id == cell_id)
+        if movement_type:
+            query = query.where(InventoryMovement.movement_type == movement_type)
+        if occurred_from:
+            query = query.where(InventoryMovement.occurred_at >= occurred_from)
+        if occurred_to:
+            query = query.where(InventoryMovement.occurred_at < occurred_to)
+        if cursor:
+            try:
+                before_id = int(cursor)
+            except ValueError:
+                raise ValueError("Invalid cursor")
+            query = query.where(InventoryMovement.id < before_id)
+        result = await self.db.execute(
+            query.order_by(InventoryMovement.id.desc()).limit(limit + 1)
+        )
+        movements = list(result.scalars().all())
+        
+        next_cursor = None
+        if len(movements) > limit:
+            movements = movements[:limit]
+            next_cursor = str(movements[-1].id)
+        return movements, next_cursor
+    
+    def balances_query(
+        self,
+        tenant_id: UUID | None,
+        at: datetime,
+        product_id: UUID | None = None,
+        cell_id: UUID | None = None
+    ) -> Select:
+        """Non-zero on-hand and reserved balances per (tenant, product, cell) at `at`."""
+        checkpoint = (
+            select(InventoryCheckpoint.id, InventoryCheckpoint.as_of)
+            .where(InventoryCheckpoint.as_of <= at)
+            .order_by(InventoryCheckpoint.as_of.desc())
+            .limit(1)
+            .subquery("checkpoint")
+        )
+        
+        base = (
+            select(
+                InventoryCheckpointBalance.tenant_id,
+                InventoryCheckpointBalance.product_id,
+                InventoryCheckpointBalance.cell_id,
+                InventoryCheckpointBalance.quantity,
+                InventoryCheckpointBalance.reserved_quantity,
+            )
+            .join(checkpoint, checkpoint.c.id == InventoryCheckpointBalance.checkpoint_id)
+        )
+        since = func.coalesce(
+            select(checkpoint.c.as_of).scalar_subquery(),
+            literal("-infinity").cast(InventoryCheckpoint.as_of.type)
+        )
+        delta = select(
+            InventoryMovement.tenant_id,
+            InventoryMovement.product_id,
+            InventoryMovement.cell_id,
+            InventoryMovement.quantity,
+            InventoryMovement.reserved_quantity,
+        ).where(InventoryMovement.occurred_at >= since, InventoryMovement.occurred_at < at)
+        
+        def filtered(query, model):
+            if tenant_id:
+                query = query.where(model.tenant_id == tenant_id)
+            if product_id:
+                query = query.where(model.product_id == product_id)
+            if cell_id:
+                query = query.where(model.cell_id == cell_id)
+            return query
+        
+        rows = union_all(
+            filtered(base, InventoryCheckpointBalance), filtered(delta, InventoryMovement)
+        ).subquery("rows")
+        keys = (rows.c.tenant_id, rows.c.product_id, rows.c.cell_id)
+        quantity = func.sum(rows.c.quantity)
+        reserved = func.sum(rows.c.reserved_quantity)
+        return (
+            select(
+                *keys,
+                quantity.label("quantity"),
+                reserved.label("reserved_quantity"),
+            )
+            .group_by(*keys)
+            .having((quantity != 0) | (reserved != 0))
+        )
+    
+    async def get_balances(
+        self,
+        tenant_id: UUID | None,
+        at: datetime,
+        product_id: UUID | None = None,
+        cell_id: UUID | None = None
+    ) -> list[dict]:
+        """Balances at `at` as dicts, see `balances_query`."""
+        query = self.balances_query(tenant_id, at, product_id, cell_id)
+        result = await self.db.execute(query.order_by(*query.selected_columns[:3]))
+        return [dict(row._mapping) for row in result.all()]
+    
+    async def create_checkpoint(self, as_of: datetime) -> dict:
+        """Checkpoint the balances at `as_of` from the previous checkpoint and commit.
+        
+        Movements must not be written with ``occurred_at`` before `as_of`
+        afterwards, so `as_of` should lie safely in the past.  Re-running
+        for the same `as_of` does nothing.
+        """
+        result = await self.db.execute(
+            _CREATE_CHECKPOINT_SQL,
+            {"checkpoint_id": uuid4(), "as_of": as_of}
+        )
+        created, balances = result.one()
+        await self.db.commit()
+        return {"as_of": as_of, "created": bool(created), "balances": balances}
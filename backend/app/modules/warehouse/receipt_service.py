@@ -1,74 +1,260 @@
 """Receipt service."""
 
+import csv
+import io
+import tempfile
+from collections.abc import AsyncIterator, Iterator
+from typing import BinaryIO
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import text
+from pydantic import ValidationError
 from uuid import UUID
-from datetime import datetime
 
-from app.models import Receipt, ReceiptItem, Inventory
-from .schemas import ReceiptCreate
+from app.models import Receipt
+from app.core.numbering import next_document_number, RECEIPT
+from .schemas import ReceiptCreate, ReceiptItemCreate
+
+
+# Posting of a batch of receipt lines in one statement:
+#
+# lines    - the lines as sent (one receipt item each);
+# per_cell - lines merged per inventory key (tenant, product, cell);
+# posted   - inventory upsert; an existing row is only topped up when it
+#            holds the same lot, otherwise the line is reported back;
+# ledger   - a receipt movement per posted inventory row;
+# items    - receipt_items rows, at the product's cost price when the line
+#            has no unit cost;
+# layers   - a FIFO cost layer per receipt item;
+# summary  - on-hand totals in stock_summary.
+#
+# Returns the (product_id, cell_id, lot_number) keys that were rejected
+# because the cell already holds another lot of the product.
+_POST_RECEIPT_LINES_SQL = text("""
+    WITH lines AS (
+        SELECT *
+        FROM unnest(
+            CAST(:product_ids AS uuid[]),
+            CAST(:cell_ids AS uuid[]),
+            CAST(:quantities AS integer[]),
+            CAST(:lot_numbers AS varchar[]),
+            CAST(:expiry_dates AS date[]),
+            CAST(:unit_costs AS numeric[])
+        ) AS v(product_id, cell_id, quantity, lot_number, expiry_date, unit_cost)
+    ),
+    per_cell AS (
+        SELECT product_id, cell_id, SUM(quantity) AS quantity,
+               MIN(lot_number) AS lot_number, MIN(expiry_date) AS expiry_date
+        FROM lines
+        GROUP BY product_id, cell_id
+    ),
+    posted AS (
+        INSERT INTO inventory (
+            id, tenant_id, product_id, cell_id, quantity, reserved_quantity,
+            lot_number, expiry_date, received_at, created_at, updated_at
+        )
+        SELECT gen_random_uuid(), :tenant_id, product_id, cell_id, quantity, 0,
+               lot_number, expiry_date, now(), now(), now()
+        FROM per_cell
+        ORDER BY product_id, cell_id
+        ON CONFLICT (tenant_id, product_id, cell_id) DO UPDATE
+        SET quantity = inventory.quantity + EXCLUDED.quantity,
+            updated_at = now()
+        WHERE inventory.lot_number IS NOT DISTINCT FROM EXCLUDED.lot_number
+        RETURNING id, product_id, cell_id
+    ),
+    ledger AS (
+        INSERT INTO inventory_movements (
+            tenant_id, product_id, cell_id, inventory_id, lot_number, movement_type,
+            quantity, reserved_quantity, document_type, document_id, occurred_at
+        )
+        SELECT :tenant_id, c.product_id, c.cell_id, p.id, c.lot_number, 'receipt',
+               c.quantity, 0, 'receipt', :receipt_id, now()
+        FROM per_cell c
+        JOIN posted p ON p.product_id = c.product_id AND p.cell_id = c.cell_id
+    ),
+    items AS (
+        INSERT INTO receipt_items (
+            id, receipt_id, product_id, received_quantity,
+            cell_id, lot_number, expiry_date, unit_cost, created_at, updated_at
+        )
+        SELECT gen_random_uuid(), :receipt_id, l.product_id, l.quantity,
+               l.cell_id, l.lot_number, l.expiry_date, COALESCE(l.unit_cost, p.cost_price), now(), now()
+        FROM lines l
+        JOIN products p ON p.id = l.product_id
+        RETURNING id, product_id, received_quantity, unit_cost
+    ),
+    layers AS (
+        INSERT INTO cost_layers (
+            id, tenant_id, product_id, receipt_item_id, received_at,
+            unit_cost, quantity, remaining_quantity
+        )
+        SELECT gen_random_uuid(), :tenant_id, product_id, id, now(),
+               unit_cost, received_quantity, received_quantity
+        FROM items
+    ),
+    summary AS (
+        INSERT INTO stock_summary (tenant_id, product_id, on_hand, reserved, updated_at)
+        SELECT :tenant_id, product_id, SUM(quantity), 0, now()
+        FROM lines
+        GROUP BY product_id
+        ORDER BY product_id
+        ON CONFLICT (tenant_id, product_id) DO UPDATE
+        SET on_hand = stock_summary.on_hand + EXCLUDED.on_hand,
+            updated_at = now()
+    )
+    SELECT c.product_id, c.cell_id, c.lot_number
+    FROM per_cell c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM posted p
+        WHERE p.product_id = c.product_id AND p.cell_id = c.cell_id
+    )
+""")
+
+
+async def spool_upload(chunks: AsyncIterator[bytes], max_memory: int = 1024 * 1024) -> BinaryIO:
+    """Copy a streamed request body into a temporary file, rewound.
+    
+    Bodies up to `max_memory` bytes stay in memory.  Nothing touches the
+    database while the client is still sending.
+    """
+    upload = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    async for chunk in chunks:
+        upload.write(chunk)
+    upload.seek(0)
+    return upload
+
+
+def iter_receipt_csv(upload: BinaryIO) -> Iterator[ReceiptItemCreate]:
+    """Parse a CSV upload into receipt lines, reading it incrementally.
+    
+    The first row is the header with ``ReceiptItemCreate`` field names
+    (``product_id``, ``cell_id``, ``quantity``, optional ``lot_number``,
+    ``expiry_date`` and ``unit_cost``).  Quoted fields may contain line
+    breaks; rows in error messages are numbered by record, header = 1.
+    """
+    stream = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    header = None
+    row_number = 0
+    try:
+        for row in csv.reader(stream):
+            row_number += 1
+            if not row or not any(row):
+                continue
+            if header is None:
+                header = [name.strip() for name in row]
+                continue
+            values = {name: value.strip() or None for name, value in zip(header, row)}
+            try:
+                yield ReceiptItemCreate(**values)
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"])
+                raise ValueError(f"Row {row_number}: {field}: {error['msg']}")
+    except UnicodeDecodeError:
+        raise ValueError(f"Row {row_number + 1}: CSV is not valid UTF-8")
+    except csv.Error as e:
+        raise ValueError(f"Row {row_number + 1}: {e}")
+    finally:
+        # Leave the upload open for the caller
+        stream.detach()
+    
+    if header is None:
+        raise ValueError("CSV is empty")
 
 
 class ReceiptService:
     """Service for receipt management."""
     
+    CHUNK_SIZE = 5000
+    
     def __init__(self, db: AsyncSession):
         self.db = db
     
     async def create_receipt(self, tenant_id: UUID, data: ReceiptCreate, created_by: UUID) -> Receipt:
         """Create receipt and post inventory."""
+        receipt = await self._create_header(tenant_id, created_by)
+        for start in range(0, len(data.items), self.CHUNK_SIZE):
+            await self._post_lines(receipt, data.items[start:start + self.CHUNK_SIZE])
+        
+        await self.db.commit()
+        await self.db.refresh(receipt)
+        return receipt
+    
+    async def create_receipt_from_csv(
+        self,
+        tenant_id: UUID,
+        upload: BinaryIO,
+        created_by: UUID
+    ) -> Receipt:
+        """Create receipt from a spooled CSV upload (see `iter_receipt_csv`).
+        
+        The whole upload is validated before the receipt is started, then
+        read again and posted in chunks in one short transaction: either the
+        whole receipt is posted or nothing is.
+        """
+        if not sum(1 for _ in iter_receipt_csv(upload)):
+            raise ValueError("Receipt has no lines")
+        upload.seek(0)
+        
+        # The request's own transaction (the user lookup) holds no locks;
+        # end it so that the posting one, and its now(), starts here
+        await self.db.commit()
+        
+        receipt = await self._create_header(tenant_id, created_by)
+        chunk = []
+        for item in iter_receipt_csv(upload):
+            chunk.append(item)
+            if len(chunk) >= self.CHUNK_SIZE:
+                await self._post_lines(receipt, chunk)
+                chunk = []
+        if chunk:
+            await self._post_lines(receipt, chunk)
+        
+        await self.db.commit()
+        await self.db.refresh(receipt)
+        return receipt
+    
+    async def _create_header(self, tenant_id: UUID, created_by: UUID) -> Receipt:
+        """Create the receipt document (flushed, not committed)."""
         receipt = Receipt(
             tenant_id=tenant_id,
-            receipt_number=f"RCP-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            receipt_number=await next_document_number(self.db, tenant_id, RECEIPT),
             status="completed",
             created_by=created_by
         )
         self.db.add(receipt)
         await self.db.flush()
-        
-        for item in data.items:
-            # Create ReceiptItem
-            receipt_item = ReceiptItem(
-                receipt_id=receipt.id,
-                product_id=item.product_id,
-                received_quantity=item.quantity,
-                cell_id=item.cell_id,
-                lot_number=item.batch_number,
-                expiry_date=item.expiry_date
-            )
-            self.db.add(receipt_item)
-            
-            # Update or create Inventory
-            # Search by tenant_id, product_id, cell_id, and batch_number (lot_number)
-            query = select(Inventory).where(
-                Inventory.tenant_id == tenant_id,
-                Inventory.product_id == item.product_id,
-                Inventory.cell_id == item.cell_id
-            )
-            
-            # Handle NULL lot_number matching
-            if item.batch_number:
-                query = query.where(Inventory.lot_number == item.batch_number)
-            else:
-                query = query.where(Inventory.lot_number.is_(None))
-            
-            existing = await self.db.execute(query)
-            inventory = existing.scalar_one_or_none()
-            
-            if inventory:
-                inventory.quantity += item.quantity
-            else:
-                inventory = Inventory(
-                    tenant_id=tenant_id,
-                    product_id=item.product_id,
-                    cell_id=item.cell_id,
-                    quantity=item.quantity,
-                    lot_number=item.batch_number,
-                    expiry_date=item.expiry_date,
-                    received_at=datetime.utcnow()
+        return receipt
+    
+    async def _post_lines(self, receipt: Receipt, items: list[ReceiptItemCreate]) -> None:
+        """Post a batch of lines: receipt items, inventory and stock summary."""
+        lots: dict[tuple[UUID, UUID], str | None] = {}
+        for item in items:
+            key = (item.product_id, item.cell_id)
+            if lots.setdefault(key, item.lot_number) != item.lot_number:
+                await self.db.rollback()
+                raise ValueError(
+                    f"Product {item.product_id} is received into cell {item.cell_id} "
+                    f"with different lots in one receipt"
                 )
-                self.db.add(inventory)
         
-        await self.db.commit()
-        await self.db.refresh(receipt)
-        return receipt
+        result = await self.db.execute(
+            _POST_RECEIPT_LINES_SQL,
+            {
+                "tenant_id": receipt.tenant_id,
+                "receipt_id": receipt.id,
+                "product_ids": [item.product_id for item in items],
+                "cell_ids": [item.cell_id for item in items],
+                "quantities": [item.quantity for item in items],
+                "lot_numbers": [item.lot_number for item in items],
+                "expiry_dates": [item.expiry_date for item in items],
+                "unit_costs": [item.unit_cost for item in items],
+            }
+        )
+        rejected = result.first()
+        if rejected:
+            await self.db.rollback()
+            raise ValueError(
+                f"Cell {rejected.cell_id} already holds another lot of product "
+                f"{rejected.product_id} (received lot: {rejected.lot_number or 'none'})"
+            )
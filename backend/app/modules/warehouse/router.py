@@ -13,7 +13,9 @@ from .schemas import (
     ZoneCreate,
     RackCreate,
     RackResponse,
-    CellResponse
+    CellResponse,
+    TopologyCreate,
+    TopologyResponse
 )
 from .service import WarehouseService
 
@@ -79,6 +81,30 @@ async def create_zone(
     return ZoneResponse.model_validate(zone)
 
 
+@router.post("/{id}/topology", response_model=TopologyResponse)
+async def generate_topology(
+    id: UUID,
+    data: TopologyCreate,
+    user: User = Depends(require_permission(Permission.WAREHOUSE_MANAGE)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Lay out new zones with their racks and cells from a spec."""
+    service = WarehouseService(db)
+    warehouse = await service.get_warehouse(id)
+    if not warehouse:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Warehouse not found"
+        )
+    try:
+        return await service.generate_topology(id, data)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 @router.post("/zones/{zone_id}/racks", response_model=RackResponse)
 async def create_rack(
     zone_id: UUID,
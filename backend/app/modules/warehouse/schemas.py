@@ -1,6 +1,6 @@
 """Warehouse schemas."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, AliasChoices
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime, date
@@ -77,6 +77,41 @@ class CellResponse(BaseModel):
         from_attributes = True
 
 
+class TopologyLevelSpec(BaseModel):
+    """Cell size and weight limit of one rack level."""
+    size: str = Field("M", max_length=10)
+    max_weight: Decimal | None = Field(None, ge=0)
+
+
+class TopologyZoneSpec(BaseModel):
+    """Zone of a generated layout: racks x levels x positions.
+
+    Code templates are str.format strings.  Rack codes may use {zone} and
+    {rack}, cell codes also {rack_code}, {level} and {position}; all
+    numbers start at 1.
+    """
+    name: str = Field(..., max_length=100)
+    zone_type: str | None = None
+    racks: int = Field(..., ge=1, le=10000)
+    positions: int = Field(..., ge=1, le=10000)
+    levels: list[TopologyLevelSpec] = Field(..., min_length=1, max_length=100)
+    rack_code: str = "R{rack:02d}"
+    cell_code: str = "{rack_code}-{level}-{position:02d}"
+
+
+class TopologyCreate(BaseModel):
+    """Warehouse layout generator schema."""
+    zones: list[TopologyZoneSpec] = Field(..., min_length=1)
+
+
+class TopologyResponse(BaseModel):
+    """Generated layout: the new zones and how many racks and cells they hold."""
+    warehouse_id: UUID
+    zones: list[ZoneResponse]
+    racks: int
+    cells: int
+
+
 class InventoryResponse(BaseModel):
     """Inventory response schema."""
     id: UUID
@@ -95,11 +130,122 @@ class InventoryResponse(BaseModel):
         from_attributes = True
 
 
-class ReceiptCreate(BaseModel):
-    """Receipt create schema."""
-    warehouse_id: UUID
+class InventoryListFilter(BaseModel):
+    """Inventory list filters; expiry_before is exclusive."""
+    product_id: UUID | None = None
+    cell_id: UUID | None = None
+    zone_id: UUID | None = None
+    warehouse_id: UUID | None = None
+    lot_number: str | None = None
+    expiry_before: date | None = None
+    non_zero: bool = False
+
+
+class InventoryGroupRow(BaseModel):
+    """Stock totals per product, cell or zone; key fields depend on group_by."""
+    product_id: UUID | None = None
+    sku: str | None = None
+    product_name: str | None = None
+    cell_id: UUID | None = None
+    cell_code: str | None = None
+    zone_id: UUID | None = None
+    zone_name: str | None = None
+    lots: int
+    quantity: int
+    reserved_quantity: int
+    available: int
+
+
+class StockSummaryResponse(BaseModel):
+    """Available-to-promise stock per product."""
+    tenant_id: UUID
+    product_id: UUID
+    on_hand: int
+    reserved: int
+    available: int
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class InventoryValuationRow(BaseModel):
+    """Inventory valuation and aging row; key fields depend on group_by."""
+    tenant_id: UUID | None = None
+    warehouse_id: UUID | None = None
+    warehouse_name: str | None = None
+    zone_id: UUID | None = None
+    zone_name: str | None = None
+    product_id: UUID | None = None
+    sku: str | None = None
+    product_name: str | None = None
+    quantity: int
+    reserved_quantity: int
+    value: Decimal
+    age_0_30_quantity: int
+    age_31_90_quantity: int
+    age_91_180_quantity: int
+    age_180_plus_quantity: int
+    age_0_30_value: Decimal
+    age_31_90_value: Decimal
+    age_91_180_value: Decimal
+    age_180_plus_value: Decimal
+    expired_quantity: int
+    expires_0_30_quantity: int
+    expires_31_90_quantity: int
+    expires_90_plus_quantity: int
+    no_expiry_quantity: int
+
+
+class InventoryMovementResponse(BaseModel):
+    """Inventory ledger movement."""
+    id: int
+    tenant_id: UUID
+    product_id: UUID
+    cell_id: UUID
+    inventory_id: UUID | None = None
+    lot_number: str | None = None
+    movement_type: str
+    quantity: int
+    reserved_quantity: int
+    document_type: str
+    document_id: UUID | None = None
+    occurred_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class InventoryBalanceResponse(BaseModel):
+    """Point-in-time balance of a product in a cell."""
+    tenant_id: UUID
+    product_id: UUID
+    cell_id: UUID
+    quantity: int
+    reserved_quantity: int
+
+
+class InventorySnapshotResponse(BaseModel):
+    """End-of-day stock of a product in a cell."""
+    snapshot_date: date
     tenant_id: UUID
-    items: list[dict]  # Simplified for stub
+    product_id: UUID
+    cell_id: UUID
+    lot_number: str | None = None
+    quantity: int
+    reserved_quantity: int
+
+    class Config:
+        from_attributes = True
+
+
+class StockReconcileResponse(BaseModel):
+    """Stock summary rebuild result."""
+    rows_checked: int
+    rows_fixed: int
+    rows_removed: int
+
+
 
 
 class TransferCreate(BaseModel):
@@ -115,9 +261,17 @@ class ReceiptItemCreate(BaseModel):
     """Receipt item create schema."""
     product_id: UUID
     cell_id: UUID
-    quantity: int
+    quantity: int = Field(..., gt=0)
     lot_number: str | None = None
     expiry_date: date | None = None
+    unit_cost: Decimal | None = Field(None, ge=0)
+
+
+class ReceiptCreate(BaseModel):
+    """Receipt create schema."""
+    warehouse_id: UUID
+    tenant_id: UUID
+    items: list[ReceiptItemCreate] = Field(..., min_length=1)
 
 
 class ReceiptResponse(BaseModel):
@@ -134,15 +288,36 @@ class ReceiptResponse(BaseModel):
 
 
 class TransferResponse(BaseModel):
-    """Transfer response schema."""
+    """Transfer response schema (a transfer is applied when it is created)."""
     id: UUID
     tenant_id: UUID
     product_id: UUID
-    from_cell_id: UUID
-    to_cell_id: UUID
+    from_cell_id: UUID = Field(validation_alias=AliasChoices("from_cell_id", "source_cell_id"))
+    to_cell_id: UUID = Field(validation_alias=AliasChoices("to_cell_id", "target_cell_id"))
     quantity: int
-    status: str
+    lot_number: str | None = None
+    status: str = "created"
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class TransferBatchCreate(BaseModel):
+    """Bulk transfer create schema."""
+    transfers: list[TransferCreate] = Field(..., min_length=1, max_length=5000)
+
+
+class TransferBatchResult(BaseModel):
+    """Result for one move of a batch, in request order."""
+    index: int
+    status: str  # created, failed
+    transfer_id: UUID | None = None
+    error: str | None = None
+
+
+class TransferBatchResponse(BaseModel):
+    """Bulk transfer create result schema."""
+    created: int
+    failed: int
+    results: list[TransferBatchResult]
@@ -1,13 +1,415 @@
 """Warehouse services."""
 
+import base64
+import string
+from functools import lru_cache
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, text, column, func, cast, tuple_, Integer, BigInteger, Select
 from sqlalchemy.orm import selectinload
 from uuid import UUID
-from datetime import datetime
 
-from app.models import Warehouse, Zone, Rack, Cell, Inventory, Reservation, Order, OrderItem
-from .schemas import ZoneCreate, RackCreate
+from app.models import Warehouse, Zone, Rack, Cell, Inventory, Reservation, Order, Product
+from .schemas import ZoneCreate, RackCreate, InventoryListFilter, TopologyCreate
+from .stock_service import StockSummaryService
+
+
+# Set-based FEFO/FIFO allocation of every open line of one order.
+#
+# demand  - what is still missing per order line;
+# ranked  - candidate lots ranked per product by expiry (NULLS LAST), then
+#           receipt time, with the running total of stock ahead of each lot;
+# alloc   - lots needed to cover the demand and how much to take from each;
+# locked  - only the chosen inventory rows, locked in id order so that
+#           concurrent reservations never deadlock;
+# taken   - inventory update, re-checked against the locked row version;
+# ledger  - a reserve movement per lot taken;
+# lines   - reserved/shortage counters on the order lines;
+# summary - reserved totals in stock_summary;
+# created - reservation rows.
+#
+# The statement always returns at least one row: the created reservations
+# (or NULLs) plus ``missed``, the number of chosen lots that a concurrent
+# transaction drained after the snapshot was taken.
+_RESERVE_ORDER_SQL = text("""
+    WITH demand AS (
+        SELECT oi.id AS order_item_id,
+               oi.product_id,
+               oi.quantity - oi.reserved_quantity AS need
+        FROM order_items oi
+        WHERE oi.order_id = :order_id
+          AND oi.quantity > oi.reserved_quantity
+    ),
+    ranked AS (
+        SELECT i.id AS inventory_id,
+               i.product_id,
+               i.cell_id,
+               i.quantity - i.reserved_quantity AS available,
+               SUM(i.quantity - i.reserved_quantity) OVER (
+                   PARTITION BY i.product_id
+                   ORDER BY i.expiry_date NULLS LAST, i.received_at, i.id
+               ) - (i.quantity - i.reserved_quantity) AS ahead
+        FROM inventory i
+        WHERE i.tenant_id = :tenant_id
+          AND i.product_id IN (SELECT product_id FROM demand)
+          AND i.quantity > i.reserved_quantity
+    ),
+    alloc AS (
+        SELECT d.order_item_id,
+               r.inventory_id,
+               r.product_id,
+               r.cell_id,
+               LEAST(r.available, d.need - r.ahead) AS quantity
+        FROM ranked r
+        JOIN demand d ON d.product_id = r.product_id
+        WHERE r.ahead < d.need
+    ),
+    locked AS MATERIALIZED (
+        SELECT i.id
+        FROM inventory i
+        WHERE i.id IN (SELECT inventory_id FROM alloc)
+        ORDER BY i.id
+        FOR UPDATE
+    ),
+    taken AS (
+        UPDATE inventory i
+        SET reserved_quantity = i.reserved_quantity + a.quantity,
+            updated_at = now()
+        FROM alloc a
+        JOIN locked l ON l.id = a.inventory_id
+        WHERE i.id = a.inventory_id
+          AND i.quantity - i.reserved_quantity >= a.quantity
+        RETURNING a.order_item_id, a.inventory_id, a.product_id, a.cell_id, a.quantity,
+                  i.lot_number
+    ),
+    ledger AS (
+        INSERT INTO inventory_movements (
+            tenant_id, product_id, cell_id, inventory_id, lot_number, movement_type,
+            quantity, reserved_quantity, document_type, document_id, occurred_at
+        )
+        SELECT :tenant_id, product_id, cell_id, inventory_id, MIN(lot_number), 'reserve',
+               0, SUM(quantity), 'order', :order_id, now()
+        FROM taken
+        GROUP BY product_id, cell_id, inventory_id
+    ),
+    lines AS (
+        UPDATE order_items oi
+        SET reserved_quantity = oi.reserved_quantity + COALESCE(t.quantity, 0),
+            shortage = d.need - COALESCE(t.quantity, 0)
+        FROM demand d
+        LEFT JOIN (
+            SELECT order_item_id, SUM(quantity) AS quantity
+            FROM taken
+            GROUP BY order_item_id
+        ) t ON t.order_item_id = d.order_item_id
+        WHERE oi.id = d.order_item_id
+    ),
+    summary AS (
+        INSERT INTO stock_summary (tenant_id, product_id, on_hand, reserved, updated_at)
+        SELECT :tenant_id, product_id, 0, SUM(quantity), now()
+        FROM taken
+        GROUP BY product_id
+        ORDER BY product_id
+        ON CONFLICT (tenant_id, product_id) DO UPDATE
+        SET reserved = stock_summary.reserved + EXCLUDED.reserved,
+            updated_at = now()
+    ),
+    created AS (
+        INSERT INTO reservations (
+            id, order_id, order_item_id, inventory_id, product_id, cell_id,
+            quantity, status, created_at
+        )
+        SELECT gen_random_uuid(), :order_id, t.order_item_id, t.inventory_id,
+               t.product_id, t.cell_id, t.quantity, 'reserved', now()
+        FROM taken t
+        RETURNING id, order_id, order_item_id, inventory_id, product_id, cell_id,
+                  quantity, status, fulfilled_at, created_at
+    )
+    SELECT c.*, m.missed
+    FROM (
+        SELECT (SELECT COUNT(*) FROM alloc) - (SELECT COUNT(*) FROM taken) AS missed
+    ) m
+    LEFT JOIN created c ON true
+""").columns(
+    Reservation.id,
+    Reservation.order_id,
+    Reservation.order_item_id,
+    Reservation.inventory_id,
+    Reservation.product_id,
+    Reservation.cell_id,
+    Reservation.quantity,
+    Reservation.status,
+    Reservation.fulfilled_at,
+    Reservation.created_at,
+    column("missed", Integer),
+)
+
+
+# Release of all open reservations of a set of orders: reservations are
+# deleted, lots are locked in id order and un-reserved, order lines and
+# stock_summary are decremented and a release movement per lot and order
+# goes to the ledger.  Returns the per-lot movements.
+_RELEASE_ORDERS_SQL = text("""
+    WITH released AS (
+        DELETE FROM reservations r
+        WHERE r.order_id = ANY(CAST(:order_ids AS uuid[]))
+          AND r.status = 'reserved'
+        RETURNING r.inventory_id, r.order_id, r.order_item_id, r.quantity
+    ),
+    per_lot AS (
+        SELECT inventory_id, SUM(quantity) AS quantity
+        FROM released
+        GROUP BY inventory_id
+    ),
+    locked AS MATERIALIZED (
+        SELECT i.id
+        FROM inventory i
+        WHERE i.id IN (SELECT inventory_id FROM per_lot)
+        ORDER BY i.id
+        FOR UPDATE
+    ),
+    lines AS (
+        UPDATE order_items oi
+        SET reserved_quantity = oi.reserved_quantity - s.quantity
+        FROM (
+            SELECT order_item_id, SUM(quantity) AS quantity
+            FROM released
+            GROUP BY order_item_id
+        ) s
+        WHERE oi.id = s.order_item_id
+    ),
+    moved AS (
+        UPDATE inventory i
+        SET reserved_quantity = i.reserved_quantity - p.quantity,
+            updated_at = now()
+        FROM per_lot p
+        JOIN locked l ON l.id = p.inventory_id
+        WHERE i.id = p.inventory_id
+        RETURNING i.id AS inventory_id, i.tenant_id, i.product_id, i.cell_id,
+                  i.lot_number, p.quantity
+    ),
+    ledger AS (
+        INSERT INTO inventory_movements (
+            tenant_id, product_id, cell_id, inventory_id, lot_number, movement_type,
+            quantity, reserved_quantity, document_type, document_id, occurred_at
+        )
+        SELECT m.tenant_id, m.product_id, m.cell_id, m.inventory_id, m.lot_number, 'release',
+               0, -SUM(r.quantity), 'order', r.order_id, now()
+        FROM released r
+        JOIN moved m ON m.inventory_id = r.inventory_id
+        GROUP BY m.tenant_id, m.product_id, m.cell_id, m.inventory_id, m.lot_number, r.order_id
+    ),
+    summary AS (
+        INSERT INTO stock_summary (tenant_id, product_id, on_hand, reserved, updated_at)
+        SELECT tenant_id, product_id, 0, -SUM(quantity), now()
+        FROM moved
+        GROUP BY tenant_id, product_id
+        ORDER BY tenant_id, product_id
+        ON CONFLICT (tenant_id, product_id) DO UPDATE
+        SET reserved = stock_summary.reserved + EXCLUDED.reserved,
+            updated_at = now()
+    )
+    SELECT inventory_id, tenant_id, product_id, quantity FROM moved
+""")
+
+# Fulfillment of all open reservations of a set of orders: reservations are
+# marked fulfilled, lots are locked in id order and written off, picked
+# quantities on the order lines are increased, stock_summary is
+# decremented and a ship movement per lot and order goes to the ledger.
+# Returns the per-lot movements.
+#
+# The shipped units are costed FIFO in the same statement:
+#
+# shipped  - shipped quantity per order line, with the running total per
+#            product (lines in order id order) as the end of its range;
+# layers   - open cost layers of the products, locked in id order, with the
+#            running total per product in receipt order;
+# consumed - overlap of every line range with every layer range, i.e. how
+#            many units of which layer each line takes;
+# drained  - remaining quantities of the layers.
+#
+# Units not covered by any layer (stock older than cost layers) have no
+# consumption and stay at the order line's cost price.
+_FULFILL_ORDERS_SQL = text("""
+    WITH fulfilled AS (
+        UPDATE reservations r
+        SET status = 'fulfilled',
+            fulfilled_at = now()
+        WHERE r.order_id = ANY(CAST(:order_ids AS uuid[]))
+          AND r.status = 'reserved'
+        RETURNING r.inventory_id, r.order_id, r.order_item_id, r.product_id, r.quantity
+    ),
+    shipped AS (
+        SELECT order_id, order_item_id, product_id, SUM(quantity) AS quantity,
+               SUM(SUM(quantity)) OVER (
+                   PARTITION BY product_id ORDER BY order_id, order_item_id
+               ) AS upto
+        FROM fulfilled
+        GROUP BY order_id, order_item_id, product_id
+    ),
+    locked_layers AS MATERIALIZED (
+        SELECT cl.id, cl.product_id, cl.received_at, cl.unit_cost, cl.remaining_quantity
+        FROM cost_layers cl
+        WHERE cl.product_id IN (SELECT product_id FROM shipped)
+          AND cl.remaining_quantity > 0
+        ORDER BY cl.id
+        FOR UPDATE
+    ),
+    layers AS (
+        SELECT id, product_id, unit_cost, remaining_quantity,
+               SUM(remaining_quantity) OVER (
+                   PARTITION BY product_id ORDER BY received_at, id
+               ) AS upto
+        FROM locked_layers
+    ),
+    consumed AS (
+        SELECT s.order_id, s.order_item_id, l.id AS layer_id, l.unit_cost,
+               LEAST(s.upto, l.upto) - GREATEST(s.upto - s.quantity, l.upto - l.remaining_quantity) AS quantity
+        FROM shipped s
+        JOIN layers l ON l.product_id = s.product_id
+         AND l.upto - l.remaining_quantity < s.upto
+         AND s.upto - s.quantity < l.upto
+    ),
+    drained AS (
+        UPDATE cost_layers cl
+        SET remaining_quantity = cl.remaining_quantity - c.quantity
+        FROM (
+            SELECT layer_id, SUM(quantity) AS quantity
+            FROM consumed
+            GROUP BY layer_id
+        ) c
+        WHERE cl.id = c.layer_id
+    ),
+    costed AS (
+        INSERT INTO cost_layer_consumptions (
+            id, layer_id, order_id, order_item_id, quantity, unit_cost, created_at
+        )
+        SELECT gen_random_uuid(), layer_id, order_id, order_item_id, quantity, unit_cost, now()
+        FROM consumed
+    ),
+    per_lot AS (
+        SELECT inventory_id, SUM(quantity) AS quantity
+        FROM fulfilled
+        GROUP BY inventory_id
+    ),
+    locked AS MATERIALIZED (
+        SELECT i.id
+        FROM inventory i
+        WHERE i.id IN (SELECT inventory_id FROM per_lot)
+        ORDER BY i.id
+        FOR UPDATE
+    ),
+    lines AS (
+        UPDATE order_items oi
+        SET picked_quantity = oi.picked_quantity + s.quantity
+        FROM (
+            SELECT order_item_id, SUM(quantity) AS quantity
+            FROM fulfilled
+            GROUP BY order_item_id
+        ) s
+        WHERE oi.id = s.order_item_id
+    ),
+    moved AS (
+        UPDATE inventory i
+        SET quantity = i.quantity - p.quantity,
+            reserved_quantity = i.reserved_quantity - p.quantity,
+            updated_at = now()
+        FROM per_lot p
+        JOIN locked l ON l.id = p.inventory_id
+        WHERE i.id = p.inventory_id
+        RETURNING i.id AS inventory_id, i.tenant_id, i.product_id, i.cell_id,
+                  i.lot_number, p.quantity
+    ),
+    ledger AS (
+        INSERT INTO inventory_movements (
+            tenant_id, product_id, cell_id, inventory_id, lot_number, movement_type,
+            quantity, reserved_quantity, document_type, document_id, occurred_at
+        )
+        SELECT m.tenant_id, m.product_id, m.cell_id, m.inventory_id, m.lot_number, 'ship',
+               -SUM(f.quantity), -SUM(f.quantity), 'order', f.order_id, now()
+        FROM fulfilled f
+        JOIN moved m ON m.inventory_id = f.inventory_id
+        GROUP BY m.tenant_id, m.product_id, m.cell_id, m.inventory_id, m.lot_number, f.order_id
+    ),
+    summary AS (
+        INSERT INTO stock_summary (tenant_id, product_id, on_hand, reserved, updated_at)
+        SELECT tenant_id, product_id, -SUM(quantity), -SUM(quantity), now()
+        FROM moved
+        GROUP BY tenant_id, product_id
+        ORDER BY tenant_id, product_id
+        ON CONFLICT (tenant_id, product_id) DO UPDATE
+        SET on_hand = stock_summary.on_hand + EXCLUDED.on_hand,
+            reserved = stock_summary.reserved + EXCLUDED.reserved,
+            updated_at = now()
+    )
+    SELECT inventory_id, tenant_id, product_id, quantity FROM moved
+""")
+
+
+# Cells of a generated layout in one statement; codes are built by the caller
+_INSERT_CELLS_SQL = text("""
+    INSERT INTO cells (id, rack_id, code, level, size, max_weight, is_active, created_at, updated_at)
+    SELECT gen_random_uuid(), v.rack_id, v.code, v.level, v.size, v.max_weight, true, now(), now()
+    FROM unnest(
+        CAST(:rack_ids AS uuid[]),
+        CAST(:codes AS varchar[]),
+        CAST(:levels AS integer[]),
+        CAST(:sizes AS varchar[]),
+        CAST(:max_weights AS numeric[])
+    ) AS v(rack_id, code, level, size, max_weight)
+""")
+
+MAX_TOPOLOGY_CELLS = 200_000
+
+_FORMATTER = string.Formatter()
+
+
+@lru_cache(maxsize=256)
+def _template_fields(template: str) -> frozenset[str]:
+    """Field names of a str.format template, format specs included."""
+    names = set()
+    for _, name, spec, _ in _FORMATTER.parse(template):
+        if name is not None:
+            names.add(name)
+        for _, nested, _, _ in _FORMATTER.parse(spec or ""):
+            if nested is not None:
+                names.add(nested)
+    return frozenset(names)
+
+
+def format_layout_code(template: str, what: str, **fields) -> str:
+    """Code from a str.format template; raises ValueError for unusable templates.
+    
+    Only the plain names in `fields` may be used, no attribute or index
+    lookups.
+    """
+    try:
+        if not _template_fields(template) <= fields.keys():
+            raise ValueError
+        code = template.format(**fields)
+    except (KeyError, IndexError, ValueError, AttributeError, TypeError):
+        raise ValueError(f"Invalid {what} template: {template}")
+    if not 0 < len(code) <= 50:
+        raise ValueError(f"{what} must be 1 to 50 characters: {code!r}")
+    return code
+
+
+INVENTORY_GROUPS = ("product", "cell", "zone")
+
+
+def encode_key_cursor(*key: UUID) -> str:
+    """Opaque keyset cursor from the key of the last row of a page."""
+    return base64.urlsafe_b64encode("|".join(str(part) for part in key).encode()).decode()
+
+
+def decode_key_cursor(cursor: str, size: int) -> tuple[UUID, ...]:
+    """Inverse of encode_key_cursor; raises ValueError for malformed cursors."""
+    try:
+        key = tuple(UUID(part) for part in base64.urlsafe_b64decode(cursor.encode()).decode().split("|"))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if len(key) != size:
+        raise ValueError("Invalid cursor")
+    return key
 
 
 class WarehouseService:
@@ -43,22 +445,95 @@ class WarehouseService:
     
     async def create_cells_bulk(self, rack_id: UUID, prefix: str, count: int) -> list[Cell]:
         """Bulk create cells: A1-01, A1-02, ..., A1-50."""
-        cells = []
-        for i in range(1, count + 1):
-            cell = Cell(
-                rack_id=rack_id,
-                code=f"{prefix}-{i:02d}",
-                size="M",
-                max_weight=100
-            )
-            cells.append(cell)
-            self.db.add(cell)
+        result = await self.db.scalars(
+            insert(Cell).returning(Cell, sort_by_parameter_order=True),
+            [
+                {"rack_id": rack_id, "code": f"{prefix}-{i:02d}", "size": "M", "max_weight": 100}
+                for i in range(1, count + 1)
+            ]
+        )
+        cells = list(result.all())
         await self.db.commit()
-        # Refresh all cells
-        for cell in cells:
-            await self.db.refresh(cell)
         return cells
     
+    async def generate_topology(self, warehouse_id: UUID, data: TopologyCreate) -> dict:
+        """Create zones, racks and cells of a layout spec and commit.
+        
+        Codes are generated and checked for uniqueness (rack codes per
+        zone, cell codes per rack) before anything is written.  Zones and
+        racks are inserted with one statement each, RETURNING their ids;
+        all cells are then inserted with a single unnest statement.
+        """
+        total = sum(zone.racks * len(zone.levels) * zone.positions for zone in data.zones)
+        if total > MAX_TOPOLOGY_CELLS:
+            raise ValueError(f"Layout has {total} cells, at most {MAX_TOPOLOGY_CELLS} are allowed")
+        
+        names = [zone.name for zone in data.zones]
+        result = await self.db.execute(
+            select(Zone.name).where(Zone.warehouse_id == warehouse_id, Zone.name.in_(names))
+        )
+        existing = sorted(result.scalars().all())
+        if existing:
+            raise ValueError(f"Zones already exist: {', '.join(existing)}")
+        if len(set(names)) != len(names):
+            raise ValueError("Zone names are not unique")
+        
+        rack_codes = []
+        cells = {"rack_ids": [], "codes": [], "levels": [], "sizes": [], "max_weights": []}
+        for n, spec in enumerate(data.zones, start=1):
+            codes = [
+                format_layout_code(spec.rack_code, "Rack code", zone=n, rack=rack)
+                for rack in range(1, spec.racks + 1)
+            ]
+            if len(set(codes)) != len(codes):
+                raise ValueError(f"Rack codes of zone {spec.name} are not unique")
+            for rack, rack_code in enumerate(codes, start=1):
+                seen = set()
+                for level, level_spec in enumerate(spec.levels, start=1):
+                    for position in range(1, spec.positions + 1):
+                        code = format_layout_code(
+                            spec.cell_code, "Cell code",
+                            zone=n, rack=rack, rack_code=rack_code, level=level, position=position
+                        )
+                        if code in seen:
+                            raise ValueError(f"Cell code {code} repeats in rack {rack_code} of zone {spec.name}")
+                        seen.add(code)
+                        # Rack ordinal for now, replaced by its id below
+                        cells["rack_ids"].append(len(rack_codes) + rack - 1)
+                        cells["codes"].append(code)
+                        cells["levels"].append(level)
+                        cells["sizes"].append(level_spec.size)
+                        cells["max_weights"].append(level_spec.max_weight)
+            rack_codes.extend((n, code) for code in codes)
+        
+        # Zones and racks, ids back in spec order, then all cells
+        result = await self.db.scalars(
+            insert(Zone).returning(Zone, sort_by_parameter_order=True),
+            [
+                {"warehouse_id": warehouse_id, "name": spec.name, "zone_type": spec.zone_type}
+                for spec in data.zones
+            ]
+        )
+        zones = list(result.all())
+        result = await self.db.execute(
+            insert(Rack).returning(Rack.id, sort_by_parameter_order=True),
+            [
+                {"zone_id": zones[n - 1].id, "code": code, "levels": len(data.zones[n - 1].levels)}
+                for n, code in rack_codes
+            ]
+        )
+        rack_ids = result.scalars().all()
+        cells["rack_ids"] = [rack_ids[rack] for rack in cells["rack_ids"]]
+        await self.db.execute(_INSERT_CELLS_SQL, cells)
+        await self.db.commit()
+        
+        return {
+            "warehouse_id": warehouse_id,
+            "zones": zones,
+            "racks": len(rack_ids),
+            "cells": total,
+        }
+    
     async def get_cell(self, cell_id: UUID) -> Cell | None:
         """Get cell by ID."""
         return await self.db.get(Cell, cell_id)
@@ -80,139 +555,185 @@ class InventoryService:
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def get_inventory(self, tenant_id: UUID, product_id: UUID | None = None) -> list[Inventory]:
-        """Get inventory for tenant, optionally filtered by product."""
-        query = select(Inventory).where(Inventory.tenant_id == tenant_id)
-        if product_id:
-            query = query.where(Inventory.product_id == product_id)
-        result = await self.db.execute(query)
-        return list(result.scalars().all())
+    def _filtered(self, query: Select, tenant_id: UUID, filters: InventoryListFilter | None) -> Select:
+        """Apply the tenant and list filters (zone and warehouse need cells and racks joined)."""
+        query = query.where(Inventory.tenant_id == tenant_id)
+        if not filters:
+            return query
+        if filters.product_id:
+            query = query.where(Inventory.product_id == filters.product_id)
+        if filters.cell_id:
+            query = query.where(Inventory.cell_id == filters.cell_id)
+        if filters.zone_id:
+            query = query.where(Rack.zone_id == filters.zone_id)
+        if filters.warehouse_id:
+            query = query.where(Rack.zone_id.in_(
+                select(Zone.id).where(Zone.warehouse_id == filters.warehouse_id)
+            ))
+        if filters.lot_number:
+            query = query.where(Inventory.lot_number == filters.lot_number)
+        if filters.expiry_before:
+            query = query.where(Inventory.expiry_date < filters.expiry_before)
+        if filters.non_zero:
+            query = query.where(Inventory.quantity != 0)
+        return query
     
-    async def get_available_quantity(self, tenant_id: UUID, product_id: UUID) -> int:
-        """Get available quantity = quantity - reserved_quantity."""
+    @staticmethod
+    def _needs_topology(filters: InventoryListFilter | None) -> bool:
+        return bool(filters and (filters.zone_id or filters.warehouse_id))
+    
+    async def list_inventory(
+        self,
+        tenant_id: UUID,
+        filters: InventoryListFilter | None = None,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        """One page of inventory rows, by product and cell, and the cursor of the next page.
+        
+        Rows are plain column dicts; the (tenant, product, cell) unique
+        index serves both the order and the keyset condition.
+        """
+        query = select(*Inventory.__table__.c)
+        if self._needs_topology(filters):
+            query = query.join(Cell, Cell.id == Inventory.cell_id).join(Rack, Rack.id == Cell.rack_id)
+        query = self._filtered(query, tenant_id, filters)
+        if cursor:
+            product_id, cell_id = decode_key_cursor(cursor, 2)
+            query = query.where(tuple_(Inventory.product_id, Inventory.cell_id) > tuple_(product_id, cell_id))
         result = await self.db.execute(
-            select(Inventory).where(
-                Inventory.tenant_id == tenant_id,
-                Inventory.product_id == product_id
-            )
+            query.order_by(Inventory.product_id, Inventory.cell_id).limit(limit + 1)
+        )
+        rows = [dict(row._mapping) for row in result.all()]
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_key_cursor(rows[-1]["product_id"], rows[-1]["cell_id"])
+        return rows, next_cursor
+    
+    async def aggregate_inventory(
+        self,
+        tenant_id: UUID,
+        group_by: str,
+        filters: InventoryListFilter | None = None,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        """One page of stock totals per product, cell or zone, summed in the database."""
+        if group_by not in INVENTORY_GROUPS:
+            raise ValueError(f"Unknown group_by: {group_by}")
+        
+        keys = {
+            "product": (Inventory.product_id, Product.sku, Product.name.label("product_name")),
+            "cell": (Inventory.cell_id, Cell.code.label("cell_code")),
+            "zone": (Rack.zone_id, Zone.name.label("zone_name")),
+        }[group_by]
+        query = select(
+            *keys,
+            func.count().label("lots"),
+            cast(func.sum(Inventory.quantity), BigInteger).label("quantity"),
+            cast(func.sum(Inventory.reserved_quantity), BigInteger).label("reserved_quantity"),
+            cast(func.sum(Inventory.quantity - Inventory.reserved_quantity), BigInteger).label("available"),
         )
-        inventories = result.scalars().all()
-        return sum(inv.quantity - inv.reserved_quantity for inv in inventories)
+        if group_by == "product":
+            query = query.join(Product, Product.id == Inventory.product_id)
+        if group_by != "product" or self._needs_topology(filters):
+            query = query.join(Cell, Cell.id == Inventory.cell_id)
+        if group_by == "zone" or self._needs_topology(filters):
+            query = query.join(Rack, Rack.id == Cell.rack_id)
+        if group_by == "zone":
+            query = query.join(Zone, Zone.id == Rack.zone_id)
+        query = self._filtered(query, tenant_id, filters)
+        if cursor:
+            (after,) = decode_key_cursor(cursor, 1)
+            query = query.where(keys[0] > after)
+        result = await self.db.execute(
+            query.group_by(*keys).order_by(keys[0]).limit(limit + 1)
+        )
+        rows = [dict(row._mapping) for row in result.all()]
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_key_cursor(rows[-1][keys[0].key])
+        return rows, next_cursor
+    
+    async def get_available_quantity(self, tenant_id: UUID, product_id: UUID) -> int:
+        """Get available quantity = quantity - reserved_quantity (from stock_summary)."""
+        return await StockSummaryService(self.db).get_available(tenant_id, product_id)
 
 
 class ReservationService:
     """Service for order reservations with FIFO/FEFO."""
     
+    MAX_RESERVE_PASSES = 5
+    
     def __init__(self, db: AsyncSession):
         self.db = db
     
     async def reserve_for_order(self, order_id: UUID) -> list[Reservation]:
-        """Reserve inventory for order items using FIFO/FEFO."""
+        """Reserve inventory for order items using FIFO/FEFO and commit."""
+        reservations = await self.reserve_lines_for_order(order_id)
+        await self.db.commit()
+        return reservations
+    
+    async def reserve_lines_for_order(self, order_id: UUID) -> list[Reservation]:
+        """Reserve inventory for order items using FIFO/FEFO without committing.
+        
+        All open lines of the order are allocated by one statement (see
+        ``_RESERVE_ORDER_SQL``).  If a chosen lot was drained by a concurrent
+        transaction the statement is repeated with a fresh snapshot for the
+        remaining quantity.  The order status is not checked.
+        """
         order = await self.db.get(Order, order_id)
         if not order:
             raise ValueError(f"Order {order_id} not found")
         
         reservations = []
-        
-        # Загрузить items с продуктами
-        result = await self.db.execute(
-            select(OrderItem)
-            .where(OrderItem.order_id == order_id)
-        )
-        items = result.scalars().all()
-        
-        for item in items:
-            # Получить доступные остатки с сортировкой FIFO/FEFO
-            query = select(Inventory).where(
-                Inventory.tenant_id == order.tenant_id,
-                Inventory.product_id == item.product_id,
-                Inventory.quantity > Inventory.reserved_quantity
-            )
-            
-            # FEFO: сначала по сроку годности (если есть), затем FIFO по дате поступления
-            query = query.order_by(
-                Inventory.expiry_date.nulls_last(),
-                Inventory.received_at
+        for _ in range(self.MAX_RESERVE_PASSES):
+            result = await self.db.execute(
+                select(Reservation, column("missed", Integer)).from_statement(_RESERVE_ORDER_SQL),
+                {"order_id": order_id, "tenant_id": order.tenant_id}
             )
-            
-            result = await self.db.execute(query)
-            inventories = result.scalars().all()
-            
-            remaining = item.quantity
-            for inv in inventories:
-                if remaining <= 0:
-                    break
-                
-                available = inv.quantity - inv.reserved_quantity
-                to_reserve = min(available, remaining)
-                
-                if to_reserve <= 0:
-                    continue
-                
-                # Создать резерв
-                reservation = Reservation(
-                    order_id=order_id,
-                    order_item_id=item.id,
-                    inventory_id=inv.id,
-                    product_id=item.product_id,
-                    cell_id=inv.cell_id,
-                    quantity=to_reserve
-                )
-                self.db.add(reservation)
-                reservations.append(reservation)
-                
-                # Увеличить reserved_quantity
-                inv.reserved_quantity += to_reserve
-                item.reserved_quantity += to_reserve
-                remaining -= to_reserve
-            
-            # Если осталось нерезервированное количество
-            if remaining > 0:
-                item.shortage = remaining
-        
-        await self.db.commit()
+            missed = 0
+            for reservation, missed in result.all():
+                if reservation is not None:
+                    reservations.append(reservation)
+            if not missed:
+                break
         return reservations
     
-    async def release_reservations(self, order_id: UUID) -> None:
-        """Release reservations when order is cancelled."""
-        result = await self.db.execute(
-            select(Reservation).where(Reservation.order_id == order_id)
-        )
-        reservations = result.scalars().all()
+    async def release_for_orders(self, order_ids: list[UUID]) -> list[dict]:
+        """Release open reservations of many orders without committing.
         
-        for res in reservations:
-            inv = await self.db.get(Inventory, res.inventory_id)
-            if inv:
-                inv.reserved_quantity -= res.quantity
-            
-            # Обновить reserved_quantity в OrderItem
-            item = await self.db.get(OrderItem, res.order_item_id)
-            if item:
-                item.reserved_quantity -= res.quantity
-            
-            await self.db.delete(res)
+        Returns the stock movements as ``{"inventory_id", "tenant_id",
+        "product_id", "quantity"}`` rows (quantity un-reserved per lot).
+        """
+        if not order_ids:
+            return []
+        result = await self.db.execute(_RELEASE_ORDERS_SQL, {"order_ids": list(order_ids)})
+        return [dict(row._mapping) for row in result.all()]
+    
+    async def fulfill_for_orders(self, order_ids: list[UUID]) -> list[dict]:
+        """Write off reserved stock of many orders without committing.
         
+        The shipped units consume FIFO cost layers; the orders' cost of
+        goods follows on their next PnL recompute.  Returns the stock
+        movements as ``{"inventory_id", "tenant_id", "product_id",
+        "quantity"}`` rows (quantity shipped per lot).
+        """
+        if not order_ids:
+            return []
+        result = await self.db.execute(_FULFILL_ORDERS_SQL, {"order_ids": list(order_ids)})
+        return [dict(row._mapping) for row in result.all()]
+    
+    async def release_reservations(self, order_id: UUID) -> None:
+        """Release reservations when order is cancelled."""
+        await self.release_for_orders([order_id])
         await self.db.commit()
     
     async def fulfill_reservations(self, order_id: UUID) -> None:
         """Fulfill reservations when order is shipped (write off inventory)."""
-        result = await self.db.execute(
-            select(Reservation).where(Reservation.order_id == order_id)
-        )
-        reservations = result.scalars().all()
-        
-        for res in reservations:
-            inv = await self.db.get(Inventory, res.inventory_id)
-            if inv:
-                inv.quantity -= res.quantity
-                inv.reserved_quantity -= res.quantity
-            
-            # Обновить picked_quantity в OrderItem
-            item = await self.db.get(OrderItem, res.order_item_id)
-            if item:
-                item.picked_quantity += res.quantity
-            
-            res.fulfilled_at = datetime.utcnow()
-            res.status = "fulfilled"
-        
+        await self.fulfill_for_orders([order_id])
         await self.db.commit()
@@ -0,0 +1,151 @@
+"""Daily inventory snapshots in monthly partitions."""
+
+import re
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert, text, and_, literal, func, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from uuid import UUID
+from datetime import date, datetime, time, timedelta, timezone
+
+from app.config import settings
+from app.models import Inventory, InventorySnapshot, InventorySnapshotRun
+from .ledger_service import InventoryLedgerService
+
+
+_PARTITION_NAME = re.compile(r"^inventory_snapshots_(\d{4})_(\d{2})$")
+
+_LIST_PARTITIONS_SQL = text("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = 'inventory_snapshots'
+""")
+
+
+def month_bounds(day: date) -> tuple[date, date]:
+    """First day of the month of `day` and first day of the next month."""
+    start = day.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(day: date) -> str:
+    """Name of the partition holding the snapshots of `day`."""
+    return f"inventory_snapshots_{day.year:04d}_{day.month:02d}"
+
+
+def end_of_day(day: date) -> datetime:
+    """Midnight UTC after `day`; a snapshot holds the stock at this time."""
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+
+class InventorySnapshotService:
+    """Service for daily inventory snapshots.
+    
+    A day's snapshot is the ledger balance at the end of the day (see
+    ``InventoryLedgerService.balances_query``), so a missed day can be taken
+    later with the same result.  Reads only touch the snapshot tables.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def _ensure_partition(self, day: date) -> None:
+        start, end = month_bounds(day)
+        await self.db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(day)} "
+            f"PARTITION OF inventory_snapshots FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+    
+    async def take_snapshot(self, day: date) -> dict:
+        """(Re)write the snapshot of a finished day in one transaction and commit."""
+        if day >= datetime.now(timezone.utc).date():
+            raise ValueError(f"Day {day} is not over yet")
+        
+        await self._ensure_partition(day)
+        await self.db.execute(delete(InventorySnapshot).where(InventorySnapshot.snapshot_date == day))
+        
+        balances = InventoryLedgerService(self.db).balances_query(None, end_of_day(day)).subquery("balances")
+        result = await self.db.execute(
+            insert(InventorySnapshot).from_select(
+                ["snapshot_date", "tenant_id", "product_id", "cell_id", "lot_number", "quantity", "reserved_quantity"],
+                select(
+                    literal(day, Date),
+                    balances.c.tenant_id,
+                    balances.c.product_id,
+                    balances.c.cell_id,
+                    # A cell holds one lot per product for good (see ReceiptService)
+                    Inventory.lot_number,
+                    balances.c.quantity,
+                    balances.c.reserved_quantity,
+                )
+                .outerjoin(
+                    Inventory,
+                    and_(
+                        Inventory.tenant_id == balances.c.tenant_id,
+                        Inventory.product_id == balances.c.product_id,
+                        Inventory.cell_id == balances.c.cell_id
+                    )
+                )
+            )
+        )
+        rows_count = result.rowcount
+        
+        run = pg_insert(InventorySnapshotRun).values(snapshot_date=day, rows_count=rows_count)
+        await self.db.execute(
+            run.on_conflict_do_update(
+                index_elements=[InventorySnapshotRun.snapshot_date],
+                set_={"rows_count": run.excluded.rows_count, "created_at": func.now()}
+            )
+        )
+        await self.db.commit()
+        return {"snapshot_date": day, "rows": rows_count}
+    
+    async def get_stock(
+        self,
+        tenant_id: UUID | None,
+        day: date,
+        product_id: UUID | None = None,
+        cell_id: UUID | None = None
+    ) -> list[InventorySnapshot] | None:
+        """Snapshot rows of a day, or None when the day has no snapshot."""
+        if await self.db.get(InventorySnapshotRun, day) is None:
+            return None
+        query = select(InventorySnapshot).where(InventorySnapshot.snapshot_date == day)
+        if tenant_id:
+            query = query.where(InventorySnapshot.tenant_id == tenant_id)
+        if product_id:
+            query = query.where(InventorySnapshot.product_id == product_id)
+        if cell_id:
+            query = query.where(InventorySnapshot.cell_id == cell_id)
+        result = await self.db.execute(
+            query.order_by(InventorySnapshot.product_id, InventorySnapshot.cell_id)
+        )
+        return list(result.scalars().all())
+    
+    async def apply_retention(self, today: date | None = None) -> list[str]:
+        """Drop monthly partitions older than the retention period and commit.
+        
+        A partition goes once its last day is INVENTORY_SNAPSHOT_RETENTION_DAYS
+        old.  Returns the names of the dropped partitions.
+        """
+        cutoff = (today or date.today()) - timedelta(days=settings.INVENTORY_SNAPSHOT_RETENTION_DAYS)
+        result = await self.db.execute(_LIST_PARTITIONS_SQL)
+        
+        dropped = []
+        kept_from = None
+        for name in sorted(result.scalars().all()):
+            match = _PARTITION_NAME.match(name)
+            if not match:
+                continue
+            _, end = month_bounds(date(int(match.group(1)), int(match.group(2)), 1))
+            if end <= cutoff:
+                await self.db.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+                kept_from = end
+        if kept_from:
+            await self.db.execute(
+                delete(InventorySnapshotRun).where(InventorySnapshotRun.snapshot_date < kept_from)
+            )
+        await self.db.commit()
+        return dropped
@@ -0,0 +1,130 @@
+"""Available-to-promise stock summary service."""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text
+from uuid import UUID
+
+from app.models import StockSummary
+
+
+# Deltas are added to existing rows; missing rows are created.  Rows are
+# written in key order so that concurrent writers never deadlock.
+_APPLY_DELTAS_SQL = text("""
+    INSERT INTO stock_summary (tenant_id, product_id, on_hand, reserved, updated_at)
+    SELECT v.tenant_id, v.product_id, v.on_hand, v.reserved, now()
+    FROM unnest(
+        CAST(:tenant_ids AS uuid[]),
+        CAST(:product_ids AS uuid[]),
+        CAST(:on_hand AS integer[]),
+        CAST(:reserved AS integer[])
+    ) AS v(tenant_id, product_id, on_hand, reserved)
+    ORDER BY v.tenant_id, v.product_id
+    ON CONFLICT (tenant_id, product_id) DO UPDATE
+    SET on_hand = stock_summary.on_hand + EXCLUDED.on_hand,
+        reserved = stock_summary.reserved + EXCLUDED.reserved,
+        updated_at = now()
+""")
+
+# Rebuild from inventory: rows that drifted are overwritten, rows without
+# any inventory left are removed.  Returns how many rows were touched.
+_RECONCILE_SQL = text("""
+    WITH actual AS (
+        SELECT tenant_id, product_id,
+               SUM(quantity) AS on_hand,
+               SUM(reserved_quantity) AS reserved
+        FROM inventory
+        WHERE CAST(:tenant_id AS uuid) IS NULL OR tenant_id = CAST(:tenant_id AS uuid)
+        GROUP BY tenant_id, product_id
+    ),
+    fixed AS (
+        INSERT INTO stock_summary (tenant_id, product_id, on_hand, reserved, updated_at)
+        SELECT tenant_id, product_id, on_hand, reserved, now()
+        FROM actual
+        ORDER BY tenant_id, product_id
+        ON CONFLICT (tenant_id, product_id) DO UPDATE
+        SET on_hand = EXCLUDED.on_hand,
+            reserved = EXCLUDED.reserved,
+            updated_at = now()
+        WHERE (stock_summary.on_hand, stock_summary.reserved)
+              IS DISTINCT FROM (EXCLUDED.on_hand, EXCLUDED.reserved)
+        RETURNING 1
+    ),
+    stale AS (
+        DELETE FROM stock_summary s
+        WHERE (CAST(:tenant_id AS uuid) IS NULL OR s.tenant_id = CAST(:tenant_id AS uuid))
+          AND NOT EXISTS (
+              SELECT 1 FROM actual a
+              WHERE a.tenant_id = s.tenant_id AND a.product_id = s.product_id
+          )
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM actual) AS rows_checked,
+           (SELECT COUNT(*) FROM fixed) AS rows_fixed,
+           (SELECT COUNT(*) FROM stale) AS rows_removed
+""")
+
+
+class StockSummaryService:
+    """Service for per-product on-hand / reserved / available totals."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def apply(self, deltas: list[tuple[UUID, UUID, int, int]]) -> None:
+        """Add ``(tenant_id, product_id, on_hand_delta, reserved_delta)`` changes.
+
+        Must be called in the transaction that changes ``inventory``; does not
+        commit.
+        """
+        totals: dict[tuple[UUID, UUID], list[int]] = {}
+        for tenant_id, product_id, on_hand, reserved in deltas:
+            total = totals.setdefault((tenant_id, product_id), [0, 0])
+            total[0] += on_hand
+            total[1] += reserved
+        rows = [(key, total) for key, total in totals.items() if total != [0, 0]]
+        if not rows:
+            return
+
+        await self.db.execute(
+            _APPLY_DELTAS_SQL,
+            {
+                "tenant_ids": [key[0] for key, _ in rows],
+                "product_ids": [key[1] for key, _ in rows],
+                "on_hand": [total[0] for _, total in rows],
+                "reserved": [total[1] for _, total in rows],
+            }
+        )
+
+    async def get_available(self, tenant_id: UUID, product_id: UUID) -> int:
+        """Get available quantity of a product (0 if never received)."""
+        result = await self.db.execute(
+            select(StockSummary.available).where(
+                StockSummary.tenant_id == tenant_id,
+                StockSummary.product_id == product_id
+            )
+        )
+        return result.scalar_one_or_none() or 0
+
+    async def get_summary(
+        self,
+        tenant_id: UUID,
+        product_ids: list[UUID] | None = None
+    ) -> list[StockSummary]:
+        """Get stock summary rows of a tenant, optionally for given products."""
+        query = select(StockSummary).where(StockSummary.tenant_id == tenant_id)
+        if product_ids:
+            query = query.where(StockSummary.product_id.in_(product_ids))
+        result = await self.db.execute(query.order_by(StockSummary.product_id))
+        return list(result.scalars().all())
+
+    async def reconcile(self, tenant_id: UUID | None = None) -> dict:
+        """Rebuild the summary from ``inventory`` (one tenant or all) and commit.
+
+        Inventory writes are blocked for the duration so that the rebuilt
+        totals match a consistent snapshot.
+        """
+        await self.db.execute(text("LOCK TABLE inventory IN SHARE MODE"))
+        result = await self.db.execute(_RECONCILE_SQL, {"tenant_id": tenant_id})
+        stats = dict(result.one()._mapping)
+        await self.db.commit()
+        return stats
@@ -1,11 +1,66 @@
 """Transfer service."""
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from uuid import UUID
+from sqlalchemy import select, insert, text, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from uuid import UUID, uuid4
 
-from app.models import Transfer, Inventory
+from app.models import Transfer, Cell, InventoryMovement
 from .schemas import TransferCreate
+from .ledger_service import TRANSFER_OUT, TRANSFER_IN
+
+
+# Inventory rows of the (product, cell) keys a batch touches, locked in id
+# order like every other stock write so that concurrent batches never
+# deadlock.
+_LOCK_KEYS_SQL = text("""
+    SELECT i.id, i.product_id, i.cell_id, i.quantity, i.reserved_quantity,
+           i.lot_number, i.expiry_date, i.received_at
+    FROM inventory i
+    JOIN unnest(
+        CAST(:product_ids AS uuid[]),
+        CAST(:cell_ids AS uuid[])
+    ) AS k(product_id, cell_id) ON k.product_id = i.product_id AND k.cell_id = i.cell_id
+    WHERE i.tenant_id = :tenant_id
+    ORDER BY i.id
+    FOR UPDATE OF i
+""")
+
+# New quantities of the locked rows, in one statement
+_SET_QUANTITIES_SQL = text("""
+    UPDATE inventory i
+    SET quantity = v.quantity,
+        updated_at = now()
+    FROM unnest(CAST(:ids AS uuid[]), CAST(:quantities AS integer[])) AS v(id, quantity)
+    WHERE i.id = v.id
+""")
+
+# Target rows that did not exist when the batch was locked.  A row created
+# concurrently for the same key is topped up if it holds the same lot; the
+# returned keys tell which rows were written.
+_INSERT_TARGETS_SQL = text("""
+    INSERT INTO inventory (
+        id, tenant_id, product_id, cell_id, quantity, reserved_quantity,
+        lot_number, expiry_date, received_at, created_at, updated_at
+    )
+    SELECT v.id, :tenant_id, v.product_id, v.cell_id, v.quantity, 0,
+           v.lot_number, v.expiry_date, v.received_at, now(), now()
+    FROM unnest(
+        CAST(:ids AS uuid[]),
+        CAST(:product_ids AS uuid[]),
+        CAST(:cell_ids AS uuid[]),
+        CAST(:quantities AS integer[]),
+        CAST(:lot_numbers AS varchar[]),
+        CAST(:expiry_dates AS date[]),
+        CAST(:received_ats AS timestamptz[])
+    ) AS v(id, product_id, cell_id, quantity, lot_number, expiry_date, received_at)
+    ORDER BY v.product_id, v.cell_id
+    ON CONFLICT (tenant_id, product_id, cell_id) DO UPDATE
+    SET quantity = inventory.quantity + EXCLUDED.quantity,
+        updated_at = now()
+    WHERE inventory.lot_number IS NOT DISTINCT FROM EXCLUDED.lot_number
+    RETURNING id, product_id, cell_id
+""")
 
 
 class TransferService:
@@ -15,71 +70,170 @@ class TransferService:
         self.db = db
     
     async def create_transfer(self, tenant_id: UUID, data: TransferCreate, created_by: UUID) -> Transfer:
-        """Transfer goods between cells."""
-        # Check availability in source cell
-        query = select(Inventory).where(
-            Inventory.tenant_id == tenant_id,
-            Inventory.product_id == data.product_id,
-            Inventory.cell_id == data.source_cell_id
-        )
-        
-        # Handle NULL lot_number matching
-        if data.lot_number:
-            query = query.where(Inventory.lot_number == data.lot_number)
-        else:
-            query = query.where(Inventory.lot_number.is_(None))
-        
-        source_inv = await self.db.execute(query)
-        source = source_inv.scalar_one_or_none()
+        """Transfer goods between cells (a batch of one)."""
+        result = await self.create_transfers_batch(tenant_id, [data], created_by)
+        line = result["results"][0]
+        if line["status"] != "created":
+            raise ValueError(line["error"])
+        return result["transfers"][0]
+    
+    async def create_transfers_batch(
+        self,
+        tenant_id: UUID,
+        moves: list[TransferCreate],
+        created_by: UUID
+    ) -> dict:
+        """Apply many moves in one transaction.
         
-        if not source or source.quantity < data.quantity:
-            raise ValueError("Insufficient quantity in source cell")
+        All inventory rows involved are locked in id order with one query;
+        the moves are then checked in request order against the running
+        balances, so a later move may take what an earlier one brought.
+        Only available (unreserved) units can be moved, and a cell holds one
+        lot per product.  Invalid moves are reported per line and do not
+        abort the batch; the valid ones are written with one statement per
+        table.
+        """
+        results: list[dict] = [{"index": n, "status": "failed"} for n in range(len(moves))]
         
-        # Decrease in source
-        source.quantity -= data.quantity
+        keys = list(
+            {(move.product_id, move.from_cell_id) for move in moves}
+            | {(move.product_id, move.to_cell_id) for move in moves}
+        )
+        result = await self.db.execute(
+            _LOCK_KEYS_SQL,
+            {
+                "tenant_id": tenant_id,
+                "product_ids": [product_id for product_id, _ in keys],
+                "cell_ids": [cell_id for _, cell_id in keys],
+            }
+        )
+        stock = {(row.product_id, row.cell_id): dict(row._mapping) for row in result.all()}
+        original = {key: row["quantity"] for key, row in stock.items()}
         
-        # Increase or create in target
-        target_query = select(Inventory).where(
-            Inventory.tenant_id == tenant_id,
-            Inventory.product_id == data.product_id,
-            Inventory.cell_id == data.target_cell_id
+        result = await self.db.execute(
+            select(Cell.id).where(
+                Cell.id == any_(bindparam(
+                    "cell_ids", list({move.to_cell_id for move in moves}), type_=ARRAY(PG_UUID(as_uuid=True))
+                ))
+            )
         )
+        cells = set(result.scalars().all())
         
-        if data.lot_number:
-            target_query = target_query.where(Inventory.lot_number == data.lot_number)
-        else:
-            target_query = target_query.where(Inventory.lot_number.is_(None))
+        # 1. Check and apply every move in memory
+        transfers = []
+        movements = []
+        for n, move in enumerate(moves):
+            source = stock.get((move.product_id, move.from_cell_id))
+            target = stock.get((move.product_id, move.to_cell_id))
+            error = None
+            if move.quantity <= 0:
+                error = "Quantity must be positive"
+            elif move.from_cell_id == move.to_cell_id:
+                error = "Source and target cell are the same"
+            elif source is None:
+                error = f"Product {move.product_id} is not stored in cell {move.from_cell_id}"
+            elif move.lot_number is not None and source["lot_number"] != move.lot_number:
+                error = f"Cell {move.from_cell_id} holds lot {source['lot_number'] or 'none'} of the product"
+            elif source["quantity"] - source["reserved_quantity"] < move.quantity:
+                error = "Insufficient quantity in source cell"
+            elif move.to_cell_id not in cells:
+                error = f"Cell {move.to_cell_id} not found"
+            elif target is not None and target["lot_number"] != source["lot_number"]:
+                error = f"Cell {move.to_cell_id} already holds another lot of the product"
+            if error:
+                results[n]["error"] = error
+                continue
+            
+            if target is None:
+                target = stock[(move.product_id, move.to_cell_id)] = {
+                    **source,
+                    "id": uuid4(),
+                    "cell_id": move.to_cell_id,
+                    "quantity": 0,
+                    "reserved_quantity": 0,
+                }
+            source["quantity"] -= move.quantity
+            target["quantity"] += move.quantity
+            
+            transfer_id = uuid4()
+            transfers.append({
+                "id": transfer_id,
+                "tenant_id": tenant_id,
+                "product_id": move.product_id,
+                "source_cell_id": move.from_cell_id,
+                "target_cell_id": move.to_cell_id,
+                "quantity": move.quantity,
+                "lot_number": source["lot_number"],
+                "created_by": created_by,
+            })
+            for row, movement_type, quantity in (
+                (source, TRANSFER_OUT, -move.quantity),
+                (target, TRANSFER_IN, move.quantity),
+            ):
+                movements.append({
+                    "tenant_id": tenant_id,
+                    "product_id": move.product_id,
+                    "cell_id": row["cell_id"],
+                    "inventory_id": row["id"],
+                    "lot_number": row["lot_number"],
+                    "movement_type": movement_type,
+                    "quantity": quantity,
+                    "reserved_quantity": 0,
+                    "document_type": "transfer",
+                    "document_id": transfer_id,
+                })
+            results[n].update(status="created", transfer_id=transfer_id)
         
-        target_inv = await self.db.execute(target_query)
-        target = target_inv.scalar_one_or_none()
+        if not transfers:
+            await self.db.rollback()
+            return {"created": 0, "failed": len(moves), "results": results, "transfers": []}
         
-        if target:
-            target.quantity += data.quantity
-        else:
-            # Get source inventory details for new target inventory
-            target = Inventory(
-                tenant_id=tenant_id,
-                product_id=data.product_id,
-                cell_id=data.target_cell_id,
-                quantity=data.quantity,
-                lot_number=source.lot_number,
-                expiry_date=source.expiry_date,
-                received_at=source.received_at
+        # 2. Write back in bulk; stock_summary does not change (same tenant)
+        changed = [key for key in original if stock[key]["quantity"] != original[key]]
+        if changed:
+            await self.db.execute(
+                _SET_QUANTITIES_SQL,
+                {
+                    "ids": [stock[key]["id"] for key in changed],
+                    "quantities": [stock[key]["quantity"] for key in changed],
+                }
             )
-            self.db.add(target)
         
-        # Create transfer document
-        transfer = Transfer(
-            tenant_id=tenant_id,
-            product_id=data.product_id,
-            source_cell_id=data.source_cell_id,
-            target_cell_id=data.target_cell_id,
-            quantity=data.quantity,
-            lot_number=data.lot_number,
-            created_by=created_by
-        )
-        self.db.add(transfer)
+        new_rows = [row for key, row in stock.items() if key not in original]
+        if new_rows:
+            result = await self.db.execute(
+                _INSERT_TARGETS_SQL,
+                {
+                    "tenant_id": tenant_id,
+                    "ids": [row["id"] for row in new_rows],
+                    "product_ids": [row["product_id"] for row in new_rows],
+                    "cell_ids": [row["cell_id"] for row in new_rows],
+                    "quantities": [row["quantity"] for row in new_rows],
+                    "lot_numbers": [row["lot_number"] for row in new_rows],
+                    "expiry_dates": [row["expiry_date"] for row in new_rows],
+                    "received_ats": [row["received_at"] for row in new_rows],
+                }
+            )
+            written = {(row.product_id, row.cell_id): row.id for row in result.all()}
+            if len(written) < len(new_rows):
+                await self.db.rollback()
+                raise ValueError("A target cell received another lot concurrently, retry the batch")
+            # Rows created concurrently keep their own id
+            ids = {row["id"]: written[(row["product_id"], row["cell_id"])] for row in new_rows}
+            for movement in movements:
+                movement["inventory_id"] = ids.get(movement["inventory_id"], movement["inventory_id"])
         
+        created = await self.db.scalars(
+            insert(Transfer).returning(Transfer, sort_by_parameter_order=True),
+            transfers
+        )
+        created = list(created.all())
+        await self.db.execute(insert(InventoryMovement), movements)
         await self.db.commit()
-        await self.db.refresh(transfer)
-        return transfer
+        
+        return {
+            "created": len(transfers),
+            "failed": len(moves) - len(transfers),
+            "results": results,
+            "transfers": created,
+        }
@@ -0,0 +1,225 @@
+"""Inventory valuation and stock aging report."""
+
+from collections.abc import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, cast, and_, BigInteger, Select
+from uuid import UUID
+from datetime import date, datetime, time, timedelta
+
+from app.models import Inventory, Cell, Rack, Zone, Warehouse, Product, CostLayer
+
+
+VALUATION_GROUPS = ("tenant", "warehouse", "zone", "product")
+
+# Key columns per grouping dimension, (name, export kind)
+_GROUP_COLUMNS = {
+    "tenant": (("tenant_id", "str"),),
+    "warehouse": (("warehouse_id", "str"), ("warehouse_name", "str")),
+    "zone": (("zone_id", "str"), ("zone_name", "str")),
+    "product": (("product_id", "str"), ("sku", "str"), ("product_name", "str")),
+}
+
+# Days since receipt, inclusive bounds (None: open)
+AGE_BUCKETS = (
+    ("age_0_30", None, 30),
+    ("age_31_90", 31, 90),
+    ("age_91_180", 91, 180),
+    ("age_180_plus", 181, None),
+)
+
+# Days until expiry, inclusive bounds (None: open); rows without an expiry
+# date are counted as no_expiry
+EXPIRY_BUCKETS = (
+    ("expired", None, -1),
+    ("expires_0_30", 0, 30),
+    ("expires_31_90", 31, 90),
+    ("expires_90_plus", 91, None),
+)
+
+METRIC_COLUMNS = (
+    ("quantity", "int"),
+    ("reserved_quantity", "int"),
+    ("value", "money"),
+    *[(f"{name}_quantity", "int") for name, _, _ in AGE_BUCKETS],
+    *[(f"{name}_value", "money") for name, _, _ in AGE_BUCKETS],
+    *[(f"{name}_quantity", "int") for name, _, _ in EXPIRY_BUCKETS],
+    ("no_expiry_quantity", "int"),
+)
+
+
+def valuation_columns(group_by: list[str]) -> list[tuple[str, str]]:
+    """Report columns for a grouping: keys in VALUATION_GROUPS order, then metrics."""
+    return [
+        column
+        for dimension in VALUATION_GROUPS if dimension in group_by
+        for column in _GROUP_COLUMNS[dimension]
+    ] + list(METRIC_COLUMNS)
+
+
+def _received_between(as_of: date, low: int | None, high: int | None):
+    """Received `low` to `high` days before `as_of`, as bounds on received_at."""
+    conditions = []
+    if high is not None:
+        conditions.append(Inventory.received_at >= datetime.combine(as_of - timedelta(days=high), time.min))
+    if low is not None:
+        conditions.append(Inventory.received_at < datetime.combine(as_of - timedelta(days=low - 1), time.min))
+    return and_(*conditions)
+
+
+def _expiring_between(as_of: date, low: int | None, high: int | None):
+    """Expiring `low` to `high` days after `as_of`."""
+    conditions = [Inventory.expiry_date.is_not(None)]
+    if low is not None:
+        conditions.append(Inventory.expiry_date >= as_of + timedelta(days=low))
+    if high is not None:
+        conditions.append(Inventory.expiry_date <= as_of + timedelta(days=high))
+    return and_(*conditions)
+
+
+class InventoryValuationService:
+    """Service for the inventory valuation and aging report."""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    def _report_query(
+        self,
+        tenant_id: UUID | None,
+        group_by: list[str],
+        as_of: date,
+        warehouse_id: UUID | None = None,
+        product_id: UUID | None = None
+    ) -> Select:
+        """Valuation and aging grouped by `group_by`, aggregated in two steps.
+        
+        The inventory rows are first summed into integer bucket quantities
+        per product (and zone when the topology is needed), with the bucket
+        bounds turned into constants on received_at and expiry_date so that
+        no per-row arithmetic is left.  Only these sums are valued and
+        grouped by the requested keys.  Units are valued at the average cost
+        of the product's open FIFO cost layers, or at the product cost price
+        when it has none.
+        """
+        for dimension in group_by:
+            if dimension not in VALUATION_GROUPS:
+                raise ValueError(f"Unknown group_by: {dimension}")
+        if not group_by:
+            raise ValueError("group_by is required")
+        
+        by_zone = "zone" in group_by or "warehouse" in group_by or warehouse_id is not None
+        
+        def quantity(condition=None):
+            total = func.sum(Inventory.quantity)
+            return total if condition is None else total.filter(condition)
+        
+        stock_keys = [Inventory.tenant_id, Inventory.product_id]
+        if by_zone:
+            stock_keys.append(Rack.zone_id)
+        stock = (
+            select(
+                *stock_keys,
+                quantity().label("quantity"),
+                func.sum(Inventory.reserved_quantity).label("reserved_quantity"),
+                *[
+                    quantity(_received_between(as_of, low, high)).label(f"{name}_quantity")
+                    for name, low, high in AGE_BUCKETS
+                ],
+                *[
+                    quantity(_expiring_between(as_of, low, high)).label(f"{name}_quantity")
+                    for name, low, high in EXPIRY_BUCKETS
+                ],
+                quantity(Inventory.expiry_date.is_(None)).label("no_expiry_quantity"),
+            )
+            .where(Inventory.quantity > 0)
+        )
+        if by_zone:
+            stock = (
+                stock.join(Cell, Cell.id == Inventory.cell_id)
+                .join(Rack, Rack.id == Cell.rack_id)
+            )
+        if warehouse_id:
+            stock = stock.join(Zone, Zone.id == Rack.zone_id).where(Zone.warehouse_id == warehouse_id)
+        if tenant_id:
+            stock = stock.where(Inventory.tenant_id == tenant_id)
+        if product_id:
+            stock = stock.where(Inventory.product_id == product_id)
+        stock = stock.group_by(*stock_keys).subquery("stock")
+        
+        layers = select(
+            CostLayer.product_id,
+            (
+                func.sum(CostLayer.remaining_quantity * CostLayer.unit_cost)
+                / func.sum(CostLayer.remaining_quantity)
+            ).label("unit_cost")
+        ).where(CostLayer.remaining_quantity > 0)
+        if tenant_id:
+            layers = layers.where(CostLayer.tenant_id == tenant_id)
+        if product_id:
+            layers = layers.where(CostLayer.product_id == product_id)
+        layers = layers.group_by(CostLayer.product_id).subquery("layers")
+        unit_cost = func.coalesce(layers.c.unit_cost, Product.cost_price)
+        
+        def total(name):
+            return cast(func.coalesce(func.sum(stock.c[name]), 0), BigInteger).label(name)
+        
+        def value(name, label):
+            return func.coalesce(func.round(func.sum(stock.c[name] * unit_cost), 2), 0).label(label)
+        
+        keys = {
+            "tenant": [stock.c.tenant_id],
+            "warehouse": [Warehouse.id.label("warehouse_id"), Warehouse.name.label("warehouse_name")],
+            "zone": [Zone.id.label("zone_id"), Zone.name.label("zone_name")],
+            "product": [Product.id.label("product_id"), Product.sku, Product.name.label("product_name")],
+        }
+        key_columns = [column for dimension in VALUATION_GROUPS if dimension in group_by for column in keys[dimension]]
+        query = (
+            select(
+                *key_columns,
+                total("quantity"),
+                total("reserved_quantity"),
+                value("quantity", "value"),
+                *[total(f"{name}_quantity") for name, _, _ in AGE_BUCKETS],
+                *[value(f"{name}_quantity", f"{name}_value") for name, _, _ in AGE_BUCKETS],
+                *[total(f"{name}_quantity") for name, _, _ in EXPIRY_BUCKETS],
+                total("no_expiry_quantity"),
+            )
+            .select_from(stock)
+            .join(Product, Product.id == stock.c.product_id)
+            .outerjoin(layers, layers.c.product_id == stock.c.product_id)
+        )
+        if "zone" in group_by or "warehouse" in group_by:
+            query = query.join(Zone, Zone.id == stock.c.zone_id)
+        if "warehouse" in group_by:
+            query = query.join(Warehouse, Warehouse.id == Zone.warehouse_id)
+        return query.group_by(*key_columns).order_by(*key_columns)
+    
+    async def get_report(
+        self,
+        tenant_id: UUID | None,
+        group_by: list[str],
+        as_of: date | None = None,
+        warehouse_id: UUID | None = None,
+        product_id: UUID | None = None
+    ) -> list[dict]:
+        """Report rows as dicts keyed by `valuation_columns(group_by)`."""
+        result = await self.db.execute(
+            self._report_query(tenant_id, group_by, as_of or date.today(), warehouse_id, product_id)
+        )
+        return [dict(row._mapping) for row in result.all()]
+    
+    async def stream_report_rows(
+        self,
+        tenant_id: UUID | None,
+        group_by: list[str],
+        as_of: date | None = None,
+        warehouse_id: UUID | None = None,
+        product_id: UUID | None = None,
+        batch_size: int = 5000
+    ) -> AsyncIterator[list[tuple]]:
+        """Batches of report rows, in `valuation_columns` order, from a server-side cursor."""
+        query = self._report_query(
+            tenant_id, group_by, as_of or date.today(), warehouse_id, product_id
+        ).execution_options(yield_per=batch_size)
+        result = await self.db.stream(query)
+        async for rows in result.partitions():
+            yield [tuple(row) for row in rows]
@@ -1,33 +1,14 @@
 """Celery tasks for alerts and periodic calculations."""
 
-from celery import shared_task
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from celery import shared_task, group
 from sqlalchemy import select
 from uuid import UUID
-from datetime import date, datetime, timedelta
-from decimal import Decimal
+from datetime import date, timedelta
 
-from app.config import settings
-from app.models import Tenant, Product, Inventory, StorageCharge, Tariff, Order, OrderItem, Reservation
+from app.models import Tenant
+from app.modules.finance.storage_service import StorageChargeService
 from app.modules.notifications.service import AlertService
-
-
-# Create async engine for tasks
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=False,
-    future=True,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-)
-
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
+from app.tasks.session import AsyncSessionLocal
 
 
 @shared_task(name="app.tasks.alerts.check_low_stock_alerts_task")
@@ -55,84 +36,48 @@ def check_low_stock_alerts_task():
 
 
 @shared_task(name="app.tasks.alerts.calculate_daily_storage_charges")
-def calculate_daily_storage_charges():
-    """Calculate daily storage charges for all tenants."""
+def calculate_daily_storage_charges(charge_date: str | None = None):
+    """Charge storage of all tenants for a day (default: yesterday).
+    
+    Tenants are charged in parallel, one task per tenant.
+    """
+    day = date.fromisoformat(charge_date) if charge_date else date.today() - timedelta(days=1)
+    return backfill_storage_charges(day.isoformat(), day.isoformat())
+
+
+@shared_task(name="app.tasks.alerts.backfill_storage_charges")
+def backfill_storage_charges(start_date: str, end_date: str, tenant_id: str | None = None):
+    """Charge storage for a date range (missed nights, new tariffs).
+    
+    Fans out one `calculate_tenant_storage_charges` task per tenant; days
+    that are already charged are skipped, so ranges may overlap.
+    """
+    import asyncio
+    
+    async def list_tenants():
+        async with AsyncSessionLocal() as session:
+            return await StorageChargeService(session).get_billable_tenants(
+                date.fromisoformat(start_date), date.fromisoformat(end_date)
+            )
+    
+    tenant_ids = [UUID(tenant_id)] if tenant_id else asyncio.run(list_tenants())
+    group(
+        calculate_tenant_storage_charges.s(str(tid), start_date, end_date)
+        for tid in tenant_ids
+    ).apply_async()
+    return f"Dispatched storage charges {start_date}..{end_date} for {len(tenant_ids)} tenants"
+
+
+@shared_task(name="app.tasks.alerts.calculate_tenant_storage_charges")
+def calculate_tenant_storage_charges(tenant_id: str, start_date: str, end_date: str):
+    """Charge storage of one tenant for a date range."""
     import asyncio
     
     async def run_calculation():
         async with AsyncSessionLocal() as session:
-            today = date.today()
-            
-            # Get all active tenants
-            tenants_result = await session.execute(
-                select(Tenant).where(Tenant.is_active == True)
+            created = await StorageChargeService(session).charge_range(
+                UUID(tenant_id), date.fromisoformat(start_date), date.fromisoformat(end_date)
             )
-            tenants = tenants_result.scalars().all()
-            
-            total_charges = 0
-            
-            for tenant in tenants:
-                # Get tariff for tenant
-                tariff_result = await session.execute(
-                    select(Tariff).where(Tariff.tenant_id == tenant.id)
-                )
-                tariff = tariff_result.scalar_one_or_none()
-                
-                if not tariff or tariff.storage_rate == 0:
-                    continue
-                
-                # Get all active products with inventory
-                products_result = await session.execute(
-                    select(Product).where(
-                        Product.tenant_id == tenant.id,
-                        Product.is_active == True
-                    )
-                )
-                products = products_result.scalars().all()
-                
-                for product in products:
-                    # Get current inventory quantity (not reserved)
-                    inventory_result = await session.execute(
-                        select(
-                            Inventory.product_id,
-                            (Inventory.quantity - Inventory.reserved_quantity).label("available")
-                        ).where(
-                            Inventory.tenant_id == tenant.id,
-                            Inventory.product_id == product.id
-                        )
-                    )
-                    inventory_data = inventory_result.all()
-                    
-                    total_available = sum(row.available for row in inventory_data if row.available > 0)
-                    
-                    if total_available > 0:
-                        # Calculate charge amount
-                        # Assuming storage_rate is per unit per day
-                        charge_amount = Decimal(str(total_available)) * tariff.storage_rate
-                        
-                        # Check if charge already exists for today
-                        existing_result = await session.execute(
-                            select(StorageCharge).where(
-                                StorageCharge.tenant_id == tenant.id,
-                                StorageCharge.product_id == product.id,
-                                StorageCharge.charge_date == today
-                            )
-                        )
-                        existing = existing_result.scalar_one_or_none()
-                        
-                        if not existing:
-                            charge = StorageCharge(
-                                tenant_id=tenant.id,
-                                charge_date=today,
-                                product_id=product.id,
-                                quantity=total_available,
-                                rate=tariff.storage_rate,
-                                amount=charge_amount
-                            )
-                            session.add(charge)
-                            total_charges += 1
-            
-            await session.commit()
-            return f"Created {total_charges} storage charges for {len(tenants)} tenants"
+            return f"Created {created} storage charges for tenant {tenant_id}"
     
     return asyncio.run(run_calculation())
@@ -0,0 +1,24 @@
+"""Celery tasks for batch stock allocation."""
+
+from celery import shared_task
+from uuid import UUID
+
+from app.modules.warehouse.allocation_service import AllocationService
+from app.tasks.session import AsyncSessionLocal
+
+
+@shared_task(name="app.tasks.allocation.allocate_pending_orders")
+def allocate_pending_orders(tenant_id: str | None = None):
+    """Allocate stock to all NEW / AWAITING_STOCK orders (one tenant or all)."""
+    import asyncio
+    
+    async def run_allocation():
+        async with AsyncSessionLocal() as session:
+            service = AllocationService(session)
+            if tenant_id:
+                stats = await service.allocate_tenant(UUID(tenant_id))
+                stats["tenant_id"] = str(stats["tenant_id"])
+                return stats
+            return await service.allocate_all()
+    
+    return asyncio.run(run_allocation())
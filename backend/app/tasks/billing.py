@@ -0,0 +1,48 @@
+"""Celery tasks for the monthly billing run."""
+
+from celery import shared_task, group
+from uuid import UUID
+
+from app.modules.billing.service import BillingService, month_period, previous_month, shards
+from app.tasks.session import AsyncSessionLocal
+
+
+SHARD_SIZE = 50
+
+
+@shared_task(name="app.tasks.billing.run_monthly_billing")
+def run_monthly_billing(period: str | None = None, regenerate: bool = False):
+    """Invoice all active tenants for a month (default: previous month).
+    
+    Tenants still to invoice are split into shards of SHARD_SIZE, one
+    `bill_tenant_shard` task each, so the run spreads over all workers.
+    """
+    import asyncio
+    
+    period = period or previous_month()
+    period_start, _ = month_period(period)
+    
+    async def list_tenants():
+        async with AsyncSessionLocal() as session:
+            return await BillingService(session).get_unbilled_tenants(period_start, regenerate)
+    
+    tenant_ids = asyncio.run(list_tenants())
+    group(
+        bill_tenant_shard.s([str(tenant_id) for tenant_id in shard], period, regenerate)
+        for shard in shards(tenant_ids, SHARD_SIZE)
+    ).apply_async()
+    return f"Dispatched billing {period} for {len(tenant_ids)} tenants"
+
+
+@shared_task(name="app.tasks.billing.bill_tenant_shard")
+def bill_tenant_shard(tenant_ids: list[str], period: str, regenerate: bool = False):
+    """Create the month's invoices of a shard of tenants (one transaction)."""
+    import asyncio
+    
+    async def run_billing():
+        async with AsyncSessionLocal() as session:
+            return await BillingService(session).bill_tenants(
+                [UUID(tenant_id) for tenant_id in tenant_ids], period, regenerate
+            )
+    
+    return asyncio.run(run_billing())
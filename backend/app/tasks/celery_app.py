@@ -1,13 +1,14 @@
 """Celery application configuration."""
 
 from celery import Celery
+from celery.schedules import crontab
 from app.config import settings
 
 celery_app = Celery(
     "fms",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=["app.tasks.alerts"]
+    include=["app.tasks.alerts", "app.tasks.allocation", "app.tasks.finance", "app.tasks.billing", "app.tasks.inventory"]
 )
 
 celery_app.conf.update(
@@ -31,4 +32,19 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.alerts.calculate_daily_storage_charges",
         "schedule": 86400.0,  # Daily at midnight
     },
+    "run-monthly-billing": {
+        "task": "app.tasks.billing.run_monthly_billing",
+        # Previous month, once its last storage charges are in
+        "schedule": crontab(day_of_month=2, hour=3, minute=0),
+    },
+    "create-inventory-checkpoint": {
+        "task": "app.tasks.inventory.create_inventory_checkpoint",
+        # Balances at Monday 00:00, once the last movements before it are committed
+        "schedule": crontab(day_of_week=1, hour=0, minute=30),
+    },
+    "snapshot-inventory": {
+        "task": "app.tasks.inventory.snapshot_inventory",
+        # Yesterday's closing stock (UTC)
+        "schedule": crontab(hour=0, minute=15),
+    },
 }
@@ -0,0 +1,28 @@
+"""Celery tasks for finance recalculations."""
+
+from celery import shared_task
+from uuid import UUID
+from datetime import date
+
+from app.modules.finance.rollup_service import PnLRollupService
+from app.tasks.session import AsyncSessionLocal
+
+
+@shared_task(name="app.tasks.finance.recompute_order_pnl")
+def recompute_order_pnl(start_date: str, end_date: str, tenant_id: str | None = None):
+    """Recompute stored PnL and the rollup of orders created in a date range.
+    
+    Queued when tariffs change; can also be run by hand after fixing cost
+    data.  Without tenant_id all tenants are recomputed.
+    """
+    import asyncio
+    
+    async def run_recompute():
+        async with AsyncSessionLocal() as session:
+            return await PnLRollupService(session).recompute(
+                date.fromisoformat(start_date),
+                date.fromisoformat(end_date),
+                UUID(tenant_id) if tenant_id else None
+            )
+    
+    return asyncio.run(run_recompute())
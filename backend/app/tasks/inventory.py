@@ -0,0 +1,65 @@
+"""Celery tasks for the inventory ledger."""
+
+from celery import shared_task
+from datetime import date, datetime, time, timedelta, timezone
+
+from app.modules.warehouse.ledger_service import InventoryLedgerService
+from app.modules.warehouse.snapshot_service import InventorySnapshotService
+from app.tasks.session import AsyncSessionLocal
+
+
+@shared_task(name="app.tasks.inventory.create_inventory_checkpoint")
+def create_inventory_checkpoint(as_of: str | None = None):
+    """Checkpoint ledger balances at `as_of` (ISO datetime, default: today 00:00 UTC)."""
+    import asyncio
+    
+    checkpoint_at = (
+        datetime.fromisoformat(as_of) if as_of
+        else datetime.combine(datetime.now(timezone.utc).date(), time.min, tzinfo=timezone.utc)
+    )
+    
+    async def run_checkpoint():
+        async with AsyncSessionLocal() as session:
+            return await InventoryLedgerService(session).create_checkpoint(checkpoint_at)
+    
+    result = asyncio.run(run_checkpoint())
+    result["as_of"] = result["as_of"].isoformat()
+    return result
+
+
+@shared_task(name="app.tasks.inventory.snapshot_inventory")
+def snapshot_inventory(day: str | None = None):
+    """Snapshot end-of-day stock (default: yesterday, UTC) and apply retention."""
+    import asyncio
+    
+    snapshot_day = date.fromisoformat(day) if day else datetime.now(timezone.utc).date() - timedelta(days=1)
+    
+    async def run_snapshot():
+        async with AsyncSessionLocal() as session:
+            service = InventorySnapshotService(session)
+            result = await service.take_snapshot(snapshot_day)
+            result["partitions_dropped"] = await service.apply_retention()
+            return result
+    
+    result = asyncio.run(run_snapshot())
+    result["snapshot_date"] = result["snapshot_date"].isoformat()
+    return result
+
+
+@shared_task(name="app.tasks.inventory.backfill_inventory_snapshots")
+def backfill_inventory_snapshots(start_date: str, end_date: str):
+    """(Re)take the snapshots of a date range, e.g. after missed nights."""
+    import asyncio
+    
+    async def run_backfill():
+        async with AsyncSessionLocal() as session:
+            service = InventorySnapshotService(session)
+            day = date.fromisoformat(start_date)
+            taken = 0
+            while day <= date.fromisoformat(end_date):
+                await service.take_snapshot(day)
+                taken += 1
+                day += timedelta(days=1)
+            return taken
+    
+    return f"Took {asyncio.run(run_backfill())} inventory snapshots {start_date}..{end_date}"
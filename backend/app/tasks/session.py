@@ -0,0 +1,23 @@
+"""Database session factory for Celery tasks."""
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+
+
+# Every task runs its coroutine with asyncio.run(), i.e. in a fresh event
+# loop, and asyncpg connections cannot be reused across loops - so no pool.
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    future=True,
+    poolclass=NullPool,
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    engine,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+)
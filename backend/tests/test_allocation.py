@@ -0,0 +1,52 @@
+"""Batch allocation tests."""
+
+from datetime import date, datetime
+from uuid import uuid4
+
+from app.modules.warehouse.allocation_service import allocate_stock, fefo_key
+
+
+def _lot(product_id, available, expiry_date=None, received_at=datetime(2026, 1, 1)):
+    return {
+        "inventory_id": uuid4(),
+        "product_id": product_id,
+        "cell_id": uuid4(),
+        "available": available,
+        "expiry_date": expiry_date,
+        "received_at": received_at,
+    }
+
+
+def _line(product_id, need):
+    return {"order_item_id": uuid4(), "order_id": uuid4(), "product_id": product_id, "need": need}
+
+
+def test_fefo_key_orders_expiring_lots_first():
+    """Lots with the earliest expiry come first, lots without expiry last."""
+    product_id = uuid4()
+    no_expiry = _lot(product_id, 1, received_at=datetime(2025, 1, 1))
+    late = _lot(product_id, 1, expiry_date=date(2026, 6, 1))
+    early = _lot(product_id, 1, expiry_date=date(2026, 3, 1))
+    assert sorted([no_expiry, late, early], key=fefo_key) == [early, late, no_expiry]
+
+
+def test_allocate_stock_serves_lines_in_priority_order():
+    """Older lines are served fully before younger ones get anything."""
+    product_id = uuid4()
+    lots = sorted([_lot(product_id, 3, date(2026, 3, 1)), _lot(product_id, 4)], key=fefo_key)
+    first, second, third = _line(product_id, 5), _line(product_id, 1), _line(product_id, 4)
+
+    allocations = allocate_stock([first, second, third], lots)
+
+    by_line = {}
+    for alloc in allocations:
+        by_line[alloc["order_item_id"]] = by_line.get(alloc["order_item_id"], 0) + alloc["quantity"]
+    assert by_line == {first["order_item_id"]: 5, second["order_item_id"]: 1, third["order_item_id"]: 1}
+    assert allocations[0]["inventory_id"] == lots[0]["inventory_id"]
+    assert allocations[0]["quantity"] == 3
+    assert [lot["available"] for lot in lots] == [0, 0]
+
+
+def test_allocate_stock_without_stock_for_product():
+    """Lines for products without stock get no allocations."""
+    assert allocate_stock([_line(uuid4(), 2)], [_lot(uuid4(), 10)]) == []
@@ -119,3 +119,37 @@ async def test_create_transfer(client: AsyncClient, auth_headers):
     assert "id" in data
     assert "status" in data
     assert data["status"] == "created"
+
+
+@pytest.mark.asyncio
+async def test_create_transfers_batch(client: AsyncClient, auth_headers):
+    """Test bulk transfer endpoint reports each move."""
+    response = await client.post("/api/v1/warehouses/transfers/batch", headers=auth_headers, json={
+        "transfers": [
+            {
+                "from_cell_id": str(uuid4()),
+                "to_cell_id": str(uuid4()),
+                "product_id": str(uuid4()),
+                "quantity": 5
+            }
+        ]
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] + data["failed"] == 1
+    assert data["results"][0]["index"] == 0
+
+
+@pytest.mark.asyncio
+async def test_generate_topology_unknown_warehouse(client: AsyncClient, auth_headers):
+    """Test layout generator endpoint for a missing warehouse."""
+    response = await client.post(
+        f"/api/v1/warehouses/{uuid4()}/topology",
+        headers=auth_headers,
+        json={
+            "zones": [
+                {"name": "A", "racks": 2, "positions": 10, "levels": [{"size": "L", "max_weight": 500}]}
+            ]
+        }
+    )
+    assert response.status_code == 404
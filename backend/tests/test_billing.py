@@ -0,0 +1,23 @@
+"""Billing period helper tests."""
+
+from datetime import date
+
+import pytest
+
+from app.modules.billing.service import month_period, previous_month, shards
+
+
+def test_month_period():
+    assert month_period("2026-02") == (date(2026, 2, 1), date(2026, 2, 28))
+    assert month_period("2024-02") == (date(2024, 2, 1), date(2024, 2, 29))
+    assert month_period("2026-12") == (date(2026, 12, 1), date(2026, 12, 31))
+    for period in ("2026-13", "2026", "september"):
+        with pytest.raises(ValueError):
+            month_period(period)
+
+
+def test_previous_month_and_shards():
+    assert previous_month(date(2026, 1, 15)) == "2025-12"
+    assert previous_month(date(2026, 10, 1)) == "2026-09"
+    assert shards(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+    assert shards([], 50) == []
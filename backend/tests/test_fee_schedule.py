@@ -0,0 +1,47 @@
+"""Marketplace fee schedule tests."""
+
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
+
+from app.modules.finance.fee_cache import FeeSchedule, order_fees, PERCENT, FIXED
+
+
+def fee(fee_type, value, category_id=None):
+    return SimpleNamespace(fee_type=fee_type, fee_value=Decimal(value), category_id=category_id)
+
+
+def test_category_percent_replaces_default_and_fixed_parts_add_up():
+    """A category's percent applies to its lines; fixed parts are per order."""
+    shoes = uuid4()
+    schedule = FeeSchedule([
+        fee(PERCENT, "5"),
+        fee(PERCENT, "10", shoes),
+        fee(PERCENT, "2.5", shoes),
+        fee(FIXED, "20"),
+        fee(FIXED, "7", shoes),
+    ])
+
+    assert schedule.fee([(None, Decimal("100"))]) == Decimal("25.00")
+    assert schedule.fee([(shoes, Decimal("100")), (uuid4(), Decimal("33.33"))]) == Decimal("41.17")
+    assert schedule.fee([]) == Decimal("20.00")
+    assert FeeSchedule([]).fee([(shoes, Decimal("100"))]) == Decimal("0.00")
+
+
+def test_order_fees_applies_each_integration_schedule():
+    """Fees of a batch are computed from per-category line values."""
+    ozon, wb = uuid4(), uuid4()
+    schedules = {ozon: FeeSchedule([fee(PERCENT, "10")]), wb: FeeSchedule([fee(FIXED, "15")])}
+    first, second, empty = uuid4(), uuid4(), uuid4()
+    rows = [
+        SimpleNamespace(order_id=first, integration_id=ozon, category_id=None, value=Decimal("50")),
+        SimpleNamespace(order_id=first, integration_id=ozon, category_id=uuid4(), value=Decimal("5.05")),
+        SimpleNamespace(order_id=second, integration_id=wb, category_id=None, value=Decimal("80")),
+        SimpleNamespace(order_id=empty, integration_id=ozon, category_id=None, value=None),
+    ]
+
+    assert order_fees(schedules, rows) == {
+        first: Decimal("5.51"),
+        second: Decimal("15.00"),
+        empty: Decimal("0.00"),
+    }
@@ -0,0 +1,29 @@
+"""Inventory movement ledger tests."""
+
+import re
+
+from app.modules.warehouse import service, receipt_service, allocation_service
+from app.modules.warehouse.ledger_service import MOVEMENT_TYPES
+
+
+def _ledger_inserts():
+    statements = [
+        service._RESERVE_ORDER_SQL,
+        service._RELEASE_ORDERS_SQL,
+        service._FULFILL_ORDERS_SQL,
+        receipt_service._POST_RECEIPT_LINES_SQL,
+        allocation_service._INSERT_RESERVATIONS_SQL,
+    ]
+    return [str(statement) for statement in statements]
+
+
+def test_every_stock_statement_writes_the_ledger():
+    for sql in _ledger_inserts():
+        assert "INSERT INTO inventory_movements" in sql
+
+
+def test_movement_types_are_known():
+    for sql in _ledger_inserts():
+        ledger = sql[sql.index("INSERT INTO inventory_movements"):]
+        movement_type = re.search(r"lot_number\)?, '(\w+)'", ledger).group(1)
+        assert movement_type in MOVEMENT_TYPES
@@ -0,0 +1,21 @@
+"""Inventory listing cursor tests."""
+
+import pytest
+from uuid import uuid4
+
+from app.modules.warehouse.service import encode_key_cursor, decode_key_cursor
+
+
+def test_cursor_round_trip():
+    key = (uuid4(), uuid4())
+    assert decode_key_cursor(encode_key_cursor(*key), 2) == key
+
+
+def test_cursor_of_other_size_is_rejected():
+    with pytest.raises(ValueError):
+        decode_key_cursor(encode_key_cursor(uuid4()), 2)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_key_cursor("not a cursor", 1)
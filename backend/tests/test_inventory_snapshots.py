@@ -0,0 +1,18 @@
+"""Inventory snapshot partitioning tests."""
+
+from datetime import date, datetime, timezone
+
+from app.modules.warehouse.snapshot_service import month_bounds, partition_name, end_of_day
+
+
+def test_month_bounds():
+    assert month_bounds(date(2026, 1, 31)) == (date(2026, 1, 1), date(2026, 2, 1))
+    assert month_bounds(date(2026, 12, 1)) == (date(2026, 12, 1), date(2027, 1, 1))
+
+
+def test_partition_name_matches_month():
+    assert partition_name(date(2026, 3, 15)) == "inventory_snapshots_2026_03"
+
+
+def test_snapshot_is_taken_at_next_midnight_utc():
+    assert end_of_day(date(2026, 2, 28)) == datetime(2026, 3, 1, tzinfo=timezone.utc)
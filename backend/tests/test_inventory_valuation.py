@@ -0,0 +1,22 @@
+"""Inventory valuation report layout tests."""
+
+from app.modules.warehouse.valuation_service import (
+    valuation_columns,
+    AGE_BUCKETS,
+    EXPIRY_BUCKETS,
+    METRIC_COLUMNS,
+)
+
+
+def test_key_columns_follow_dimension_order():
+    columns = [name for name, _ in valuation_columns(["product", "warehouse"])]
+    assert columns[:5] == ["warehouse_id", "warehouse_name", "product_id", "sku", "product_name"]
+    assert columns[5:] == [name for name, _ in METRIC_COLUMNS]
+
+
+def test_buckets_are_contiguous():
+    for buckets in (AGE_BUCKETS, EXPIRY_BUCKETS):
+        assert buckets[0][1] is None or buckets[0][1] == 0
+        assert buckets[-1][2] is None
+        for (_, _, high), (_, low, _) in zip(buckets, buckets[1:]):
+            assert low == high + 1
@@ -0,0 +1,56 @@
+"""Document number allocator tests."""
+
+import asyncio
+from uuid import uuid4
+
+from app.core.numbering import DocumentNumberAllocator, format_document_number, ORDER
+
+
+class FakeCounterAllocator(DocumentNumberAllocator):
+    """Allocator with an in-memory counter instead of document_counters."""
+
+    def __init__(self, block_size: int):
+        super().__init__(block_size)
+        self.last = 0
+        self.reservations = 0
+
+    async def _reserve(self, db, tenant_id, doc_type, count):
+        self.reservations += 1
+        await asyncio.sleep(0)
+        self.last += count
+        return [self.last - count + 1, self.last]
+
+
+def test_numbers_are_handed_out_from_blocks():
+    """Numbers are unique and a block is reserved only when exhausted."""
+    allocator = FakeCounterAllocator(block_size=10)
+    tenant_id = uuid4()
+
+    async def run():
+        first = [await allocator.next_number(None, tenant_id, ORDER) for _ in range(15)]
+        bulk = await allocator.next_numbers(None, tenant_id, ORDER, 30)
+        return first + bulk
+
+    numbers = asyncio.run(run())
+    assert numbers == list(range(1, 46))
+    assert allocator.reservations == 3
+
+
+def test_concurrent_callers_share_one_reservation():
+    """Callers that find the block empty wait for the same reservation."""
+    allocator = FakeCounterAllocator(block_size=100)
+    tenant_id = uuid4()
+
+    async def run():
+        return await asyncio.gather(*[
+            allocator.next_number(None, tenant_id, ORDER) for _ in range(20)
+        ])
+
+    numbers = asyncio.run(run())
+    assert sorted(numbers) == list(range(1, 21))
+    assert allocator.reservations == 1
+
+
+def test_format_document_number():
+    """Numbers are zero-padded after the type prefix."""
+    assert format_document_number(ORDER, 42) == "ORD-000042"
@@ -0,0 +1,26 @@
+"""Order status transition table tests."""
+
+from app.models import OrderStatus
+from app.modules.orders.service import ORDER_TRANSITIONS, STATUS_TIMESTAMPS, allowed_sources
+
+
+def test_every_status_has_transitions():
+    """Every status is listed, final statuses have no way out."""
+    assert set(ORDER_TRANSITIONS) == set(OrderStatus)
+    assert ORDER_TRANSITIONS[OrderStatus.DELIVERED] == frozenset()
+    assert ORDER_TRANSITIONS[OrderStatus.CANCELLED] == frozenset()
+
+
+def test_allowed_sources():
+    """Shipping is possible from confirmed, picking and packed orders."""
+    assert set(allowed_sources(OrderStatus.SHIPPED)) == {
+        OrderStatus.CONFIRMED, OrderStatus.PICKING, OrderStatus.PACKED
+    }
+    assert OrderStatus.SHIPPED not in allowed_sources(OrderStatus.CANCELLED)
+    assert allowed_sources(OrderStatus.NEW) == []
+
+
+def test_status_timestamps_point_to_reachable_statuses():
+    """Timestamp columns are only set for statuses an order can move to."""
+    reachable = set().union(*ORDER_TRANSITIONS.values())
+    assert set(STATUS_TIMESTAMPS) <= reachable
@@ -0,0 +1,43 @@
+"""Receipt CSV upload parsing tests."""
+
+import io
+import pytest
+from uuid import uuid4
+
+from app.modules.warehouse.receipt_service import iter_receipt_csv
+
+
+def parse(body: str) -> list:
+    return list(iter_receipt_csv(io.BytesIO(body.encode("utf-8-sig"))))
+
+
+def test_quoted_field_may_span_lines():
+    product_id, cell_id = uuid4(), uuid4()
+    items = parse(
+        "product_id,cell_id,quantity,lot_number\r\n"
+        f'{product_id},{cell_id},5,"LOT\nA"\r\n'
+        f"{product_id},{cell_id},7,B\r\n"
+    )
+    assert [(item.quantity, item.lot_number) for item in items] == [(5, "LOT\nA"), (7, "B")]
+
+
+def test_errors_are_numbered_by_record():
+    product_id, cell_id = uuid4(), uuid4()
+    body = (
+        "product_id,cell_id,quantity,lot_number\n"
+        f'{product_id},{cell_id},5,"multi\nline\nlot"\n'
+        f"{product_id},{cell_id},0,B\n"
+    )
+    with pytest.raises(ValueError, match="^Row 3: quantity"):
+        parse(body)
+
+
+def test_empty_upload_is_rejected():
+    with pytest.raises(ValueError):
+        parse("")
+
+
+def test_upload_is_left_open():
+    upload = io.BytesIO(b"product_id,cell_id,quantity\n")
+    assert list(iter_receipt_csv(upload)) == []
+    upload.seek(0)
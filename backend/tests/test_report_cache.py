@@ -0,0 +1,25 @@
+"""Report cache serialization and period tests."""
+
+from datetime import date
+from decimal import Decimal
+
+from app.modules.finance.report_cache import dumps, loads, is_closed
+
+
+def test_entries_keep_decimals_exact():
+    report = {
+        "period": {"start": "2026-01-01", "end": "2026-01-31"},
+        "total_revenue": Decimal("12345678901.23"),
+        "groups": [{"key": "2026-01-02", "margin_percent": Decimal("-3.50"), "orders_count": 2}],
+    }
+    fingerprint, restored = loads(dumps("3:2026-01-05:17", report))
+    assert fingerprint == "3:2026-01-05:17"
+    assert restored == report
+    assert restored["groups"][0]["margin_percent"].as_tuple() == Decimal("-3.50").as_tuple()
+
+
+def test_closed_periods_end_before_current_month():
+    today = date(2026, 10, 16)
+    assert is_closed(date(2026, 9, 30), today)
+    assert not is_closed(date(2026, 10, 1), today)
+    assert not is_closed(date(2026, 12, 31), today)
@@ -0,0 +1,49 @@
+"""Tariff schedule lookup tests."""
+
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
+
+from app.modules.finance.tariff_cache import TariffSchedule, PROCESSING, STORAGE
+
+
+def tariff(tenant_id, tariff_type, rate, effective_from, effective_to=None):
+    return SimpleNamespace(
+        tenant_id=tenant_id,
+        tariff_type=tariff_type,
+        rate=Decimal(rate),
+        effective_from=effective_from,
+        effective_to=effective_to,
+    )
+
+
+def test_rate_is_taken_from_the_version_effective_on_the_day():
+    """Version bounds are inclusive; days outside every version cost nothing."""
+    tenant_id = uuid4()
+    schedule = TariffSchedule([
+        tariff(tenant_id, PROCESSING, "2", date(2026, 2, 1)),
+        tariff(tenant_id, PROCESSING, "1", date(2026, 1, 1), date(2026, 1, 20)),
+    ])
+
+    assert schedule.rate(PROCESSING, date(2025, 12, 31)) == 0
+    assert schedule.rate(PROCESSING, date(2026, 1, 1)) == Decimal("1")
+    assert schedule.rate(PROCESSING, date(2026, 1, 20)) == Decimal("1")
+    assert schedule.rate(PROCESSING, date(2026, 1, 25)) == 0
+    assert schedule.rate(PROCESSING, date(2027, 1, 1)) == Decimal("2")
+    assert schedule.rate(STORAGE, date(2026, 3, 1)) == 0
+
+
+def test_tenant_rates_override_defaults():
+    """Defaults apply only where the tenant has no version of its own."""
+    tenant_id = uuid4()
+    schedule = TariffSchedule([
+        tariff(None, STORAGE, "0.5", date(2026, 1, 1)),
+        tariff(tenant_id, STORAGE, "0.3", date(2026, 3, 1), date(2026, 3, 31)),
+    ])
+
+    assert schedule.rate(STORAGE, date(2026, 2, 1)) == Decimal("0.5")
+    assert schedule.rate(STORAGE, date(2026, 3, 15)) == Decimal("0.3")
+    assert schedule.rate(STORAGE, date(2026, 4, 1)) == Decimal("0.5")
+    assert schedule.charges([STORAGE], date(2026, 3, 1), date(2026, 3, 2))
+    assert not schedule.charges([PROCESSING], date(2026, 1, 1), date(2026, 12, 31))
@@ -0,0 +1,32 @@
+"""Warehouse layout generator tests."""
+
+import pytest
+
+from app.modules.warehouse.schemas import TopologyZoneSpec
+from app.modules.warehouse.service import format_layout_code
+
+
+def test_default_templates():
+    spec = TopologyZoneSpec(name="A", racks=1, positions=1, levels=[{}])
+    rack_code = format_layout_code(spec.rack_code, "Rack code", zone=1, rack=3)
+    assert rack_code == "R03"
+    code = format_layout_code(
+        spec.cell_code, "Cell code", zone=1, rack=3, rack_code=rack_code, level=2, position=7
+    )
+    assert code == "R03-2-07"
+
+
+def test_unknown_placeholder_is_rejected():
+    with pytest.raises(ValueError):
+        format_layout_code("{aisle}-{position}", "Cell code", zone=1, rack=1, position=1)
+
+
+def test_code_longer_than_column_is_rejected():
+    with pytest.raises(ValueError):
+        format_layout_code("X" * 51, "Rack code", zone=1, rack=1)
+
+
+@pytest.mark.parametrize("template", ["{rack.real}", "{rack[0]}", "{rack:{rack.real}}", "{0}", "{}"])
+def test_only_plain_field_names_are_allowed(template):
+    with pytest.raises(ValueError):
+        format_layout_code(template, "Rack code", zone=1, rack=1)
@@ -0,0 +1,179 @@
+"""Benchmark: per-line reservation loop vs set-based reservation engine.
+
+Seeds a throw-away tenant inside an outer transaction, reserves orders of
+1, 10 and 100 lines with both implementations and rolls everything back.
+
+Usage:
+    python scripts/bench_reservations.py [--repeat 5] [--lots 5]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from uuid import UUID, uuid4
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine
+from app.models import (
+    Cell,
+    Inventory,
+    Order,
+    OrderItem,
+    OrderStatus,
+    Product,
+    Rack,
+    Reservation,
+    Tenant,
+    Warehouse,
+    Zone,
+)
+from app.modules.warehouse.service import ReservationService
+
+LINE_COUNTS = (1, 10, 100)
+
+
+async def legacy_reserve_for_order(db: AsyncSession, order_id: UUID) -> list[Reservation]:
+    """Previous implementation: one inventory query per order line."""
+    order = await db.get(Order, order_id)
+    reservations = []
+    result = await db.execute(select(OrderItem).where(OrderItem.order_id == order_id))
+    for item in result.scalars().all():
+        result = await db.execute(
+            select(Inventory)
+            .where(
+                Inventory.tenant_id == order.tenant_id,
+                Inventory.product_id == item.product_id,
+                Inventory.quantity > Inventory.reserved_quantity
+            )
+            .order_by(Inventory.expiry_date.nulls_last(), Inventory.received_at)
+        )
+        remaining = item.quantity
+        for inv in result.scalars().all():
+            if remaining <= 0:
+                break
+            to_reserve = min(inv.quantity - inv.reserved_quantity, remaining)
+            if to_reserve <= 0:
+                continue
+            reservation = Reservation(
+                order_id=order_id,
+                order_item_id=item.id,
+                inventory_id=inv.id,
+                product_id=item.product_id,
+                cell_id=inv.cell_id,
+                quantity=to_reserve
+            )
+            db.add(reservation)
+            reservations.append(reservation)
+            inv.reserved_quantity += to_reserve
+            item.reserved_quantity += to_reserve
+            remaining -= to_reserve
+        if remaining > 0:
+            item.shortage = remaining
+    await db.commit()
+    return reservations
+
+
+async def seed(db: AsyncSession, products: int, lots: int, stock_per_lot: int) -> tuple[UUID, list[UUID]]:
+    """Create a tenant with `products` SKUs, each stored in `lots` cells."""
+    tenant = Tenant(name="bench", inn=str(uuid4().int)[:12], email="bench@fms.local")
+    warehouse = Warehouse(name="bench")
+    db.add_all([tenant, warehouse])
+    await db.flush()
+    zone = Zone(warehouse_id=warehouse.id, name="bench")
+    db.add(zone)
+    await db.flush()
+    rack = Rack(zone_id=zone.id, code="B1")
+    db.add(rack)
+    await db.flush()
+    cells = [Cell(rack_id=rack.id, code=f"B1-{i:02d}") for i in range(1, lots + 1)]
+    product_rows = [
+        Product(tenant_id=tenant.id, sku=f"BENCH-{i:04d}", name=f"Bench {i}", cost_price=Decimal("1"))
+        for i in range(products)
+    ]
+    db.add_all(cells + product_rows)
+    await db.flush()
+
+    now = datetime.utcnow()
+    for product in product_rows:
+        for n, cell in enumerate(cells):
+            db.add(Inventory(
+                tenant_id=tenant.id,
+                product_id=product.id,
+                cell_id=cell.id,
+                quantity=stock_per_lot,
+                lot_number=f"LOT-{n}",
+                expiry_date=date.today() + timedelta(days=30 + n) if n % 2 else None,
+                received_at=now - timedelta(days=n)
+            ))
+    await db.flush()
+    return tenant.id, [p.id for p in product_rows]
+
+
+async def create_order(db: AsyncSession, tenant_id: UUID, product_ids: list[UUID], seq: int) -> UUID:
+    """Create an order with one line of 3 units per product."""
+    order = Order(
+        tenant_id=tenant_id,
+        order_number=f"BENCH-{seq:06d}",
+        source="manual",
+        status=OrderStatus.NEW,
+        created_at=datetime.utcnow() + timedelta(microseconds=seq)
+    )
+    db.add(order)
+    await db.flush()
+    db.add_all([
+        OrderItem(order_id=order.id, product_id=pid, quantity=3, price=Decimal("10"), cost_price=Decimal("1"))
+        for pid in product_ids
+    ])
+    await db.commit()
+    return order.id
+
+
+async def main(repeat: int, lots: int) -> None:
+    statements = 0
+
+    def count(*_args):
+        nonlocal statements
+        statements += 1
+
+    async with engine.connect() as conn:
+        outer = await conn.begin()
+        db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        # Product 0 appears in every order: 3 units x 3 sizes x 2 variants.
+        per_lot = (18 * repeat) // lots + 3
+        tenant_id, product_ids = await seed(db, max(LINE_COUNTS), lots, per_lot)
+        await db.commit()
+
+        event.listen(conn.sync_connection, "before_cursor_execute", count)
+        seq = 0
+        print(f"{'lines':>6} {'variant':>8} {'median ms':>10} {'stmts':>6}")
+        for lines in LINE_COUNTS:
+            for name, reserve in (
+                ("loop", lambda oid: legacy_reserve_for_order(db, oid)),
+                ("set", lambda oid: ReservationService(db).reserve_for_order(oid)),
+            ):
+                timings = []
+                for _ in range(repeat):
+                    seq += 1
+                    order_id = await create_order(db, tenant_id, product_ids[:lines], seq)
+                    statements = 0
+                    started = time.perf_counter()
+                    await reserve(order_id)
+                    timings.append((time.perf_counter() - started) * 1000)
+                print(f"{lines:>6} {name:>8} {statistics.median(timings):>10.2f} {statements:>6}")
+        event.remove(conn.sync_connection, "before_cursor_execute", count)
+
+        await db.close()
+        await outer.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lots", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.lots))
@@ -0,0 +1,33 @@
+"""Recompute the daily PnL rollup for a date range.
+
+Rebuilds the rollup from the PnL columns stored on the orders; it does not
+recompute those columns (see POST /finance/reports/pnl/recompute).  Use it
+to repair a rollup that drifted from the orders.
+
+Usage:
+    python scripts/rebuild_pnl_rollup.py START_DATE END_DATE [--tenant-id UUID]
+"""
+
+import argparse
+import asyncio
+from datetime import date
+from uuid import UUID
+
+from app.database import AsyncSessionLocal
+from app.modules.finance.rollup_service import PnLRollupService
+
+
+async def rebuild(start_date: date, end_date: date, tenant_id: UUID | None) -> None:
+    """Rebuild the rollup for one tenant or for all tenants."""
+    async with AsyncSessionLocal() as session:
+        stats = await PnLRollupService(session).rebuild(start_date, end_date, tenant_id)
+        print(f"Removed {stats['rows_removed']} rows, written {stats['rows_written']} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("start_date", type=date.fromisoformat)
+    parser.add_argument("end_date", type=date.fromisoformat)
+    parser.add_argument("--tenant-id", type=UUID, default=None)
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.start_date, args.end_date, args.tenant_id))
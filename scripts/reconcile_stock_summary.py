@@ -0,0 +1,29 @@
+"""Rebuild the stock_summary table from inventory.
+
+Usage:
+    python scripts/reconcile_stock_summary.py [--tenant-id UUID]
+"""
+
+import argparse
+import asyncio
+from uuid import UUID
+
+from app.database import AsyncSessionLocal
+from app.modules.warehouse.stock_service import StockSummaryService
+
+
+async def reconcile(tenant_id: UUID | None) -> None:
+    """Rebuild stock summary for one tenant or for all tenants."""
+    async with AsyncSessionLocal() as session:
+        stats = await StockSummaryService(session).reconcile(tenant_id)
+        print(
+            f"Checked {stats['rows_checked']} products: "
+            f"{stats['rows_fixed']} fixed, {stats['rows_removed']} removed"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenant-id", type=UUID, default=None)
+    args = parser.parse_args()
+    asyncio.run(reconcile(args.tenant_id))